@@ -1,8 +1,205 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
 from datetime import datetime, timezone
 
 from bson import ObjectId
 
-from database import get_db
+from config import (
+    ACTIVITY_LOG_BATCH_SIZE,
+    ACTIVITY_LOG_FLUSH_MS,
+    ACTIVITY_LOG_MODE,
+    ACTIVITY_LOG_OVERFLOW,
+    ACTIVITY_LOG_QUEUE_SIZE,
+)
+from search import name_tokens
+from storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("drop_newest", "drop_oldest", "block")
+
+
+class ActivityLogWriter:
+    """Buffers activity log documents and writes them with insert_many.
+
+    A background thread drains the buffer whenever batch_size entries are
+    waiting or flush_interval_ms has passed since the oldest one arrived.
+    The buffer holds at most max_queue entries; past that, overflow decides
+    whether the new entry is dropped, the oldest is dropped, or the caller
+    blocks. With synchronous=True every entry is written before submit
+    returns, which keeps tests deterministic.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 100,
+        flush_interval_ms: int = 200,
+        max_queue: int = 10000,
+        overflow: str = "drop_newest",
+        synchronous: bool = False,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(1, flush_interval_ms) / 1000
+        self.max_queue = max(1, max_queue)
+        self.overflow = overflow
+        self.synchronous = synchronous
+        self.enqueued = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.failed = 0
+        self._buffer: deque = deque()
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._pid: int | None = None
+        self._stopping = False
+
+    def submit(self, doc: dict) -> bool:
+        """Queue one document; returns False if it was dropped."""
+        if self.synchronous:
+            self._write([doc])
+            return True
+        with self._cond:
+            self._ensure_worker()
+            if len(self._buffer) >= self.max_queue:
+                if self.overflow == "drop_newest":
+                    self.dropped += 1
+                    return False
+                if self.overflow == "drop_oldest":
+                    self._buffer.popleft()
+                    self.dropped += 1
+                else:
+                    while len(self._buffer) >= self.max_queue and not self._stopping:
+                        self._cond.wait()
+            self._buffer.append(doc)
+            self.enqueued += 1
+            if len(self._buffer) == 1 or len(self._buffer) >= self.batch_size:
+                self._cond.notify_all()
+        return True
+
+    def submit_many(self, docs: list[dict]) -> int:
+        """Queue several documents together; returns how many were accepted.
+
+        In synchronous mode they are written with a single insert_many.
+        """
+        if not docs:
+            return 0
+        if self.synchronous:
+            self._write(list(docs))
+            return len(docs)
+        return sum(self.submit(doc) for doc in docs)
+
+    def flush(self) -> None:
+        """Write everything currently buffered from the calling thread."""
+        while True:
+            with self._cond:
+                batch = self._take_batch()
+                self._cond.notify_all()
+            if not batch:
+                return
+            self._write(batch)
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Stop the worker and flush what is left. Used at process exit."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread if self._pid == os.getpid() else None
+        if thread is not None:
+            thread.join(timeout)
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._cond:
+            pending = len(self._buffer)
+        return {
+            "enqueued": self.enqueued,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "pending": pending,
+        }
+
+    def _ensure_worker(self) -> None:
+        # A worker inherited through fork (gunicorn --preload) is not running
+        # in this process, so start a fresh one and forget the parent's buffer.
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        if self._pid is not None and self._pid != os.getpid():
+            self._buffer.clear()
+        self._stopping = False
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name="activity-log-writer", daemon=True)
+        self._thread.start()
+
+    def _take_batch(self) -> list[dict]:
+        count = min(self.batch_size, len(self._buffer))
+        return [self._buffer.popleft() for _ in range(count)]
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._buffer and not self._stopping:
+                    self._cond.wait()
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._buffer) < self.batch_size and not self._stopping:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._take_batch()
+                done = self._stopping and not self._buffer
+                self._cond.notify_all()
+            if batch:
+                self._write(batch)
+            if done:
+                return
+
+    def _write(self, batch: list[dict]) -> None:
+        try:
+            get_storage().logs.insert_many(batch)
+        except Exception:
+            with self._cond:
+                self.failed += len(batch)
+            logger.exception("Activity log write failed (%d entries)", len(batch))
+            return
+        with self._cond:
+            self.flushed += len(batch)
+
+
+activity_writer = ActivityLogWriter(
+    batch_size=ACTIVITY_LOG_BATCH_SIZE,
+    flush_interval_ms=ACTIVITY_LOG_FLUSH_MS,
+    max_queue=ACTIVITY_LOG_QUEUE_SIZE,
+    overflow=ACTIVITY_LOG_OVERFLOW,
+    synchronous=ACTIVITY_LOG_MODE == "sync",
+)
+atexit.register(activity_writer.shutdown)
+
+
+def activity_entry(
+    user_id: str,
+    log_type: str,
+    name: str,
+    description: str,
+    metadata: dict | None = None,
+    created_at: datetime | None = None,
+) -> dict:
+    """Build an activityLogs document (created now unless created_at is given)."""
+    return {
+        "userId": ObjectId(user_id),
+        "type": log_type,
+        "name": name,
+        "nameTokens": name_tokens(name),
+        "description": description,
+        "metadata": metadata or {},
+        "createdAt": created_at or datetime.now(timezone.utc),
+    }
 
 
 def log_activity(
@@ -12,17 +209,9 @@ def log_activity(
     description: str,
     metadata: dict | None = None,
 ) -> None:
-    try:
-        db = get_db()
-        db.activityLogs.insert_one(
-            {
-                "userId": ObjectId(user_id),
-                "type": log_type,
-                "name": name,
-                "description": description,
-                "metadata": metadata or {},
-                "createdAt": datetime.now(timezone.utc),
-            }
-        )
-    except Exception as e:
-        print("Activity log error:", e)
+    activity_writer.submit(activity_entry(user_id, log_type, name, description, metadata))
+
+
+def log_activities(entries: list[dict]) -> int:
+    """Queue prebuilt activity_entry documents as one batch."""
+    return activity_writer.submit_many(entries)
@@ -1,49 +1,139 @@
 import json
 import logging
-from calendar import monthrange
 from datetime import date, datetime, timedelta, timezone
 from pathlib import Path
 
 from bson import ObjectId
-from flask import Flask, request, render_template, redirect, url_for, make_response
+from flask import Blueprint, Flask, Response, abort, request, render_template, redirect, stream_with_context, url_for, make_response
+from markupsafe import Markup
+from werkzeug.middleware.proxy_fix import ProxyFix
 
-from activity_log import log_activity
+from activity_log import activity_entry, log_activities, log_activity
 from auth import (
+    HashingBusy,
+    auth_admission,
     clear_session_cookie,
     get_session_user_id,
     hash_password,
+    needs_rehash,
     set_session_cookie,
     verify_password,
     require_user,
 )
-from config import BASE_DIR
-from database import get_db
+from conditional import (
+    BOOKINGS_VERSIONS,
+    RENT_VERSIONS,
+    ROOMS_VERSIONS,
+    not_modified,
+    page_etag,
+    page_versions,
+    touch_bookings,
+    touch_rent,
+    with_etag,
+)
+from config import (
+    BASE_DIR,
+    HISTORY_MAX_PAGE_SIZE,
+    HISTORY_PAGE_SIZE,
+    METRICS_ENABLED,
+    SEARCH_RESULT_LIMIT,
+    TRUSTED_PROXIES,
+)
+from exports import EXPORT_FORMATS, EXPORTS, export_stream
+from live_updates import event_stream, live_feed
+import metrics
+import mutations
+import profiling
+import read_routing
+from onboarding import import_occupants
+from rate_limit import auth_ip_limiter, login_email_limiter
+from read_api import (
+    BOOKING_FIELDS,
+    OCCUPANT_FIELDS,
+    RENT_FIELDS,
+    ROOM_FIELDS,
+    booking_json,
+    bookings_view,
+    occupant_json,
+    occupants_view,
+    parse_fields,
+    rent_view,
+    room_json,
+    rooms_view,
+)
+from rent_import import decoded_lines, import_payments
+from rent_ledger import build_rent_ledger, floor_label, join_date_of, room_label
+from rent_summaries import TREND_DEFAULT_MONTHS, TREND_MAX_MONTHS, summary_for_month, trend
+from retention import log_page
+from room_sync import sync_rooms
+from search import name_tokens, query_tokens
+from storage import get_storage
+from summary_cache import floor_fragment_cache, get_occupancy, touch_tenant
+from warmup import readiness, warm_up, worker_warmup
 
 
 logger = logging.getLogger(__name__)
 
-# Create Flask app
-app = Flask(__name__, template_folder=str(BASE_DIR / "templates"), static_folder=str(BASE_DIR / "static"))
-app.config['SECRET_KEY'] = 'your-secret-key-here'  # For session management
+views = Blueprint("views", __name__)
+
+
+def create_app() -> Flask:
+    """Build the app without touching the database.
+
+    The Mongo client is created on first use in the process that serves
+    (see database.py), so `gunicorn --preload` never forks one. warm_up
+    opens the pool, ensures indexes and compiles the templates; gunicorn
+    runs it in post_worker_init, and otherwise the first request does.
+    """
+    app = Flask(__name__, template_folder=str(BASE_DIR / "templates"), static_folder=str(BASE_DIR / "static"))
+    app.config['SECRET_KEY'] = 'your-secret-key-here'  # For session management
+    if TRUSTED_PROXIES:
+        # Behind a load balancer remote_addr is the proxy; the login limiter
+        # needs the client address from X-Forwarded-For.
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES, x_proto=TRUSTED_PROXIES)
+
+    app.jinja_env.globals["live_updates"] = live_feed.enabled
+
+    @app.before_request
+    def _warm_up_worker():
+        worker_warmup.ensure(app)
 
+    if METRICS_ENABLED:
+        metrics.init_app(app)
+    profiling.init_app(app)
+    read_routing.init_app(app)
+    app.register_blueprint(views)
+    return app
 
 
+def wants_json() -> bool:
+    """True when a mutation was sent by the pages' fetch() handlers.
 
+    Those ask for JSON and get back just what changed (a room's counts, a
+    rent row, a booking) to patch into the page, instead of a redirect
+    that re-renders it. Plain form posts keep the redirect.
+    """
+    return request.accept_mimetypes.best_match(["text/html", "application/json"]) == "application/json"
 
-def floor_label(floor_num: int) -> str:
-    return "Ground Floor" if floor_num == 0 else f"Floor {floor_num}"
 
 
 # ---------- Pages (GET) ----------
 
 
-@app.route("/favicon.ico")
+@views.route("/favicon.ico")
 def favicon():
     """Avoid 404 for browser favicon requests."""
     return "", 204
 
 
-@app.route("/login", methods=["GET"])
+@views.route("/ready")
+def ready():
+    """Readiness probe: 200 once this worker is warm and Mongo answers."""
+    body, status = readiness()
+    return body, status
+
+
+@views.route("/login", methods=["GET"])
 def login_page():
     user_id = get_session_user_id()
     if user_id:
@@ -52,7 +142,7 @@ def login_page():
     return render_template("login.html", error=error)
 
 
-@app.route("/register", methods=["GET"])
+@views.route("/register", methods=["GET"])
 def register_page():
     user_id = get_session_user_id()
     if user_id:
@@ -61,47 +151,31 @@ def register_page():
     return render_template("register.html", error=error)
 
 
-@app.route("/")
-@app.route("/main")
+@views.route("/")
+@views.route("/main")
 @require_user
 def main_page(user_id):
-    db = get_db()
+    store = get_storage()
     uid = ObjectId(user_id)
-    config = db.config.find_one({"userId": uid})
+    config = store.config.get(uid)
     if not config or not config.get("floorConfigs"):
         return redirect("/config")
-    rooms = list(db.rooms.find({"userId": uid}).sort([("floor", 1), ("roomNumber", 1)]))
-    by_floor = {}
-    for r in rooms:
-        fid = r["floor"]
-        if fid not in by_floor:
-            by_floor[fid] = []
-        fill = len(r.get("occupantIds") or [])
-        by_floor[fid].append(
-            {
-                "_id": str(r["_id"]),
-                "floor": r["floor"],
-                "roomNumber": r["roomNumber"],
-                "maxPeople": r["maxPeople"],
-                "fillCount": fill,
-                "emptyCount": r["maxPeople"] - fill,
-            }
-        )
-    floor_numbers = sorted(by_floor.keys())
+    summary = get_occupancy(store, uid, config)
     return render_template(
         "main.html",
-        by_floor=by_floor,
-        floor_numbers=floor_numbers,
+        by_floor=summary["by_floor"],
+        floor_numbers=summary["floor_numbers"],
+        totals=summary["totals"],
         floor_label=floor_label,
     )
 
 
-@app.route("/config", methods=["GET"])
+@views.route("/config", methods=["GET"])
 @require_user
 def config_page(user_id):
-    db = get_db()
+    store = get_storage()
     uid = ObjectId(user_id)
-    config = db.config.find_one({"userId": uid})
+    config = store.config.get(uid)
     floor_configs = [{"rooms": [{"maxPeople": 2}]}]
     has_ground_floor = False
     if config and config.get("floorConfigs"):
@@ -119,107 +193,72 @@ def config_page(user_id):
     )
 
 
-@app.route("/rooms", methods=["GET"])
+@views.route("/rooms", methods=["GET"])
 @require_user
 def rooms_page(user_id):
-    db = get_db()
+    store = get_storage()
     uid = ObjectId(user_id)
-    config = db.config.find_one({"userId": uid})
+    config = store.config.get(uid)
     if not config or not config.get("floorConfigs"):
         return redirect("/config")
-    rooms = list(db.rooms.find({"userId": uid}).sort([("floor", 1), ("roomNumber", 1)]))
-    occupants = list(db.occupants.find({"userId": uid}).sort("dateOfJoin", -1))
-    rooms_list = []
-    for r in rooms:
-        oids = r.get("occupantIds") or []
-        fill = len(oids)
-        rooms_list.append(
-            {
-                "_id": str(r["_id"]),
-                "floor": r["floor"],
-                "roomNumber": r["roomNumber"],
-                "maxPeople": r["maxPeople"],
-                "fillCount": fill,
-                "emptyCount": r["maxPeople"] - fill,
-                "occupantIds": [str(x) for x in oids],
-            }
-        )
-    occupants_list = [
-        {"_id": str(o["_id"]), "roomId": str(o["roomId"]), "name": o["name"], "phone": o["phone"], "dateOfJoin": (o["dateOfJoin"].strftime("%Y-%m-%d") if isinstance(o.get("dateOfJoin"), datetime) else str(o.get("dateOfJoin", ""))[:10])}
-        for o in occupants
-    ]
-    by_floor = {}
-    for r in rooms_list:
-        fid = r["floor"]
-        if fid not in by_floor:
-            by_floor[fid] = []
-        by_floor[fid].append(r)
-    floor_numbers = sorted(by_floor.keys())
+    etag = page_etag(uid, config, ROOMS_VERSIONS)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    summary = get_occupancy(store, uid, config)
+    version = config.get("dataVersion", 0)
+    floor_sections = {}
+    for floor_num in summary["floor_numbers"]:
+        html = floor_fragment_cache.get((uid, floor_num), version)
+        if html is not None:
+            floor_sections[floor_num] = html
+    if len(floor_sections) < len(summary["floor_numbers"]):
+        occupants = store.occupants.list(uid)
+        by_room = {}
+        for o in occupants:
+            by_room.setdefault(str(o["roomId"]), []).append(
+                {"_id": str(o["_id"]), "name": o["name"], "phone": o["phone"], "dateOfJoin": (o["dateOfJoin"].strftime("%Y-%m-%d") if isinstance(o.get("dateOfJoin"), datetime) else str(o.get("dateOfJoin", ""))[:10])}
+            )
+        for floor_num in summary["floor_numbers"]:
+            if floor_num in floor_sections:
+                continue
+            rooms = [{**r, "occupants": by_room.get(r["_id"], [])} for r in summary["by_floor"][floor_num]]
+            html = Markup(render_template("_rooms_floor.html", floor_num=floor_num, rooms=rooms, floor_label=floor_label))
+            floor_fragment_cache.set((uid, floor_num), html, version)
+            floor_sections[floor_num] = html
     toast = request.args.get("toast")
-    return render_template(
+    body = render_template(
         "rooms.html",
-        by_floor=by_floor,
-        floor_numbers=floor_numbers,
-        occupants=occupants_list,
-        floor_label=floor_label,
+        floor_numbers=summary["floor_numbers"],
+        floor_sections=floor_sections,
         toast=toast,
+        live_versions=page_versions(config, ROOMS_VERSIONS),
     )
+    return with_etag(body, etag)
 
 
-@app.route("/rent", methods=["GET"])
+@views.route("/rent", methods=["GET"])
 @require_user
 def rent_page(user_id):
     month = request.args.get("month")
     today = date.today()
     month_key = month or f"{today.year}-{str(today.month).zfill(2)}"
-    db = get_db()
+    store = get_storage()
     uid = ObjectId(user_id)
+    config = store.config.get(uid)
+    # The month picker and the default month depend on the day too.
+    etag = page_etag(uid, config, RENT_VERSIONS, month_key, today.isoformat())
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
     parts = month_key.split("-")
     year, month_num = int(parts[0]), int(parts[1])
-    _, last_day_num = monthrange(year, month_num)
-    last_day = date(year, month_num, last_day_num)
-
-    occupants = list(db.occupants.find({"userId": uid}))
-    room_ids = list({str(o["roomId"]) for o in occupants})
-    rooms = list(db.rooms.find({"_id": {"$in": [ObjectId(rid) for rid in room_ids]}}))
-    room_map = {str(r["_id"]): r for r in rooms}
-
-    list_rows = []
-    for o in occupants:
-        join_dt = o["dateOfJoin"] if isinstance(o["dateOfJoin"], datetime) else datetime.fromisoformat(str(o["dateOfJoin"])[:10])
-        join_date = join_dt.date() if hasattr(join_dt, "date") else join_dt
-        if join_date > last_day:
-            continue
-        room = room_map.get(str(o["roomId"]))
-        room_label = (floor_label(room["floor"]) + " - Room " + str(room["roomNumber"])) if room else "—"
-        record = db.rentRecords.find_one(
-            {"userId": uid, "occupantId": o["_id"], "month": month_key}
-        )
-        if not record:
-            db.rentRecords.insert_one(
-                {
-                    "userId": uid,
-                    "occupantId": o["_id"],
-                    "roomId": o["roomId"],
-                    "month": month_key,
-                    "paid": False,
-                    "dueAmount": 0,
-                }
-            )
-            record = {"paid": False, "dueAmount": 0}
-        list_rows.append(
-            {
-                "occupantId": str(o["_id"]),
-                "roomId": str(o["roomId"]),
-                "roomLabel": room_label,
-                "name": o["name"],
-                "phone": o["phone"],
-                "dateOfJoin": join_date.isoformat()[:10] if hasattr(join_date, "isoformat") else str(join_date)[:10],
-                "paid": record.get("paid", False),
-                "dueAmount": record.get("dueAmount", 0),
-            }
-        )
-    list_rows.sort(key=lambda x: (x["roomLabel"], x["name"]))
+    # A read: the rollover job and add_occupant create the records, and a
+    # missing one shows as unpaid until a toggle writes it. The rows are
+    # the occupants who had joined by the month's end, so the header counts
+    # the ones without a record as unpaid too.
+    list_rows = build_rent_ledger(store, uid, month_key, create_missing=False)
+    summary = summary_for_month(store, uid, month_key, occupants=len(list_rows))
 
     months = []
     d = date(today.year - 1, 1, 1)
@@ -238,22 +277,50 @@ def rent_page(user_id):
         month_options.append({"value": m, "label": datetime(y, mn, 1).strftime("%B %Y")})
 
     toast = request.args.get("toast")
-    return render_template(
+    body = render_template(
         "rent.html",
         month=month_key,
         month_label=month_label,
         list=list_rows,
         month_options=month_options,
+        summary=summary,
         toast=toast,
+        live_versions=page_versions(config, RENT_VERSIONS),
     )
+    return with_etag(body, etag)
 
 
-@app.route("/advance-booking", methods=["GET"])
+@views.route("/rent/trend", methods=["GET"])
+@require_user
+def rent_trend_page(user_id):
+    try:
+        months = int(request.args.get("months") or TREND_DEFAULT_MONTHS)
+    except ValueError:
+        months = TREND_DEFAULT_MONTHS
+    months = max(1, min(months, TREND_MAX_MONTHS))
+    rows = trend(get_storage(), ObjectId(user_id), months)
+    for row in rows:
+        y, mn = int(row["month"][:4]), int(row["month"][5:7])
+        row["label"] = datetime(y, mn, 1).strftime("%B %Y")
+    return render_template(
+        "rent_trend.html",
+        rows=rows,
+        months=months,
+        month_choices=[6, 12, 24, TREND_MAX_MONTHS],
+    )
+
+
+@views.route("/advance-booking", methods=["GET"])
 @require_user
 def advance_booking_page(user_id):
-    db = get_db()
+    store = get_storage()
     uid = ObjectId(user_id)
-    bookings = list(db.advanceBookings.find({"userId": uid}).sort("expectedJoinDate", 1))
+    config = store.config.get(uid)
+    etag = page_etag(uid, config, BOOKINGS_VERSIONS)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    bookings = store.bookings.list(uid)
     bookings_list = [
         {
             "_id": str(b["_id"]),
@@ -266,47 +333,70 @@ def advance_booking_page(user_id):
     ]
     error = request.args.get("error")
     toast = request.args.get("toast")
-    return render_template(
+    body = render_template(
         "advance_booking.html",
         bookings=bookings_list,
         error=error,
         toast=toast,
+        live_versions=page_versions(config, BOOKINGS_VERSIONS),
     )
+    return with_etag(body, etag)
 
 
-@app.route("/history", methods=["GET"])
+HISTORY_TYPES = (
+    "person_created", "person_removed", "advance_booking_added", "advance_booking_removed",
+    "rent_paid", "rent_unpaid", "config_updated",
+)
+
+
+def history_filters(args) -> dict:
+    """The from/to/name/type query args of /history as storage filters."""
+    from_date = args.get("from")
+    to_date = args.get("to")
+    type_filter = args.get("type")
+    filters = {}
+    if from_date:
+        try:
+            filters["from"] = datetime.fromisoformat(from_date.replace("Z", "+00:00"))
+        except Exception:
+            pass
+    if to_date:
+        try:
+            end = datetime.fromisoformat(to_date.replace("Z", "+00:00"))
+            filters["to"] = end.replace(hour=23, minute=59, second=59, microsecond=999999)
+        except Exception:
+            pass
+    tokens = query_tokens(args.get("name"))
+    if tokens:
+        filters["nameTokens"] = tokens
+    if type_filter and type_filter.strip() in HISTORY_TYPES:
+        filters["type"] = type_filter.strip()
+    return filters
+
+
+@views.route("/history", methods=["GET"])
 @require_user
 def history_page(user_id):
-    db = get_db()
+    store = get_storage()
     uid = ObjectId(user_id)
     from_date = request.args.get("from")
     to_date = request.args.get("to")
     name = request.args.get("name")
     type_filter = request.args.get("type")
-    
-    filter_q = {"userId": uid}
-    if from_date or to_date:
-        filter_q["createdAt"] = {}
-        if from_date:
-            try:
-                filter_q["createdAt"]["$gte"] = datetime.fromisoformat(from_date.replace("Z", "+00:00"))
-            except Exception:
-                pass
-        if to_date:
-            try:
-                end = datetime.fromisoformat(to_date.replace("Z", "+00:00"))
-                end = end.replace(hour=23, minute=59, second=59, microsecond=999999)
-                filter_q["createdAt"]["$lte"] = end
-            except Exception:
-                pass
-    if name and name.strip():
-        filter_q["name"] = {"$regex": name.strip(), "$options": "i"}
-    if type_filter and type_filter.strip() in (
-        "person_created", "person_removed", "advance_booking_added", "advance_booking_removed",
-        "rent_paid", "rent_unpaid", "config_updated",
-    ):
-        filter_q["type"] = type_filter.strip()
-    logs = list(db.activityLogs.find(filter_q).sort("createdAt", -1).limit(500))
+    filters = history_filters(request.args)
+    try:
+        page_size = int(request.args.get("limit") or HISTORY_PAGE_SIZE)
+    except ValueError:
+        page_size = HISTORY_PAGE_SIZE
+    page_size = max(1, min(page_size, HISTORY_MAX_PAGE_SIZE))
+    logs, next_cursor, prev_cursor = log_page(store, uid, filters, request.args.get("cursor"), page_size)
+    page_args = {
+        k: v
+        for k, v in (("from", from_date), ("to", to_date), ("name", name), ("type", type_filter))
+        if v
+    }
+    if request.args.get("limit"):
+        page_args["limit"] = page_size
     type_labels = {
         "person_created": "Person added",
         "person_removed": "Person removed",
@@ -334,37 +424,189 @@ def history_page(user_id):
         to_date=to_date or "",
         name_filter=name or "",
         type_filter=type_filter or "",
+        export_args={k: v for k, v in page_args.items() if k != "limit"},
+        next_url=url_for(".history_page", cursor=next_cursor, **page_args) if next_cursor else None,
+        prev_url=url_for(".history_page", cursor=prev_cursor, **page_args) if prev_cursor else None,
+    )
+
+
+@views.route("/export/<kind>.<fmt>", methods=["GET"])
+@require_user
+def export_data(user_id, kind, fmt):
+    """Stream history, rent or occupants as CSV/NDJSON with the /history filters."""
+    if kind not in EXPORTS or fmt not in EXPORT_FORMATS:
+        abort(404)
+    stream = export_stream(get_storage(), ObjectId(user_id), kind, history_filters(request.args), fmt)
+    filename = f"{kind}-{date.today().isoformat()}.{fmt}"
+    return Response(
+        stream_with_context(stream),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            # Let nginx pass chunks through as they are generated.
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+@views.route("/events", methods=["GET"])
+@require_user
+def live_events(user_id):
+    """Server-Sent Events for the tenant's changes; see live_updates.py."""
+    if not live_feed.enabled:
+        # 204 tells EventSource not to reconnect.
+        return "", 204
+    stream = event_stream(live_feed, get_storage(), ObjectId(user_id), request.headers.get("Last-Event-ID"))
+    return Response(
+        stream,
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@views.route("/search", methods=["GET"])
+@require_user
+def search_page(user_id):
+    store = get_storage()
+    uid = ObjectId(user_id)
+    q = request.args.get("q", "")
+    occupants_list = []
+    bookings_list = []
+    tokens = query_tokens(q)
+    if tokens:
+        occupants = store.occupants.search(uid, tokens, SEARCH_RESULT_LIMIT)
+        room_ids = list({o["roomId"] for o in occupants})
+        room_map = {r["_id"]: r for r in store.rooms.get_many(uid, room_ids)}
+        occupants_list = [
+            {
+                "_id": str(o["_id"]),
+                "roomLabel": room_label(room_map.get(o["roomId"])),
+                "name": o["name"],
+                "phone": o["phone"],
+                "dateOfJoin": join_date_of(o).isoformat()[:10],
+            }
+            for o in occupants
+        ]
+        occupants_list.sort(key=lambda x: (x["name"], x["roomLabel"]))
+        bookings = store.bookings.search(uid, tokens, SEARCH_RESULT_LIMIT)
+        bookings_list = [
+            {
+                "_id": str(b["_id"]),
+                "name": b["name"],
+                "phone": b["phone"],
+                "expectedJoinDate": (b["expectedJoinDate"].strftime("%Y-%m-%d") if isinstance(b.get("expectedJoinDate"), datetime) else str(b.get("expectedJoinDate", ""))[:10]),
+            }
+            for b in bookings
+        ]
+    return render_template(
+        "search.html",
+        q=q,
+        occupants=occupants_list,
+        bookings=bookings_list,
+        searched=bool(tokens),
+    )
+
+
+# ---------- JSON read API ----------
+
+
+def api_read(user_id, versions: tuple[str, ...], allowed: tuple[str, ...], build, *extra):
+    """Answer an /api/* GET: parse ?fields, honour If-None-Match, else build the body."""
+    try:
+        fields = parse_fields(request.args.get("fields"), allowed)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    store = get_storage()
+    uid = ObjectId(user_id)
+    config = store.config.get(uid) or {}
+    etag = page_etag(uid, config, versions, request.path, ",".join(fields), *extra)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    return with_etag(build(store, uid, config, fields), etag)
+
+
+@views.route("/api/rooms", methods=["GET"])
+@require_user
+def api_rooms(user_id):
+    return api_read(
+        user_id, ROOMS_VERSIONS, ROOM_FIELDS, lambda store, uid, config, fields: {"rooms": rooms_view(store, uid, config, fields)}
+    )
+
+
+@views.route("/api/occupants", methods=["GET"])
+@require_user
+def api_occupants(user_id):
+    return api_read(
+        user_id, ROOMS_VERSIONS, OCCUPANT_FIELDS, lambda store, uid, config, fields: {"occupants": occupants_view(store, uid, fields)}
+    )
+
+
+@views.route("/api/rent", methods=["GET"])
+@require_user
+def api_rent(user_id):
+    month = request.args.get("month") or date.today().strftime("%Y-%m")
+    try:
+        datetime.strptime(month, "%Y-%m")
+    except ValueError:
+        return {"error": "month must be YYYY-MM"}, 400
+    return api_read(
+        user_id,
+        RENT_VERSIONS,
+        RENT_FIELDS,
+        lambda store, uid, config, fields: {"month": month, "rent": rent_view(store, uid, month, fields)},
+        month,
+    )
+
+
+@views.route("/api/bookings", methods=["GET"])
+@require_user
+def api_bookings(user_id):
+    return api_read(
+        user_id, BOOKINGS_VERSIONS, BOOKING_FIELDS, lambda store, uid, config, fields: {"bookings": bookings_view(store, uid, fields)}
     )
 
 
 # ---------- Auth actions ----------
 
 
-@app.route("/login", methods=["POST"])
+@views.route("/login", methods=["POST"])
+@auth_admission("/login")
 def login_action():
     email = request.form.get("email", "")
     password = request.form.get("password", "")
     from_path = request.form.get("from", "/main")
     
-    db = get_db()
-    user = db.users.find_one({"email": email.strip().lower()})
+    email_clean = email.strip().lower()
+    if not auth_ip_limiter.allow(request.remote_addr or "-") or not login_email_limiter.allow(email_clean):
+        return redirect("/login?error=Too+many+attempts,+try+again+later")
+    store = get_storage()
+    user = store.users.find_by_email(email_clean)
     if not user or not verify_password(password, user["passwordHash"]):
         return redirect("/login?error=Invalid+email+or+password")
+    if needs_rehash(user["passwordHash"]):
+        try:
+            store.users.update_password_hash(user["_id"], hash_password(password))
+        except HashingBusy:
+            pass  # keep the old hash; retried at the next login
     
     response = make_response(redirect(from_path or "/main"))
     set_session_cookie(response, str(user["_id"]))
     return response
 
 
-@app.route("/register", methods=["POST"])
+@views.route("/register", methods=["POST"])
+@auth_admission("/register")
 def register_action():
     name = request.form.get("name", "")
     email = request.form.get("email", "")
     password = request.form.get("password", "")
     
-    db = get_db()
+    if not auth_ip_limiter.allow(request.remote_addr or "-"):
+        return redirect("/register?error=Too+many+attempts,+try+again+later")
+    store = get_storage()
     email_clean = email.strip().lower()
-    existing = db.users.find_one({"email": email_clean})
+    existing = store.users.find_by_email(email_clean)
     if existing:
         return redirect("/register?error=Email+already+registered")
     if len(password) < 6:
@@ -374,13 +616,13 @@ def register_action():
         "passwordHash": hash_password(password),
         "name": name.strip(),
     }
-    result = db.users.insert_one(doc)
+    user_oid = store.users.insert(doc)
     response = make_response(redirect("/config"))
-    set_session_cookie(response, str(result.inserted_id))
+    set_session_cookie(response, str(user_oid))
     return response
 
 
-@app.route("/logout", methods=["POST"])
+@views.route("/logout", methods=["POST"])
 def logout_action():
     response = make_response(redirect("/login"))
     clear_session_cookie(response)
@@ -390,7 +632,7 @@ def logout_action():
 # ---------- Config save ----------
 
 
-@app.route("/config/save", methods=["POST"])
+@views.route("/config/save", methods=["POST"])
 @require_user
 def config_save(user_id):
     config_json = request.form.get("config_json")
@@ -414,47 +656,25 @@ def config_save(user_id):
             floor_configs.append({"rooms": rooms})
     if not floor_configs or not any(f.get("rooms") for f in floor_configs):
         return redirect("/config?error=At+least+one+floor+with+one+room+required")
-    db = get_db()
+    store = get_storage()
     uid = ObjectId(user_id)
-    db.config.update_one(
-        {"userId": uid},
+    store.config.save(
+        uid,
         {
-            "$set": {
-                "userId": uid,
-                "floors": len(floor_configs),
-                "hasGroundFloor": has_ground_floor,
-                "floorConfigs": floor_configs,
-                "updatedAt": datetime.now(timezone.utc),
-            }
+            "floors": len(floor_configs),
+            "hasGroundFloor": has_ground_floor,
+            "floorConfigs": floor_configs,
+            "updatedAt": datetime.now(timezone.utc),
         },
-        upsert=True,
     )
-    rooms_to_sync = []
-    for idx, fc in enumerate(floor_configs):
-        floor_num = idx if has_ground_floor else idx + 1
-        for ridx, r in enumerate(fc["rooms"]):
-            rooms_to_sync.append({"floor": floor_num, "roomNumber": ridx + 1, "maxPeople": r.get("maxPeople", 2)})
-    for r in rooms_to_sync:
-        existing = db.rooms.find_one({"userId": uid, "floor": r["floor"], "roomNumber": r["roomNumber"]})
-        if existing:
-            db.rooms.update_one({"_id": existing["_id"]}, {"$set": {"maxPeople": r["maxPeople"]}})
-        else:
-            db.rooms.insert_one(
-                {"userId": uid, "floor": r["floor"], "roomNumber": r["roomNumber"], "maxPeople": r["maxPeople"], "occupantIds": []}
-            )
-    existing_rooms = list(db.rooms.find({"userId": uid}))
-    expected_keys = {f"{x['floor']}-{x['roomNumber']}" for x in rooms_to_sync}
-    for ex in existing_rooms:
-        key = f"{ex['floor']}-{ex['roomNumber']}"
-        if key not in expected_keys:
-            db.occupants.delete_many({"roomId": ex["_id"]})
-            db.rooms.delete_one({"_id": ex["_id"]})
+    sync = sync_rooms(store, uid, floor_configs, has_ground_floor)
+    touch_tenant(store, uid)
     log_activity(
         user_id,
         "config_updated",
         "Building config",
-        f"Configuration updated: {len(floor_configs)} floor(s), {len(rooms_to_sync)} room(s)",
-        {"floors": len(floor_configs), "roomCount": len(rooms_to_sync)},
+        f"Configuration updated: {len(floor_configs)} floor(s), {sync['roomCount']} room(s)",
+        {"floors": len(floor_configs), **sync},
     )
     return redirect("/main")
 
@@ -462,7 +682,7 @@ def config_save(user_id):
 # ---------- Occupants ----------
 
 
-@app.route("/occupants/add", methods=["POST"])
+@views.route("/occupants/add", methods=["POST"])
 @require_user
 def add_occupant(user_id):
     room_id = request.form.get("room_id", "")
@@ -470,60 +690,76 @@ def add_occupant(user_id):
     phone = request.form.get("phone", "")
     date_of_join = request.form.get("date_of_join")
     
-    db = get_db()
+    store = get_storage()
     uid = ObjectId(user_id)
     rid = ObjectId(room_id)
-    room = db.rooms.find_one({"_id": rid, "userId": uid})
-    if not room:
-        return redirect("/rooms?toast=Room+not+found")
-    if len(room.get("occupantIds") or []) >= room["maxPeople"]:
-        return redirect("/rooms?toast=Room+is+full")
     join_date = datetime.fromisoformat(date_of_join[:10]) if date_of_join else datetime.now(timezone.utc)
-    occupant = {
-        "userId": uid,
-        "roomId": rid,
-        "name": name.strip(),
-        "phone": phone.strip(),
-        "dateOfJoin": join_date,
-    }
-    result = db.occupants.insert_one(occupant)
-    db.rooms.update_one({"_id": rid, "userId": uid}, {"$push": {"occupantIds": result.inserted_id}})
-    month_key = join_date.strftime("%Y-%m")
-    db.rentRecords.update_one(
-        {"userId": uid, "occupantId": result.inserted_id, "month": month_key},
+    occupant, error = mutations.add_occupant(
+        store,
+        uid,
+        rid,
         {
-            "$setOnInsert": {
-                "userId": uid,
-                "occupantId": result.inserted_id,
-                "roomId": rid,
-                "month": month_key,
-                "paid": False,
-                "dueAmount": 0,
-            }
+            "name": name.strip(),
+            "nameTokens": name_tokens(name),
+            "phone": phone.strip(),
+            "dateOfJoin": join_date,
         },
-        upsert=True,
     )
+    if error:
+        if wants_json():
+            return {"error": error}, 404 if error == "Room not found" else 409
+        return redirect(f"/rooms?toast={error.replace(' ', '+')}")
+    version = touch_tenant(store, uid)
     log_activity(
         user_id,
         "person_created",
         occupant["name"],
         f"Person added: {occupant['name']} ({occupant['phone']})",
-        {"occupantId": str(result.inserted_id), "roomId": room_id},
+        {"occupantId": str(occupant["_id"]), "roomId": room_id},
     )
+    if wants_json():
+        return {
+            "toast": "Person added",
+            "occupant": occupant_json(occupant),
+            "room": room_json(store.rooms.get(uid, rid)),
+            "versions": {"dataVersion": version},
+        }
     return redirect("/rooms?toast=Person+added")
 
 
-@app.route("/occupants/remove", methods=["POST"])
+@views.route("/occupants/import", methods=["GET", "POST"])
+@require_user
+def occupants_import(user_id):
+    if request.method == "GET":
+        return render_template("occupant_import.html", result=None, error=None)
+    upload = request.files.get("file")
+    if upload is None or not upload.filename:
+        return render_template("occupant_import.html", result=None, error="Choose a CSV file")
+    try:
+        result = import_occupants(
+            get_storage(), ObjectId(user_id), decoded_lines(upload.stream), request.form.get("auto_place") == "1"
+        )
+    except UnicodeDecodeError:
+        return render_template("occupant_import.html", result=None, error="File must be a UTF-8 CSV")
+    except ValueError as e:
+        return render_template("occupant_import.html", result=None, error=str(e))
+    return render_template("occupant_import.html", result=result, error=None)
+
+
+@views.route("/occupants/remove", methods=["POST"])
 @require_user
 def remove_occupant(user_id):
     occupant_id = request.form.get("occupant_id", "")
     
-    db = get_db()
+    store = get_storage()
     uid = ObjectId(user_id)
     oid = ObjectId(occupant_id)
-    occupant = db.occupants.find_one({"_id": oid, "userId": uid})
+    occupant = mutations.remove_occupant(store, uid, oid)
     if not occupant:
+        if wants_json():
+            return {"error": "Occupant not found"}, 404
         return redirect("/rooms?toast=Occupant+not+found")
+    version = touch_tenant(store, uid)
     log_activity(
         user_id,
         "person_removed",
@@ -531,38 +767,36 @@ def remove_occupant(user_id):
         f"Person removed: {occupant['name']} ({occupant['phone']})",
         {"occupantId": occupant_id},
     )
-    db.rooms.update_one({"_id": occupant["roomId"], "userId": uid}, {"$pull": {"occupantIds": oid}})
-    db.occupants.delete_one({"_id": oid, "userId": uid})
+    if wants_json():
+        room = store.rooms.get(uid, occupant["roomId"])
+        return {
+            "toast": "Person removed",
+            "occupantId": occupant_id,
+            "room": room_json(room) if room else None,
+            "versions": {"dataVersion": version},
+        }
     return redirect("/rooms?toast=Person+removed")
 
 
 # ---------- Rent toggle ----------
 
 
-@app.route("/rent/toggle", methods=["GET"])
+@views.route("/rent/toggle", methods=["GET"])
 @require_user
 def rent_toggle(user_id):
     occupant_id = request.args.get("occupant_id", "")
     month = request.args.get("month", "")
     
-    db = get_db()
+    store = get_storage()
     uid = ObjectId(user_id)
     oid = ObjectId(occupant_id)
-    occupant = db.occupants.find_one({"_id": oid, "userId": uid})
+    occupant = store.occupants.get(uid, oid)
     if not occupant:
+        if wants_json():
+            return {"error": "Not found"}, 404
         return redirect("/rent?toast=Not+found")
-    record = db.rentRecords.find_one({"userId": uid, "occupantId": oid, "month": month})
-    current_paid = record.get("paid", False) if record else False
-    new_paid = not current_paid
-    if record:
-        db.rentRecords.update_one(
-            {"userId": uid, "occupantId": oid, "month": month},
-            {"$set": {"paid": new_paid}},
-        )
-    else:
-        db.rentRecords.insert_one(
-            {"userId": uid, "occupantId": oid, "roomId": occupant["roomId"], "month": month, "paid": new_paid, "dueAmount": 0}
-        )
+    new_paid = mutations.toggle_rent(store, uid, occupant, month)
+    version = touch_rent(store, uid)
     log_activity(
         user_id,
         "rent_paid" if new_paid else "rent_unpaid",
@@ -570,14 +804,76 @@ def rent_toggle(user_id):
         f"Rent marked {'paid' if new_paid else 'unpaid'} for {occupant.get('name', 'Unknown')} ({month})",
         {"occupantId": occupant_id, "month": month},
     )
+    if wants_json():
+        return {
+            "toast": "Marked as paid" if new_paid else "Marked as unpaid",
+            "row": {"occupantId": occupant_id, "month": month, "paid": new_paid},
+            "summary": summary_for_month(store, uid, month),
+            "versions": {"rentVersion": version},
+        }
     toast = "Marked+as+paid" if new_paid else "Marked+as+unpaid"
     return redirect(f"/rent?month={month}&toast={toast}")
 
 
+@views.route("/rent/bulk", methods=["POST"])
+@require_user
+def rent_bulk(user_id):
+    month = request.form.get("month", "")
+    paid = request.form.get("paid") == "1"
+    try:
+        datetime.strptime(month, "%Y-%m")
+        occupant_ids = [ObjectId(i) for i in request.form.getlist("occupant_ids")]
+    except (ValueError, TypeError):
+        return redirect("/rent?toast=Invalid+selection")
+    if not occupant_ids:
+        return redirect(f"/rent?month={month}&toast=Nothing+selected")
+
+    store = get_storage()
+    uid = ObjectId(user_id)
+    changed = mutations.set_rent_paid(store, uid, occupant_ids, month, paid)
+    if changed:
+        touch_rent(store, uid)
+    state = "paid" if paid else "unpaid"
+    log_activities([
+        activity_entry(
+            user_id,
+            f"rent_{state}",
+            o.get("name", "Unknown"),
+            f"Rent marked {state} for {o.get('name', 'Unknown')} ({month})",
+            {"occupantId": str(o["_id"]), "month": month},
+        )
+        for o in changed
+    ])
+    return redirect(f"/rent?month={month}&toast=Marked+{len(changed)}+as+{state}")
+
+
+@views.route("/rent/import", methods=["POST"])
+@require_user
+def rent_import(user_id):
+    month = request.form.get("month", "")
+    upload = request.files.get("file")
+    try:
+        datetime.strptime(month, "%Y-%m")
+    except ValueError:
+        return redirect("/rent?toast=Invalid+month")
+    if upload is None or not upload.filename:
+        return redirect(f"/rent?month={month}&toast=Choose+a+CSV+file")
+    # Werkzeug spools large uploads to a temporary file; rows are decoded
+    # and written in chunks straight from it.
+    try:
+        totals = import_payments(get_storage(), ObjectId(user_id), decoded_lines(upload.stream), month)
+    except UnicodeDecodeError:
+        return redirect(f"/rent?month={month}&toast=File+must+be+a+UTF-8+CSV")
+    except ValueError as e:
+        return redirect(f"/rent?month={month}&toast={str(e).replace(' ', '+')}")
+    toast = f"Imported:+{totals['marked']}+marked+paid,+{totals['alreadyPaid']}+already+paid,+{totals['unmatched']}+unmatched"
+    return redirect(f"/rent?month={month}&toast={toast}")
+
+
 # ---------- Advance booking ----------
 
 
-@app.route("/advance-booking/add", methods=["POST"])
+@views.route("/advance-booking/add", methods=["POST"])
 @require_user
 def advance_booking_add(user_id):
     name = request.form.get("name", "")
@@ -585,40 +881,46 @@ def advance_booking_add(user_id):
     expected_join_date = request.form.get("expected_join_date")
     notes = request.form.get("notes")
     
-    db = get_db()
+    store = get_storage()
     uid = ObjectId(user_id)
     join_dt = datetime.fromisoformat(expected_join_date[:10]) if expected_join_date else datetime.now(timezone.utc)
     doc = {
         "userId": uid,
         "name": name.strip(),
+        "nameTokens": name_tokens(name),
         "phone": phone.strip(),
         "expectedJoinDate": join_dt,
         "notes": notes.strip() if notes else None,
         "createdAt": datetime.now(timezone.utc),
     }
-    result = db.advanceBookings.insert_one(doc)
+    booking_oid = store.bookings.insert(doc)
+    version = touch_bookings(store, uid)
     log_activity(
         user_id,
         "advance_booking_added",
         doc["name"],
         f"Advance booking added: {doc['name']} ({doc['phone']})",
-        {"bookingId": str(result.inserted_id)},
+        {"bookingId": str(booking_oid)},
     )
+    if wants_json():
+        return {"toast": "Booking added", "booking": booking_json({**doc, "_id": booking_oid}), "versions": {"bookingsVersion": version}}
     return redirect("/advance-booking?toast=Booking+added")
 
 
-@app.route("/advance-booking/remove", methods=["POST"])
+@views.route("/advance-booking/remove", methods=["POST"])
 @require_user
 def advance_booking_remove(user_id):
     booking_id = request.form.get("id", "")
     
-    db = get_db()
+    store = get_storage()
     uid = ObjectId(user_id)
     bid = ObjectId(booking_id)
-    booking = db.advanceBookings.find_one({"_id": bid, "userId": uid})
+    booking = store.bookings.delete(uid, bid)
     if not booking:
+        if wants_json():
+            return {"error": "Booking not found"}, 404
         return redirect("/advance-booking?toast=Booking+not+found")
-    db.advanceBookings.delete_one({"_id": bid, "userId": uid})
+    version = touch_bookings(store, uid)
     log_activity(
         user_id,
         "advance_booking_removed",
@@ -626,8 +928,14 @@ def advance_booking_remove(user_id):
         f"Advance booking removed: {booking['name']} ({booking['phone']})",
         {"bookingId": booking_id},
     )
+    if wants_json():
+        return {"toast": "Booking removed", "bookingId": booking_id, "versions": {"bookingsVersion": version}}
     return redirect("/advance-booking?toast=Booking+removed")
 
 
+app = create_app()
+
+
 if __name__ == "__main__":
+    warm_up(app)
     app.run(debug=True)
@@ -1,12 +1,26 @@
 import base64
 import hashlib
 import hmac
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
 from functools import wraps
 
 import bcrypt
 from flask import request, make_response, redirect
 
-from config import SESSION_COOKIE, SESSION_SECRET, SESSION_MAX_AGE
+from config import (
+    AUTH_CONCURRENCY,
+    BCRYPT_NICE,
+    BCRYPT_QUEUE_SIZE,
+    BCRYPT_ROUNDS,
+    BCRYPT_TIMEOUT,
+    BCRYPT_WORKERS,
+    SESSION_COOKIE,
+    SESSION_MAX_AGE,
+    SESSION_SECRET,
+)
 
 
 def _sign(value: str) -> str:
@@ -62,23 +76,145 @@ def clear_session_cookie(response) -> None:
     response.delete_cookie(key=SESSION_COOKIE, path="/")
 
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+class HashingBusy(Exception):
+    """The bcrypt pool is saturated or too slow; shed the request."""
 
 
-def verify_password(plain: str, hashed: str) -> bool:
+def _bcrypt_hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def _bcrypt_check(plain: str, hashed: str) -> bool:
     try:
         return bcrypt.checkpw(plain.encode("utf-8"), hashed.encode("utf-8"))
     except Exception:
         return False
 
 
+def _lower_priority(nice: int) -> None:
+    if nice:
+        os.nice(nice)
+
+
+class PasswordHasher:
+    """Runs bcrypt on a small process pool instead of the request thread.
+
+    At most workers + queue_size hashes are in flight per process; beyond
+    that, or when a result takes longer than timeout seconds, HashingBusy
+    is raised so the caller can turn the request away instead of queueing
+    it. Pool processes run at a raised nice level so page requests keep
+    the CPU during a login burst. workers=0 hashes inline.
+    """
+
+    def __init__(self, rounds: int = 12, workers: int = 2, queue_size: int = 16, timeout: float = 5.0, nice: int = 5):
+        self.rounds = rounds
+        self.workers = workers
+        self.timeout = timeout
+        self.nice = nice
+        self._slots = threading.BoundedSemaphore(max(1, workers + queue_size))
+        self._pool: ProcessPoolExecutor | None = None
+        self._pid: int | None = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ProcessPoolExecutor(self.workers, initializer=_lower_priority, initargs=(self.nice,))
+                self._pid = os.getpid()
+            return self._pool
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy()
+        try:
+            future = self._get_pool().submit(fn, *args)
+        except BrokenProcessPool:
+            self._slots.release()
+            with self._lock:
+                self._pool = None
+            raise HashingBusy()
+        # The slot is held until the hash finishes, even if we stop waiting.
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except (FutureTimeout, BrokenProcessPool):
+            raise HashingBusy()
+
+    def hash(self, password: str) -> str:
+        return self._run(_bcrypt_hash, password, self.rounds)
+
+    def verify(self, plain: str, hashed: str) -> bool:
+        return self._run(_bcrypt_check, plain, hashed)
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """True when hashed was made with a different cost than rounds."""
+        try:
+            return int(hashed.split("$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return False
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+password_hasher = PasswordHasher(
+    rounds=BCRYPT_ROUNDS,
+    workers=BCRYPT_WORKERS,
+    queue_size=BCRYPT_QUEUE_SIZE,
+    timeout=BCRYPT_TIMEOUT,
+    nice=BCRYPT_NICE,
+)
+
+
+def hash_password(password: str) -> str:
+    return password_hasher.hash(password)
+
+
+def verify_password(plain: str, hashed: str) -> bool:
+    return password_hasher.verify(plain, hashed)
+
+
+def needs_rehash(hashed: str) -> bool:
+    return password_hasher.needs_rehash(hashed)
+
+
+_auth_slots = threading.BoundedSemaphore(max(1, AUTH_CONCURRENCY))
+
+
+def auth_admission(busy_path: str):
+    """Cap concurrent login/register requests per process.
+
+    Requests over AUTH_CONCURRENCY, or whose bcrypt work cannot be queued,
+    are redirected to busy_path with an error instead of waiting.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not _auth_slots.acquire(blocking=False):
+                return redirect(f"{busy_path}?error=Server+busy,+please+try+again")
+            try:
+                return f(*args, **kwargs)
+            except HashingBusy:
+                return redirect(f"{busy_path}?error=Server+busy,+please+try+again")
+            finally:
+                _auth_slots.release()
+        return decorated_function
+    return decorator
+
+
 def require_user(f):
     """Decorator to require authentication for a route."""
     @wraps(f)
     def decorated_function(*args, **kwargs):
         user_id = get_session_user_id()
         if not user_id:
+            if request.path.startswith("/api/"):
+                return {"error": "Not signed in"}, 401
             from_path = request.path
             return redirect(f"/login?from={from_path}")
         return f(user_id=user_id, *args, **kwargs)
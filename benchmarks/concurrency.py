@@ -0,0 +1,107 @@
+"""Concurrency stress check for occupant and rent mutations.
+
+Hammers one room and one rent record from many threads against the MongoDB
+at MONGODB_URI (or the in-memory backend) and verifies the invariants the atomic updates guarantee:
+
+- concurrent adds never fill a room past maxPeople, and occupantIds always
+  matches the occupant documents;
+- concurrent removes of the same occupant succeed exactly once;
+- N concurrent rent toggles leave paid == (N is odd), with one record.
+
+    python -m benchmarks.concurrency --threads 32 --capacity 3 --toggles 101 [--backend memory]
+
+Exits non-zero if an invariant is violated.
+"""
+import argparse
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import MongoClient
+
+import mutations
+from config import MONGODB_URI
+from indexes import ensure_indexes
+from room_sync import diff_rooms
+from storage.memory import MemoryStorage
+from storage.mongo import MongoStorage
+
+BENCH_DB = "pg_management_bench"
+
+
+def check_adds(store, threads: int, capacity: int) -> list[str]:
+    uid = ObjectId()
+    store.rooms.apply_diff(uid, diff_rooms([], [{"floor": 1, "roomNumber": 1, "maxPeople": capacity}]))
+    rid = store.rooms.list(uid)[0]["_id"]
+
+    def attempt(i):
+        occupant = {"name": f"Racer {i}", "phone": str(i), "dateOfJoin": datetime(2025, 1, 1)}
+        return mutations.add_occupant(store, uid, rid, occupant)[0] is not None
+
+    with ThreadPoolExecutor(threads) as pool:
+        added = sum(pool.map(attempt, range(threads * 4)))
+    room = store.rooms.list(uid)[0]
+    docs = sum(o["roomId"] == rid for o in store.occupants.list(uid))
+    errors = []
+    if added != capacity or len(room["occupantIds"]) != capacity or docs != capacity:
+        errors.append(f"add: capacity {capacity}, added {added}, occupantIds {len(room['occupantIds'])}, documents {docs}")
+
+    victim = room["occupantIds"][0]
+    with ThreadPoolExecutor(threads) as pool:
+        removed = sum(r is not None for r in pool.map(lambda _: mutations.remove_occupant(store, uid, victim), range(threads)))
+    room = store.rooms.list(uid)[0]
+    if removed != 1 or victim in room["occupantIds"]:
+        errors.append(f"remove: succeeded {removed} times, still listed: {victim in room['occupantIds']}")
+    return errors
+
+
+def check_toggles(store, threads: int, toggles: int) -> list[str]:
+    uid = ObjectId()
+    occupant = {"_id": ObjectId(), "roomId": ObjectId()}
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(lambda _: mutations.toggle_rent(store, uid, occupant, "2025-01"), range(toggles)))
+    records = [r for r in store.rent.for_month(uid, "2025-01") if r["occupantId"] == occupant["_id"]]
+    errors = []
+    if len(records) != 1:
+        errors.append(f"toggle: {len(records)} records for one occupant-month")
+    elif records[0]["paid"] != (toggles % 2 == 1):
+        errors.append(f"toggle: {toggles} toggles left paid={records[0]['paid']}")
+    return errors
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--capacity", type=int, default=3)
+    parser.add_argument("--toggles", type=int, default=101)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--backend", choices=("mongo", "memory"), default="mongo")
+    args = parser.parse_args()
+    client = None
+    if args.backend == "memory":
+        store = MemoryStorage()
+    else:
+        client = MongoClient(MONGODB_URI, maxPoolSize=args.threads)
+        client.drop_database(BENCH_DB)
+        db = client[BENCH_DB]
+        ensure_indexes(db)
+        store = MongoStorage(lambda: db)
+    errors = []
+    try:
+        for _ in range(args.rounds):
+            errors += check_adds(store, args.threads, args.capacity)
+            errors += check_toggles(store, args.threads, args.toggles)
+    finally:
+        if client is not None:
+            client.drop_database(BENCH_DB)
+            client.close()
+    for e in errors:
+        print("FAIL", e, file=sys.stderr)
+    if not errors:
+        print(f"OK: {args.rounds} rounds, {args.threads} threads, {args.backend} backend")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""Page latency during a login storm.
+
+Measures /rooms and /rent latency for a signed-in tenant while background
+threads hammer POST /login, first with bcrypt inline on the request thread
+and then on the bcrypt process pool. Runs against the in-memory backend, so
+no database is needed.
+
+    python -m benchmarks.login_storm --attackers 16 --seconds 5
+"""
+import argparse
+import threading
+import time
+
+import auth
+from app import app
+from benchmarks.routes import percentile
+from config import BCRYPT_NICE, BCRYPT_QUEUE_SIZE, BCRYPT_ROUNDS, BCRYPT_TIMEOUT, BCRYPT_WORKERS
+from rate_limit import auth_ip_limiter, login_email_limiter
+from storage import set_storage
+from storage.memory import MemoryStorage
+
+
+def seed() -> object:
+    client = app.test_client()
+    client.post("/register", data={"name": "Storm", "email": "storm@example.com", "password": "storm-password"})
+    client.post("/config/save", data={"floor_count": "3", "floor_0_rooms": "10", "floor_1_rooms": "10", "floor_2_rooms": "10"})
+    return client
+
+
+def measure(client, seconds: float) -> list[float]:
+    latencies = []
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for path in ("/rooms", "/rent"):
+            start = time.perf_counter()
+            client.get(path)
+            latencies.append((time.perf_counter() - start) * 1000)
+    return sorted(latencies)
+
+
+def storm(attackers: int, stop: threading.Event, counts: dict) -> list[threading.Thread]:
+    def attack():
+        client = app.test_client()
+        while not stop.is_set():
+            response = client.post("/login", data={"email": "storm@example.com", "password": "wrong-password"})
+            key = "shed" if "busy" in response.headers.get("Location", "") else "verified"
+            counts[key] = counts.get(key, 0) + 1
+
+    threads = [threading.Thread(target=attack, daemon=True) for _ in range(attackers)]
+    for t in threads:
+        t.start()
+    return threads
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--attackers", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    set_storage(MemoryStorage())
+    # Let every attempt reach bcrypt; this measures CPU isolation, not rate limits.
+    auth_ip_limiter.rate = login_email_limiter.rate = 0
+    client = seed()
+    pooled = auth.PasswordHasher(BCRYPT_ROUNDS, max(1, BCRYPT_WORKERS), BCRYPT_QUEUE_SIZE, BCRYPT_TIMEOUT, BCRYPT_NICE)
+    inline = auth.PasswordHasher(BCRYPT_ROUNDS, 0)
+
+    print(f"{'scenario':<16} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'pages':>7} {'logins':>7} {'shed':>6}")
+    for label, hasher, attackers in (("idle", inline, 0), ("storm inline", inline, args.attackers), ("storm pooled", pooled, args.attackers)):
+        auth.password_hasher = hasher
+        stop = threading.Event()
+        counts = {}
+        threads = storm(attackers, stop, counts)
+        latencies = measure(client, args.seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        print(
+            f"{label:<16} {percentile(latencies, 50):>8.1f} {percentile(latencies, 95):>8.1f} {percentile(latencies, 99):>8.1f} "
+            f"{len(latencies):>7} {counts.get('verified', 0):>7} {counts.get('shed', 0):>6}"
+        )
+    pooled.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Round-trip benchmark for the /rent ledger.
+
+Seeds a scratch database with tenants of growing size and counts the Mongo
+commands issued by build_rent_ledger for a cold month (records missing) and a
+warm one (records present). The count should stay flat as occupants grow.
+
+    python -m benchmarks.rent_ledger --sizes 10,100,400,1000
+"""
+import argparse
+import time
+from collections import Counter
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import MongoClient, monitoring
+
+from config import MONGODB_URI
+from rent_ledger import build_rent_ledger
+from storage.mongo import MongoStorage
+
+BENCH_DB = "pg_management_bench"
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.counts = Counter()
+
+    def started(self, event):
+        self.counts[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def reset(self) -> None:
+        self.counts.clear()
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+
+def seed_tenant(db, occupant_count: int, per_room: int = 4) -> ObjectId:
+    uid = ObjectId()
+    room_count = (occupant_count + per_room - 1) // per_room
+    rooms = [
+        {"_id": ObjectId(), "userId": uid, "floor": i // 20 + 1, "roomNumber": i % 20 + 1, "maxPeople": per_room, "occupantIds": []}
+        for i in range(room_count)
+    ]
+    occupants = []
+    for i in range(occupant_count):
+        room = rooms[i // per_room]
+        oid = ObjectId()
+        room["occupantIds"].append(oid)
+        occupants.append(
+            {"_id": oid, "userId": uid, "roomId": room["_id"], "name": f"Occupant {i}", "phone": f"9{i:09d}", "dateOfJoin": datetime(2024, 1, 1)}
+        )
+    if rooms:
+        db.rooms.insert_many(rooms)
+    if occupants:
+        db.occupants.insert_many(occupants)
+    return uid
+
+
+def run(sizes: list[int], month_key: str) -> list[dict]:
+    counter = CommandCounter()
+    client = MongoClient(MONGODB_URI, event_listeners=[counter])
+    client.drop_database(BENCH_DB)
+    db = client[BENCH_DB]
+    store = MongoStorage(lambda: db)
+    results = []
+    try:
+        for size in sizes:
+            uid = seed_tenant(db, size)
+            row = {"occupants": size}
+            for phase in ("cold", "warm"):
+                counter.reset()
+                start = time.perf_counter()
+                rows = build_rent_ledger(store, uid, month_key)
+                row[f"{phase}_ms"] = (time.perf_counter() - start) * 1000
+                row[f"{phase}_commands"] = counter.total
+                assert len(rows) == size
+            results.append(row)
+    finally:
+        client.drop_database(BENCH_DB)
+        client.close()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10,100,400,1000")
+    parser.add_argument("--month", default="2025-01")
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    print(f"{'occupants':>10} {'cold cmds':>10} {'cold ms':>10} {'warm cmds':>10} {'warm ms':>10}")
+    for r in run(sizes, args.month):
+        print(f"{r['occupants']:>10} {r['cold_commands']:>10} {r['cold_ms']:>10.1f} {r['warm_commands']:>10} {r['warm_ms']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
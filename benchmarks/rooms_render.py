@@ -0,0 +1,82 @@
+"""Render-time benchmark for /rooms.
+
+Compares the per-room ``selectattr`` scan the template used to do against
+the grouped, per-floor fragment rendering rooms_page does now, for a
+growing number of occupants. No database is needed.
+
+    python -m benchmarks.rooms_render --sizes 100,500,2000,5000
+"""
+import argparse
+import time
+
+from flask import Flask, render_template, render_template_string
+from markupsafe import Markup
+
+from config import BASE_DIR
+from rent_ledger import floor_label
+
+LEGACY_FLOOR = """
+{% for room in rooms %}
+  {% set room_occupants = occupants | selectattr('roomId', 'equalto', room._id) | list %}
+  {% for o in room_occupants %}{{ o.name }} — {{ o.phone }}{% endfor %}
+{% endfor %}
+"""
+
+flask_app = Flask(__name__, template_folder=str(BASE_DIR / "templates"))
+
+
+def synthetic(occupant_count: int, per_room: int = 3, rooms_per_floor: int = 20):
+    room_count = (occupant_count + per_room - 1) // per_room
+    by_floor = {}
+    for i in range(room_count):
+        floor = i // rooms_per_floor + 1
+        by_floor.setdefault(floor, []).append(
+            {"_id": f"r{i}", "floor": floor, "roomNumber": i % rooms_per_floor + 1, "maxPeople": per_room, "fillCount": 0, "emptyCount": per_room}
+        )
+    occupants = [
+        {"_id": f"o{i}", "roomId": f"r{i // per_room}", "name": f"Occupant {i}", "phone": f"9{i:09d}", "dateOfJoin": "2025-01-01"}
+        for i in range(occupant_count)
+    ]
+    return by_floor, occupants
+
+
+def render_grouped(by_floor: dict, occupants: list[dict]) -> str:
+    by_room = {}
+    for o in occupants:
+        by_room.setdefault(o["roomId"], []).append(o)
+    sections = {}
+    for floor_num, rooms in by_floor.items():
+        nested = [{**r, "occupants": by_room.get(r["_id"], [])} for r in rooms]
+        sections[floor_num] = Markup(render_template("_rooms_floor.html", floor_num=floor_num, rooms=nested, floor_label=floor_label))
+    return render_template("rooms.html", floor_numbers=sorted(sections), floor_sections=sections, toast=None)
+
+
+def render_legacy(by_floor: dict, occupants: list[dict]) -> str:
+    return "".join(render_template_string(LEGACY_FLOOR, rooms=rooms, occupants=occupants) for rooms in by_floor.values())
+
+
+def timed(fn, *args, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="100,500,2000,5000")
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    print(f"{'occupants':>10} {'grouped ms':>12} {'per occ us':>12} {'legacy ms':>12}")
+    with flask_app.test_request_context("/rooms"):
+        for size in sizes:
+            by_floor, occupants = synthetic(size)
+            grouped = timed(render_grouped, by_floor, occupants)
+            legacy = timed(render_legacy, by_floor, occupants, repeat=1)
+            print(f"{size:>10} {grouped:>12.1f} {grouped * 1000 / size:>12.1f} {legacy:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
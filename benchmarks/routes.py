@@ -0,0 +1,377 @@
+"""Route-level load benchmark.
+
+Seeds synthetic tenants through the app's own flows (register, config save,
+occupant adds, rent page visits and toggles), then drives every route with
+the Flask test client and reports p50/p95/p99 latency, requests per second,
+storage operations and Mongo commands per request. Results can be written
+as JSON and compared against an earlier run to catch regressions.
+
+    python -m benchmarks.routes --backend memory --occupants 400 --out run.json
+    python -m benchmarks.routes --baseline run.json
+"""
+import argparse
+import json
+import math
+import platform
+import re
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from pymongo import MongoClient
+
+import mutations
+from activity_log import activity_entry, activity_writer
+from app import app
+from benchmarks.rent_ledger import BENCH_DB, CommandCounter
+from config import HISTORY_PAGE_SIZE, MONGODB_URI
+from indexes import ensure_indexes
+from rate_limit import auth_ip_limiter, login_email_limiter
+from rent_ledger import recent_month_keys
+from search import name_tokens
+from storage import set_storage
+from storage.memory import MemoryStorage
+from storage.mongo import MongoStorage
+
+PASSWORD = "bench-password"
+LOG_TYPES = ("person_created", "person_removed", "rent_paid", "rent_unpaid", "config_updated")
+DELTA_HEADERS = {"Accept": "application/json"}
+FIRST_NAMES = ("Asha", "Ravi", "Meera", "Kiran", "Arjun", "Divya", "Farhan", "Lakshmi", "Neel", "Priya")
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """Nearest-rank percentile of already sorted samples."""
+    if not samples:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(samples)))
+    return samples[rank - 1]
+
+
+class Tenant:
+    def __init__(self, index: int, client, uid: ObjectId):
+        self.index = index
+        self.client = client
+        self.uid = uid
+        self.email = f"bench{index}@example.com"
+        self.rooms: list[dict] = []
+        self.occupants: list[dict] = []
+        self.months: list[str] = []
+        self.config_form: dict[str, str] = {}
+
+
+def expect_redirect(response, path: str) -> None:
+    location = response.headers.get("Location", "")
+    if response.status_code != 302 or "error=" in location or "full" in location or "not+found" in location.lower():
+        raise RuntimeError(f"{path} failed during seeding: {response.status_code} {location}")
+
+
+def seed_tenant(store, index: int, args) -> Tenant:
+    client = app.test_client()
+    email = f"bench{index}@example.com"
+    auth_ip_limiter.reset()
+    response = client.post("/register", data={"name": f"Bench {index}", "email": email, "password": PASSWORD})
+    expect_redirect(response, "/register")
+    tenant = Tenant(index, client, store.users.find_by_email(email)["_id"])
+
+    form = {"floor_count": str(args.floors)}
+    for i in range(args.floors):
+        form[f"floor_{i}_rooms"] = str(args.rooms_per_floor)
+        for j in range(args.rooms_per_floor):
+            form[f"floor_{i}_room_{j}_max"] = str(args.per_room)
+    tenant.config_form = form
+    expect_redirect(client.post("/config/save", data=form), "/config/save")
+    tenant.rooms = store.rooms.list(tenant.uid)
+
+    # Leave at least one free bed in the last room for the add/remove scenario.
+    capacity = len(tenant.rooms) * args.per_room
+    tenant.months = recent_month_keys(args.months)
+    join_date = tenant.months[0] + "-01"
+    for i in range(min(args.occupants, capacity - 1)):
+        room = tenant.rooms[i // args.per_room]
+        name = f"{FIRST_NAMES[i % len(FIRST_NAMES)]} Tenant{i}"
+        data = {"room_id": str(room["_id"]), "name": name, "phone": f"9{i:09d}", "date_of_join": join_date}
+        expect_redirect(client.post("/occupants/add", data=data), "/occupants/add")
+    tenant.occupants = store.occupants.list(tenant.uid)
+
+    # Rent history: visiting each month creates its records; most get paid.
+    for month in tenant.months[:-1]:
+        client.get(f"/rent?month={month}")
+        for i, o in enumerate(tenant.occupants):
+            if i % 10 < args.paid_tenths:
+                client.get(f"/rent/toggle?occupant_id={o['_id']}&month={month}")
+
+    # Top the activity log up to the requested volume, spread over the months.
+    missing = args.logs - len(store.logs.page(tenant.uid, {}, None, args.logs)[0])
+    start = datetime.fromisoformat(join_date).replace(tzinfo=timezone.utc)
+    span = (datetime.now(timezone.utc) - start).total_seconds()
+    batch = []
+    for i in range(max(0, missing)):
+        o = tenant.occupants[i % len(tenant.occupants)] if tenant.occupants else {"name": "Building config"}
+        created = start + timedelta(seconds=span * i / max(1, missing))
+        batch.append(
+            activity_entry(str(tenant.uid), LOG_TYPES[i % len(LOG_TYPES)], o["name"], f"Synthetic entry {i}", created_at=created)
+        )
+        if len(batch) >= 1000:
+            store.logs.insert_many(batch)
+            batch = []
+    if batch:
+        store.logs.insert_many(batch)
+    return tenant
+
+
+def scenarios(store, tenants: list[Tenant]) -> dict:
+    """Route name -> fn(tenant, i) that prepares and returns one request.
+
+    Preparation (finding a cursor, freeing the spare bed, creating the
+    occupant or booking to remove) goes straight to storage and is not timed
+    or counted; only the returned call is.
+    """
+    current = recent_month_keys(1)[0]
+
+    def spare_room(t):
+        # Undo earlier walk-ins so the last room has its free bed again.
+        room = t.rooms[-1]
+        seeded = {o["_id"] for o in t.occupants}
+        # rooms.get_many projects only labels on Mongo; get() carries occupantIds.
+        for oid in store.rooms.get(t.uid, room["_id"])["occupantIds"]:
+            if oid not in seeded:
+                mutations.remove_occupant(store, t.uid, oid)
+        return room
+
+    def walk_in(i):
+        return {"name": f"Walkin {i}", "phone": "9000000000", "dateOfJoin": datetime.fromisoformat(current + "-01")}
+
+    def history_next(t, i):
+        cursor = store.logs.page(t.uid, {}, None, HISTORY_PAGE_SIZE)[1]
+        return lambda: t.client.get(f"/history?cursor={cursor}" if cursor else "/history")
+
+    def occupant_add(t, i, headers=None):
+        room = spare_room(t)
+        data = {"room_id": str(room["_id"]), "name": walk_in(i)["name"], "phone": "9000000000", "date_of_join": current + "-01"}
+        return lambda: t.client.post("/occupants/add", data=data, headers=headers)
+
+    def occupant_remove(t, i, headers=None):
+        occupant, _ = mutations.add_occupant(store, t.uid, spare_room(t)["_id"], walk_in(i))
+        return lambda: t.client.post("/occupants/remove", data={"occupant_id": str(occupant["_id"])}, headers=headers)
+
+    def as_delta(scenario):
+        # The same request as sent by the pages' fetch() handlers.
+        return lambda t, i: scenario(t, i, headers=DELTA_HEADERS)
+
+    def booking_add(t, i):
+        data = {"name": f"Booker {i}", "phone": "9111111111", "expected_join_date": current + "-28"}
+        return lambda: t.client.post("/advance-booking/add", data=data)
+
+    def booking_remove(t, i):
+        bid = store.bookings.insert(
+            {"userId": t.uid, "name": f"Booker {i}", "nameTokens": name_tokens(f"Booker {i}"), "phone": "9111111111",
+             "expectedJoinDate": datetime.fromisoformat(current + "-28"), "notes": None, "createdAt": datetime.now(timezone.utc)}
+        )
+        return lambda: t.client.post("/advance-booking/remove", data={"id": str(bid)})
+
+    def toggle_path(t, i):
+        return f"/rent/toggle?occupant_id={t.occupants[i % len(t.occupants)]['_id']}&month={current}"
+
+    def rent_bulk(t, i):
+        # Alternate so every run flips the whole month one way or the other.
+        data = {"month": current, "paid": "1" if i % 2 == 0 else "0", "occupant_ids": [str(o["_id"]) for o in t.occupants]}
+        return lambda: t.client.post("/rent/bulk", data=data)
+
+    def login(t, i):
+        # Measure bcrypt and the route, not the per-IP/email rate limits.
+        auth_ip_limiter.reset()
+        login_email_limiter.reset()
+        return lambda: t.client.post("/login", data={"email": t.email, "password": PASSWORD})
+
+    def get(path, headers=None):
+        return lambda t, i: (lambda: t.client.get(path(t, i) if callable(path) else path, headers=headers))
+
+    def revalidate(path):
+        # A repeat visit: the client already holds the page's current ETag.
+        def prepare(t, i):
+            etag = t.client.get(path).headers.get("ETag", "")
+            return lambda: t.client.get(path, headers={"If-None-Match": etag})
+        return prepare
+
+    return {
+        "GET /main": get("/main"),
+        "GET /rooms": get("/rooms"),
+        "GET /config": get("/config"),
+        "GET /rent": get(f"/rent?month={current}"),
+        "GET /rent (history)": get(lambda t, i: f"/rent?month={t.months[0]}"),
+        "GET /rooms (304)": revalidate("/rooms"),
+        "GET /rent (304)": revalidate(f"/rent?month={current}"),
+        "GET /api/rooms": get("/api/rooms"),
+        "GET /api/rent": get(f"/api/rent?month={current}&fields=occupantId,paid"),
+        "GET /rent/trend": get("/rent/trend?months=12"),
+        "GET /history": get("/history"),
+        "GET /history (page 2)": history_next,
+        "GET /history?type": get("/history?type=rent_paid"),
+        "GET /history?name": get(lambda t, i: f"/history?name={FIRST_NAMES[i % len(FIRST_NAMES)]}"),
+        "GET /search": get(lambda t, i: f"/search?q={FIRST_NAMES[i % len(FIRST_NAMES)][:3]}"),
+        "GET /advance-booking": get("/advance-booking"),
+        "GET /advance-booking (304)": revalidate("/advance-booking"),
+        "GET /rent/toggle": get(toggle_path),
+        "GET /rent/toggle (json)": get(toggle_path, DELTA_HEADERS),
+        "POST /rent/bulk": rent_bulk,
+        "POST /config/save": lambda t, i: (lambda: t.client.post("/config/save", data=t.config_form)),
+        "POST /occupants/add": occupant_add,
+        "POST /occupants/add (json)": as_delta(occupant_add),
+        "POST /occupants/remove": occupant_remove,
+        "POST /occupants/remove (json)": as_delta(occupant_remove),
+        "POST /advance-booking/add": booking_add,
+        "POST /advance-booking/remove": booking_remove,
+        "POST /login": login,
+    }
+
+
+def drive(store, counter, tenants: list[Tenant], routes: dict, requests: int, warmup: int) -> dict:
+    results = {}
+    for name, scenario in routes.items():
+        latencies, commands, ops, errors = [], 0, 0, 0
+        for i in range(warmup + requests):
+            tenant = tenants[i % len(tenants)]
+            call = scenario(tenant, i)
+            if counter is not None:
+                counter.reset()
+            store.reset_op_counts()
+            start = time.perf_counter()
+            response = call()
+            elapsed = time.perf_counter() - start
+            if i < warmup:
+                continue
+            latencies.append(elapsed * 1000)
+            commands += counter.total if counter is not None else 0
+            ops += sum(store.op_counts.values())
+            if response.status_code >= 400 or re.search(r"error=|not\+found", response.headers.get("Location", ""), re.I):
+                errors += 1
+        latencies.sort()
+        total = sum(latencies) / 1000
+        results[name] = {
+            "requests": len(latencies),
+            "errors": errors,
+            "p50_ms": round(percentile(latencies, 50), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            "p99_ms": round(percentile(latencies, 99), 3),
+            "mean_ms": round(sum(latencies) / len(latencies), 3),
+            "rps": round(len(latencies) / total, 1) if total else 0.0,
+            "storage_ops_per_request": round(ops / len(latencies), 2),
+            "mongo_commands_per_request": round(commands / len(latencies), 2) if counter is not None else None,
+        }
+    return results
+
+
+def run(args) -> dict:
+    counter = client = None
+    if args.backend == "mongo":
+        counter = CommandCounter()
+        client = MongoClient(MONGODB_URI, event_listeners=[counter])
+        client.drop_database(BENCH_DB)
+        db = client[BENCH_DB]
+        ensure_indexes(db)
+        store = MongoStorage(lambda: db)
+    else:
+        store = MemoryStorage()
+    set_storage(store)
+    # Log writes are counted against the request that made them.
+    synchronous, activity_writer.synchronous = activity_writer.synchronous, True
+    try:
+        seed_start = time.perf_counter()
+        tenants = [seed_tenant(store, i, args) for i in range(args.tenants)]
+        seed_seconds = time.perf_counter() - seed_start
+        routes = scenarios(store, tenants)
+        if args.routes:
+            wanted = [r.strip() for r in args.routes.split(",")]
+            routes = {name: fn for name, fn in routes.items() if any(w in name for w in wanted)}
+        results = drive(store, counter, tenants, routes, args.requests, args.warmup)
+    finally:
+        activity_writer.synchronous = synchronous
+        set_storage(None)
+        if client is not None:
+            client.drop_database(BENCH_DB)
+            client.close()
+    return {
+        "meta": {
+            "backend": args.backend,
+            "created": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "seed_seconds": round(seed_seconds, 2),
+            "scale": {
+                "tenants": args.tenants,
+                "floors": args.floors,
+                "rooms_per_floor": args.rooms_per_floor,
+                "per_room": args.per_room,
+                "occupants": args.occupants,
+                "months": args.months,
+                "logs": args.logs,
+            },
+            "requests": args.requests,
+            "warmup": args.warmup,
+        },
+        "routes": results,
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Routes whose p95 grew beyond tolerance or that issue more commands."""
+    regressions = []
+    if current["meta"]["scale"] != baseline["meta"]["scale"] or current["meta"]["backend"] != baseline["meta"]["backend"]:
+        print("warning: baseline was recorded with a different backend or scale", file=sys.stderr)
+    print(f"\n{'route':<30} {'p95 ms':>9} {'base':>9} {'change':>8} {'cmds':>6} {'base':>6}")
+    for name, row in current["routes"].items():
+        base = baseline["routes"].get(name)
+        if base is None:
+            continue
+        change = row["p95_ms"] / base["p95_ms"] - 1 if base["p95_ms"] else 0.0
+        cmds, base_cmds = row["mongo_commands_per_request"], base.get("mongo_commands_per_request")
+        print(f"{name:<30} {row['p95_ms']:>9.2f} {base['p95_ms']:>9.2f} {change:>+8.0%} {cmds if cmds is not None else '-':>6} {base_cmds if base_cmds is not None else '-':>6}")
+        if change > tolerance:
+            regressions.append(f"{name}: p95 {base['p95_ms']:.2f} -> {row['p95_ms']:.2f} ms")
+        if cmds is not None and base_cmds is not None and cmds > base_cmds:
+            regressions.append(f"{name}: commands/request {base_cmds} -> {cmds}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=("mongo", "memory"), default="mongo")
+    parser.add_argument("--tenants", type=int, default=2)
+    parser.add_argument("--floors", type=int, default=4)
+    parser.add_argument("--rooms-per-floor", type=int, default=10)
+    parser.add_argument("--per-room", type=int, default=3)
+    parser.add_argument("--occupants", type=int, default=100, help="per tenant, capped at capacity minus one")
+    parser.add_argument("--months", type=int, default=6, help="months of rent history, including this one")
+    parser.add_argument("--paid-tenths", type=int, default=8, help="share of past rent marked paid, in tenths")
+    parser.add_argument("--logs", type=int, default=2000, help="activity log entries per tenant")
+    parser.add_argument("--requests", type=int, default=50, help="timed requests per route")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--routes", help="comma-separated substrings selecting routes, e.g. 'rooms,history'")
+    parser.add_argument("--out", help="write results as JSON to this path")
+    parser.add_argument("--baseline", help="compare against a previous --out file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 growth over baseline")
+    args = parser.parse_args()
+
+    results = run(args)
+    print(f"seeded {args.tenants} tenant(s) in {results['meta']['seed_seconds']:.1f}s ({args.backend})")
+    print(f"{'route':<30} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'rps':>8} {'ops':>6} {'cmds':>6} {'err':>4}")
+    for name, r in results["routes"].items():
+        cmds = r["mongo_commands_per_request"]
+        print(
+            f"{name:<30} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['rps']:>8.1f} "
+            f"{r['storage_ops_per_request']:>6} {cmds if cmds is not None else '-':>6} {r['errors']:>4}"
+        )
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
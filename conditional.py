@@ -0,0 +1,82 @@
+"""Per-tenant data versions and conditional GETs (ETag / 304 Not Modified).
+
+The tenant's config document carries one counter per area of data:
+
+- dataVersion: rooms and occupants (summary_cache.touch_tenant)
+- rentVersion: rent records and summaries (touch_rent)
+- bookingsVersion: advance bookings (touch_bookings)
+
+Every mutation bumps its counter after writing. A page's ETag is a hash of
+the tenant, the counters the page reads, anything else it depends on (the
+month, today's date) and BUILD_ID, so one small config read decides
+whether the client's copy is still current. Pages read the versions before
+their data; a write racing the render can only make the ETag older than
+the body, never newer, so a stale page is never revalidated as fresh.
+"""
+import hashlib
+
+from bson import ObjectId
+from flask import Response, make_response, request
+
+from config import BASE_DIR
+
+ROOMS_VERSIONS = ("dataVersion",)
+RENT_VERSIONS = ("dataVersion", "rentVersion")
+BOOKINGS_VERSIONS = ("bookingsVersion",)
+
+
+def _build_id() -> str:
+    # Templates, styles and code change what a page looks like without
+    # touching any data version.
+    digest = hashlib.sha1()
+    paths = [*BASE_DIR.glob("*.py"), *(BASE_DIR / "templates").glob("*.html"), *(BASE_DIR / "static").glob("*")]
+    for path in sorted(paths):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:12]
+
+
+BUILD_ID = _build_id()
+
+
+def touch_rent(store, uid: ObjectId) -> int:
+    """Record that a tenant's rent records changed; returns the new rentVersion."""
+    return store.config.bump_version(uid, "rentVersion")
+
+
+def touch_bookings(store, uid: ObjectId) -> int:
+    """Record that a tenant's advance bookings changed; returns the new bookingsVersion."""
+    return store.config.bump_version(uid, "bookingsVersion")
+
+
+def page_versions(config: dict | None, fields: tuple[str, ...]) -> dict:
+    """The counters a page was rendered at, for its live update script."""
+    config = config or {}
+    return {f: config.get(f, 0) for f in fields}
+
+
+def page_etag(uid: ObjectId, config: dict | None, fields: tuple[str, ...], *extra) -> str:
+    """Strong ETag for a view of the tenant's data at the config's versions."""
+    config = config or {}
+    parts = [BUILD_ID, str(uid), *(str(config.get(f, 0)) for f in fields), *(str(e) for e in extra)]
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:20]
+
+
+def _cache_headers(response: Response, etag: str) -> Response:
+    response.set_etag(etag)
+    # Keep a private copy but revalidate on every use; the answer is a 304
+    # unless the tenant's data changed.
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.vary.add("Cookie")
+    return response
+
+
+def not_modified(etag: str) -> Response | None:
+    """A 304 response if the request's If-None-Match already has etag."""
+    if etag not in request.if_none_match:
+        return None
+    return _cache_headers(Response(status=304), etag)
+
+
+def with_etag(body, etag: str) -> Response:
+    return _cache_headers(make_response(body), etag)
@@ -7,7 +7,82 @@ load_dotenv()
 
 BASE_DIR = Path(__file__).resolve().parent
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo")  # mongo | memory
 DB_NAME = "pg_management"
+# MongoClient pool (see database.py); these override the same options in
+# MONGODB_URI. Compressors are a comma list of zstd, snappy, zlib.
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))  # connections per worker
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))  # kept open; warm_up opens at least 1
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "0"))  # 0 = wait for a free connection
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "20000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "30000"))
+MONGO_COMPRESSORS = [c.strip() for c in os.getenv("MONGO_COMPRESSORS", "").split(",") if c.strip()]
+# Read routing (read_routing.py): history, exports and the rent trend read
+# from secondaries no more than READ_MAX_STALENESS_SECONDS behind (MongoDB's
+# minimum is 90); writes carry a causal consistency token in CAUSAL_COOKIE.
+READ_ROUTING = os.getenv("READ_ROUTING", "1") != "0"
+READ_MAX_STALENESS_SECONDS = max(90, int(os.getenv("READ_MAX_STALENESS_SECONDS", "90")))
+CAUSAL_COOKIE = "pg_causal"
+# Longest a worker spends warming up (warmup.py) before taking requests anyway.
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "10"))
 SESSION_SECRET = os.getenv("SESSION_SECRET", "change-me-in-production")
 SESSION_COOKIE = "pg_session"
 SESSION_MAX_AGE = 60 * 60 * 24 * 7  # 7 days
+
+# Password hashing runs on a per-worker process pool (0 workers = inline).
+# Changing BCRYPT_ROUNDS rehashes each password at its next login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", "2"))
+BCRYPT_QUEUE_SIZE = int(os.getenv("BCRYPT_QUEUE_SIZE", "16"))  # waiting hashes before shedding
+BCRYPT_TIMEOUT = float(os.getenv("BCRYPT_TIMEOUT", "5"))  # seconds
+BCRYPT_NICE = int(os.getenv("BCRYPT_NICE", "5"))  # priority drop for pool processes
+AUTH_CONCURRENCY = int(os.getenv("AUTH_CONCURRENCY", "4"))  # in-flight login/register per worker
+LOGIN_IP_RATE = float(os.getenv("LOGIN_IP_RATE", "30"))  # login/register attempts per minute per IP
+LOGIN_IP_BURST = int(os.getenv("LOGIN_IP_BURST", "10"))
+LOGIN_EMAIL_RATE = float(os.getenv("LOGIN_EMAIL_RATE", "5"))  # login attempts per minute per email
+LOGIN_EMAIL_BURST = int(os.getenv("LOGIN_EMAIL_BURST", "5"))
+TRUSTED_PROXIES = int(os.getenv("TRUSTED_PROXIES", "0"))  # proxy hops whose X-Forwarded-For/-Proto to trust
+ENSURE_INDEXES = os.getenv("ENSURE_INDEXES", "1") != "0"
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "50"))
+HISTORY_MAX_PAGE_SIZE = 200
+SEARCH_RESULT_LIMIT = 50
+SUMMARY_CACHE_SIZE = int(os.getenv("SUMMARY_CACHE_SIZE", "1000"))  # tenants per worker
+SUMMARY_CACHE_TTL = int(os.getenv("SUMMARY_CACHE_TTL", "300"))  # seconds
+FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", "5000"))  # rendered floor sections per worker
+RENT_IMPORT_CHUNK_SIZE = int(os.getenv("RENT_IMPORT_CHUNK_SIZE", "500"))  # payments per bulk write
+ONBOARD_CHUNK_SIZE = int(os.getenv("ONBOARD_CHUNK_SIZE", "500"))  # occupants per bulk insert
+
+# Request/Mongo metrics; /metrics is served only when METRICS_TOKEN is set.
+# Warn when one request issues more than REQUEST_COMMAND_WARN Mongo commands
+# (0 disables the warning).
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+REQUEST_COMMAND_WARN = int(os.getenv("REQUEST_COMMAND_WARN", "25"))
+
+# Request profiling (see profiling.py); off unless a trigger is set.
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # e.g. 0.001 = 1 in 1000
+PROFILE_ROUTES = [r.strip() for r in os.getenv("PROFILE_ROUTES", "").split(",") if r.strip()]
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")  # profile requests sent with X-Profile: <token>
+PROFILE_MODE = os.getenv("PROFILE_MODE", "cprofile")  # cprofile | sample
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", str(BASE_DIR / "profiles"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "500"))
+
+# Activity log writer: "async" buffers entries for a background thread,
+# "sync" writes each entry before returning (tests, scripts).
+ACTIVITY_LOG_MODE = os.getenv("ACTIVITY_LOG_MODE", "async")
+ACTIVITY_LOG_BATCH_SIZE = int(os.getenv("ACTIVITY_LOG_BATCH_SIZE", "100"))
+ACTIVITY_LOG_FLUSH_MS = int(os.getenv("ACTIVITY_LOG_FLUSH_MS", "200"))
+ACTIVITY_LOG_QUEUE_SIZE = int(os.getenv("ACTIVITY_LOG_QUEUE_SIZE", "10000"))
+ACTIVITY_LOG_OVERFLOW = os.getenv("ACTIVITY_LOG_OVERFLOW", "drop_newest")  # drop_newest | drop_oldest | block
+# Days of activity kept in activityLogs; `python -m retention` archives the
+# rest (0 keeps everything in activityLogs).
+ACTIVITY_LOG_RETENTION_DAYS = int(os.getenv("ACTIVITY_LOG_RETENTION_DAYS", "0"))
+
+# Live updates (GET /events): Server-Sent Events fed by a MongoDB change
+# stream, which needs a replica set (a single node is enough). Off by default.
+LIVE_UPDATES = os.getenv("LIVE_UPDATES", "0") != "0"
+LIVE_STREAM_SECONDS = int(os.getenv("LIVE_STREAM_SECONDS", "300"))  # browsers reconnect after this
+LIVE_HEARTBEAT_SECONDS = int(os.getenv("LIVE_HEARTBEAT_SECONDS", "15"))
+LIVE_BUFFER_SIZE = int(os.getenv("LIVE_BUFFER_SIZE", "1000"))  # recent events kept for Last-Event-ID replay
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "100"))  # undelivered events per connection
@@ -1,15 +1,52 @@
+import os
+
 from pymongo import MongoClient
 
-from config import DB_NAME, MONGODB_URI
+from config import (
+    DB_NAME,
+    METRICS_ENABLED,
+    MONGO_COMPRESSORS,
+    MONGO_CONNECT_TIMEOUT_MS,
+    MONGO_MAX_POOL_SIZE,
+    MONGO_MIN_POOL_SIZE,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    MONGODB_URI,
+)
 
-# Sync MongoClient (serverless-friendly)
+# Sync MongoClient (serverless-friendly), one per process.
 mongo_client: MongoClient | None = None
+_client_pid: int | None = None
+
+
+def client_options() -> dict:
+    """Pool settings for MongoClient, from the MONGO_* variables."""
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    }
+    if MONGO_WAIT_QUEUE_TIMEOUT_MS:
+        options["waitQueueTimeoutMS"] = MONGO_WAIT_QUEUE_TIMEOUT_MS
+    if MONGO_COMPRESSORS:
+        options["compressors"] = MONGO_COMPRESSORS
+    return options
 
 
 def get_client() -> MongoClient:
-    global mongo_client
-    if mongo_client is None:
-        mongo_client = MongoClient(MONGODB_URI)
+    global mongo_client, _client_pid
+    # A client created before fork (gunicorn --preload) shares its sockets
+    # and monitor threads with the parent and is not safe to use in the
+    # child, so each process builds its own on first use.
+    if mongo_client is None or _client_pid != os.getpid():
+        listeners = []
+        if METRICS_ENABLED:
+            from metrics import command_listener
+
+            listeners.append(command_listener)
+        mongo_client = MongoClient(MONGODB_URI, event_listeners=listeners, **client_options())
+        _client_pid = os.getpid()
     return mongo_client
 
 
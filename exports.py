@@ -0,0 +1,136 @@
+"""Streaming CSV and NDJSON exports of history, rent records and occupants.
+
+Each export is a generator over a storage stream (a Mongo cursor with a
+projection, read EXPORT_BATCH_SIZE documents at a time), so the header goes
+out before the first query returns and memory stays flat however many rows
+match. The rent and occupant exports label rooms (and rent rows name their
+occupant) from one read each of the tenant's rooms and occupants, the same
+join /rent does.
+
+History continues into the activity log archive (retention.log_stream)
+when the date range reaches back past the retention window.
+
+All three take the /history filters: from/to bound createdAt for history,
+dateOfJoin for occupants and the month for rent; name matches the
+occupant's name; type filters history, and rent_paid / rent_unpaid filter
+rent records by status.
+"""
+import csv
+import io
+import json
+from collections.abc import Iterable, Iterator
+from datetime import datetime, timezone
+
+from bson import ObjectId
+
+from rent_ledger import room_label
+from retention import log_stream
+from search import name_tokens
+
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+ROWS_PER_CHUNK = 200
+
+HISTORY_COLUMNS = ("createdAt", "type", "name", "description", "metadata")
+RENT_COLUMNS = ("month", "room", "name", "phone", "paid", "dueAmount", "occupantRemoved")
+OCCUPANT_COLUMNS = ("name", "phone", "room", "dateOfJoin")
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        # Mongo hands back naive UTC datetimes.
+        return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    return value
+
+
+def _csv_cell(value):
+    value = _plain(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, separators=(",", ":")) if value else ""
+    return "" if value is None else value
+
+
+def serialize(rows: Iterable[dict], columns: tuple[str, ...], fmt: str) -> Iterator[str]:
+    """Encode rows as CSV (with a header) or NDJSON, ROWS_PER_CHUNK rows per chunk."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == "csv" else None
+    if writer is not None:
+        writer.writerow(columns)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    pending = 0
+    for row in rows:
+        if writer is not None:
+            writer.writerow([_csv_cell(row.get(c)) for c in columns])
+        else:
+            buffer.write(json.dumps({c: _plain(row.get(c)) for c in columns}, separators=(",", ":")) + "\n")
+        pending += 1
+        if pending >= ROWS_PER_CHUNK:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if pending:
+        yield buffer.getvalue()
+
+
+def history_rows(store, uid: ObjectId, filters: dict) -> Iterator[dict]:
+    for doc in log_stream(store, uid, filters):
+        yield {c: doc.get(c) for c in HISTORY_COLUMNS}
+
+
+def _month_of(value: datetime | None) -> str | None:
+    return value.strftime("%Y-%m") if value else None
+
+
+def rent_rows(store, uid: ObjectId, filters: dict) -> Iterator[dict]:
+    occupants = {o["_id"]: o for o in store.occupants.list(uid)}
+    rooms = {r["_id"]: r for r in store.rooms.list(uid)}
+    rent_filters = {"fromMonth": _month_of(filters.get("from")), "toMonth": _month_of(filters.get("to"))}
+    if filters.get("nameTokens"):
+        wanted = set(filters["nameTokens"])
+        rent_filters["occupantIds"] = [oid for oid, o in occupants.items() if wanted <= set(name_tokens(o.get("name")))]
+    if filters.get("type") in ("rent_paid", "rent_unpaid"):
+        rent_filters["paid"] = filters["type"] == "rent_paid"
+    for r in store.rent.stream(uid, rent_filters):
+        occupant = occupants.get(r["occupantId"]) or {}
+        yield {
+            "month": r["month"],
+            "room": room_label(rooms.get(r.get("roomId") or occupant.get("roomId"))),
+            "name": occupant.get("name", "—"),
+            "phone": occupant.get("phone", ""),
+            "paid": bool(r.get("paid")),
+            "dueAmount": r.get("dueAmount", 0),
+            "occupantRemoved": bool(r.get("removed")) or not occupant,
+        }
+
+
+def occupant_rows(store, uid: ObjectId, filters: dict) -> Iterator[dict]:
+    rooms = {r["_id"]: r for r in store.rooms.list(uid)}
+    occupant_filters = {k: filters[k] for k in ("from", "to", "nameTokens") if filters.get(k)}
+    for o in store.occupants.stream(uid, occupant_filters):
+        joined = o.get("dateOfJoin")
+        yield {
+            "name": o.get("name", ""),
+            "phone": o.get("phone", ""),
+            "room": room_label(rooms.get(o.get("roomId"))),
+            "dateOfJoin": joined.strftime("%Y-%m-%d") if isinstance(joined, datetime) else str(joined or "")[:10],
+        }
+
+
+EXPORTS = {
+    "history": (history_rows, HISTORY_COLUMNS),
+    "rent": (rent_rows, RENT_COLUMNS),
+    "occupants": (occupant_rows, OCCUPANT_COLUMNS),
+}
+
+
+def export_stream(store, uid: ObjectId, kind: str, filters: dict, fmt: str) -> Iterator[str]:
+    rows, columns = EXPORTS[kind]
+    return serialize(rows(store, uid, filters), columns, fmt)
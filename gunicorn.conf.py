@@ -0,0 +1,22 @@
+# Loaded automatically by `gunicorn app:app` from the project directory.
+
+
+def post_worker_init(worker):
+    # After fork and before the first request: open this worker's Mongo
+    # pool, ensure indexes and compile templates (see warmup.py).
+    from warmup import warm_up
+
+    report = warm_up(worker.wsgi)
+    worker.log.info("Worker %s warmed up in %ss%s", worker.pid, report["seconds"], f" (failed: {', '.join(report['errors'])})" if report["errors"] else "")
+
+
+def worker_exit(server, worker):
+    # Flush buffered activity log entries and stop the bcrypt pool and the
+    # change stream watcher before the worker goes away.
+    from activity_log import activity_writer
+    from auth import password_hasher
+    from live_updates import live_feed
+
+    activity_writer.shutdown()
+    password_hasher.shutdown()
+    live_feed.shutdown()
@@ -0,0 +1,266 @@
+"""Database index definitions.
+
+INDEXES declares, per collection, the indexes backing every query the
+routes issue through storage.mongo.
+ensure_indexes() creates them (idempotently) and runs at app startup,
+one collection at a time: a collection whose indexes fail to build (most
+often a unique index over existing duplicates) is reported and the rest are
+still created. find_duplicates() lists the key values that block each
+unique index:
+
+    python -m indexes --duplicates
+
+QUERY_SHAPES mirrors the route queries so that
+
+    python -m indexes --check
+
+can explain() each one and fail if any plan falls back to a COLLSCAN.
+"""
+import argparse
+import logging
+import sys
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+INDEXES: dict[str, list[IndexModel]] = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "config": [
+        IndexModel([("userId", ASCENDING)], name="userId_unique", unique=True),
+    ],
+    "rooms": [
+        IndexModel(
+            [("userId", ASCENDING), ("floor", ASCENDING), ("roomNumber", ASCENDING)],
+            name="userId_floor_roomNumber",
+            unique=True,
+        ),
+    ],
+    "occupants": [
+        IndexModel([("userId", ASCENDING), ("dateOfJoin", DESCENDING)], name="userId_dateOfJoin"),
+        IndexModel([("roomId", ASCENDING)], name="roomId"),
+        IndexModel([("userId", ASCENDING), ("nameTokens", ASCENDING)], name="userId_nameTokens"),
+    ],
+    "rentRecords": [
+        IndexModel(
+            [("userId", ASCENDING), ("occupantId", ASCENDING), ("month", ASCENDING)],
+            name="userId_occupantId_month_unique",
+            unique=True,
+        ),
+        IndexModel([("userId", ASCENDING), ("month", ASCENDING)], name="userId_month"),
+    ],
+    "rentSummaries": [
+        IndexModel([("userId", ASCENDING), ("month", ASCENDING)], name="userId_month_unique", unique=True),
+    ],
+    "advanceBookings": [
+        IndexModel([("userId", ASCENDING), ("expectedJoinDate", ASCENDING)], name="userId_expectedJoinDate"),
+        IndexModel(
+            [("userId", ASCENDING), ("nameTokens", ASCENDING), ("expectedJoinDate", ASCENDING)],
+            name="userId_nameTokens_expectedJoinDate",
+        ),
+    ],
+    "activityLogs": [
+        IndexModel(
+            [("userId", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)],
+            name="userId_createdAt_id",
+        ),
+        IndexModel(
+            [("userId", ASCENDING), ("type", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)],
+            name="userId_type_createdAt_id",
+        ),
+        IndexModel(
+            [("userId", ASCENDING), ("nameTokens", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)],
+            name="userId_nameTokens_createdAt_id",
+        ),
+        # retention.sweep: the oldest entries across all tenants.
+        IndexModel([("createdAt", ASCENDING), ("_id", ASCENDING)], name="createdAt_id"),
+    ],
+    "activityArchive": [
+        IndexModel([("userId", ASCENDING), ("month", ASCENDING), ("_id", ASCENDING)], name="userId_month_id"),
+    ],
+}
+
+# Indexes superseded by an entry above; ensure_indexes() drops them.
+RETIRED_INDEXES: dict[str, list[str]] = {
+    "activityLogs": ["userId_createdAt", "userId_type_createdAt"],
+}
+
+_SAMPLE_UID = ObjectId("000000000000000000000000")
+_SAMPLE_ID = ObjectId("000000000000000000000001")
+_SAMPLE_DT = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+# (route, collection, filter, sort) for every query the routes issue.
+QUERY_SHAPES: list[tuple[str, str, dict, list | None]] = [
+    ("/login", "users", {"email": "a@example.com"}, None),
+    ("/main", "config", {"userId": _SAMPLE_UID}, None),
+    ("/main", "rooms", {"userId": _SAMPLE_UID}, [("floor", 1), ("roomNumber", 1)]),
+    ("/rooms", "occupants", {"userId": _SAMPLE_UID}, [("dateOfJoin", -1)]),
+    ("/rent", "occupants", {"userId": _SAMPLE_UID}, [("dateOfJoin", -1)]),
+    ("/rent", "rooms", {"userId": _SAMPLE_UID}, [("floor", 1), ("roomNumber", 1)]),
+    ("/rent", "rentRecords", {"userId": _SAMPLE_UID, "month": "2000-01"}, None),
+    ("/rent/toggle", "rentRecords", {"userId": _SAMPLE_UID, "occupantId": _SAMPLE_ID, "month": "2000-01"}, None),
+    (
+        "/rent/bulk",
+        "rentRecords",
+        {"userId": _SAMPLE_UID, "month": "2000-01", "occupantId": {"$in": [_SAMPLE_ID]}},
+        None,
+    ),
+    ("/export/rent", "rentRecords", {"userId": _SAMPLE_UID, "month": {"$gte": "2000-01", "$lte": "2000-12"}}, [("month", 1)]),
+    ("/export/occupants", "occupants", {"userId": _SAMPLE_UID, "dateOfJoin": {"$gte": _SAMPLE_DT}}, [("dateOfJoin", 1)]),
+    ("/history (archive)", "activityArchive", {"userId": _SAMPLE_UID, "month": {"$lte": "2000-01"}}, [("month", -1), ("_id", -1)]),
+    ("retention sweep", "activityLogs", {"createdAt": {"$lt": _SAMPLE_DT}}, [("createdAt", 1), ("_id", 1)]),
+    ("/rent", "rentSummaries", {"userId": _SAMPLE_UID, "month": {"$in": ["2000-01"]}}, [("month", 1)]),
+    ("/rent/trend", "rentSummaries", {"userId": _SAMPLE_UID, "month": {"$in": ["2000-01", "2000-02"]}}, [("month", 1)]),
+    (
+        "/occupants/remove",
+        "rentRecords",
+        {"userId": _SAMPLE_UID, "occupantId": {"$in": [_SAMPLE_ID]}, "removed": {"$ne": True}},
+        None,
+    ),
+    ("/advance-booking", "advanceBookings", {"userId": _SAMPLE_UID}, [("expectedJoinDate", 1)]),
+    ("/history", "activityLogs", {"userId": _SAMPLE_UID}, [("createdAt", -1), ("_id", -1)]),
+    ("/history", "activityLogs", {"userId": _SAMPLE_UID, "createdAt": {"$gte": _SAMPLE_DT}}, [("createdAt", -1), ("_id", -1)]),
+    ("/history", "activityLogs", {"userId": _SAMPLE_UID, "type": "rent_paid"}, [("createdAt", -1), ("_id", -1)]),
+    ("/history?name", "activityLogs", {"userId": _SAMPLE_UID, "nameTokens": {"$all": ["ram"]}}, [("createdAt", -1), ("_id", -1)]),
+    ("/search", "occupants", {"userId": _SAMPLE_UID, "nameTokens": {"$all": ["ram"]}}, None),
+    ("/search", "rooms", {"_id": {"$in": [_SAMPLE_ID]}, "userId": _SAMPLE_UID}, None),
+    ("/search", "advanceBookings", {"userId": _SAMPLE_UID, "nameTokens": {"$all": ["ram"]}}, [("expectedJoinDate", 1)]),
+    (
+        "/history?cursor",
+        "activityLogs",
+        {
+            "$and": [
+                {"userId": _SAMPLE_UID},
+                {"$or": [{"createdAt": {"$lt": _SAMPLE_DT}}, {"createdAt": _SAMPLE_DT, "_id": {"$lt": _SAMPLE_ID}}]},
+            ]
+        },
+        [("createdAt", -1), ("_id", -1)],
+    ),
+    ("/config/save", "rooms", {"userId": _SAMPLE_UID}, [("floor", 1), ("roomNumber", 1)]),
+    ("/config/save", "occupants", {"userId": _SAMPLE_UID, "roomId": {"$in": [_SAMPLE_ID]}}, None),
+]
+
+
+def ensure_indexes(db) -> tuple[dict[str, list[str]], dict[str, str]]:
+    """Create every declared index. Safe to call on each startup.
+
+    Returns (created, failed): the index names per collection, and the error
+    for each collection whose indexes could not be built.
+    """
+    created, failed = {}, {}
+    for collection, models in INDEXES.items():
+        try:
+            created[collection] = db[collection].create_indexes(models)
+        except PyMongoError as e:
+            logger.warning("Creating indexes on %s failed: %s", collection, e)
+            failed[collection] = str(e)
+    for collection, names in RETIRED_INDEXES.items():
+        if collection in failed:
+            continue
+        try:
+            existing = set(db[collection].index_information())
+            for name in names:
+                if name in existing:
+                    db[collection].drop_index(name)
+        except PyMongoError as e:
+            logger.warning("Dropping retired indexes on %s failed: %s", collection, e)
+            failed[collection] = str(e)
+    return created, failed
+
+
+def find_duplicates(db, limit: int = 20) -> dict[str, list[dict]]:
+    """Key values held by more than one document, per unique index.
+
+    A unique index cannot be built while any exist. Keys are
+    "<collection>.<index name>"; each entry has the key value (_id), the
+    documents' ids and their count, up to limit entries per index.
+    """
+    found = {}
+    for collection, models in INDEXES.items():
+        for model in models:
+            spec = model.document
+            if not spec.get("unique"):
+                continue
+            fields = list(spec["key"])
+            groups = db[collection].aggregate(
+                [
+                    {"$group": {"_id": {f: f"${f}" for f in fields}, "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+                    {"$match": {"count": {"$gt": 1}}},
+                    {"$limit": limit},
+                ],
+                allowDiskUse=True,
+            )
+            duplicates = list(groups)
+            if duplicates:
+                found[f"{collection}.{spec['name']}"] = duplicates
+    return found
+
+
+def _plan_stages(plan) -> list[str]:
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(_plan_stages(item))
+    return stages
+
+
+def check_query_plans(db) -> list[tuple[str, str, dict, list[str]]]:
+    """Explain each QUERY_SHAPES entry; return the ones whose plan has a COLLSCAN."""
+    failures = []
+    for route, collection, filter_q, sort in QUERY_SHAPES:
+        cursor = db[collection].find(filter_q)
+        if sort:
+            cursor = cursor.sort(sort)
+        winning = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+        stages = _plan_stages(winning)
+        if "COLLSCAN" in stages:
+            failures.append((route, collection, filter_q, stages))
+    return failures
+
+
+def main(argv: list[str] | None = None) -> int:
+    from database import get_db
+
+    parser = argparse.ArgumentParser(description="Create indexes and verify query plans.")
+    parser.add_argument("--check", action="store_true", help="fail if any route query plans a COLLSCAN")
+    parser.add_argument("--duplicates", action="store_true", help="list documents that block a unique index, then exit")
+    args = parser.parse_args(argv)
+    db = get_db()
+    if args.duplicates:
+        found = find_duplicates(db)
+        for index, groups in found.items():
+            for group in groups:
+                print(f"{index} {group['_id']}: {group['count']} documents {[str(i) for i in group['ids']]}")
+        if not found:
+            print("OK: no duplicate keys")
+        return 1 if found else 0
+    created, failed = ensure_indexes(db)
+    for collection, names in created.items():
+        print(f"{collection}: {', '.join(names)}")
+    for collection, error in failed.items():
+        print(f"FAILED {collection}: {error}", file=sys.stderr)
+    if failed:
+        print("Run `python -m indexes --duplicates` to find what blocks a unique index.", file=sys.stderr)
+    if failed or not args.check:
+        return 1 if failed else 0
+    failures = check_query_plans(db)
+    for route, collection, filter_q, stages in failures:
+        print(f"COLLSCAN {route} {collection} {filter_q} -> {' > '.join(stages)}", file=sys.stderr)
+    if failures:
+        return 1
+    print(f"OK: {len(QUERY_SHAPES)} query shapes use indexes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,326 @@
+"""Live updates: Server-Sent Events fed by one MongoDB change stream per worker.
+
+GET /events keeps a text/event-stream open for the signed-in tenant. Each
+worker runs a single ChangeFeed thread that watches rooms, occupants,
+rentRecords, advanceBookings and config through one database-level change
+stream, reads userId off each change and fans it out to that tenant's
+open connections. Events:
+
+- rooms / occupants / rent / bookings: {"op": "insert", "id": "..."} for a
+  changed document. Deletes carry no userId unless the collection has
+  pre-images enabled; they still show up as a versions event, because
+  every mutation bumps a config version after writing.
+- versions: the tenant's dataVersion / rentVersion / bookingsVersion (see
+  conditional.py). Sent on connect and whenever they change; the pages
+  compare them with the versions they were rendered at and refresh.
+- reset: events may have been missed (the connection fell behind, or its
+  Last-Event-ID is older than the replay buffer); re-read everything.
+
+Every event's id is its change stream resume token. The feed keeps the
+last LIVE_BUFFER_SIZE events, so a reconnecting EventSource (which sends
+Last-Event-ID) gets only the tenant's events after that token instead of
+a full reload, and the watcher itself resumes from the last token it saw
+after an error. The buffer belongs to one worker: a reconnect served by a
+different worker (or after a restart) does not find its id and gets a
+reset, i.e. one reload. Sticky sessions keep reconnects on the same
+worker. Connections are closed after LIVE_STREAM_SECONDS and the browser
+reconnects, which keeps worker threads turning over.
+
+Change streams need a replica set; a single node is enough. Locally:
+
+    mongod --replSet rs0 --dbpath ./data/rs0 --port 27017
+    mongosh --eval 'rs.initiate()'
+    LIVE_UPDATES=1 python -m live_updates --user <userId>   # print the tenant's events
+
+Each open /events connection holds a worker thread, so serve with threads
+(gunicorn -k gthread --threads 16) when LIVE_UPDATES is on.
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from collections.abc import Callable, Iterator
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo.errors import OperationFailure, PyMongoError
+
+from config import (
+    LIVE_BUFFER_SIZE,
+    LIVE_HEARTBEAT_SECONDS,
+    LIVE_QUEUE_SIZE,
+    LIVE_STREAM_SECONDS,
+    LIVE_UPDATES,
+    STORAGE_BACKEND,
+)
+
+logger = logging.getLogger(__name__)
+
+# Collection -> event name.
+WATCHED = {
+    "rooms": "rooms",
+    "occupants": "occupants",
+    "rentRecords": "rent",
+    "advanceBookings": "bookings",
+    "config": "versions",
+}
+VERSION_FIELDS = ("dataVersion", "rentVersion", "bookingsVersion")
+# ChangeStreamHistoryLost, ChangeStreamFatalError: the resume token is unusable.
+_HISTORY_LOST_CODES = (280, 286)
+RETRY_SECONDS = 30
+
+
+def change_pipeline() -> list[dict]:
+    """$match and trim the database change stream to what the feed reads."""
+    keep = {"ns.coll": 1, "operationType": 1, "documentKey": 1, "fullDocument.userId": 1, "fullDocumentBeforeChange.userId": 1}
+    keep.update({f"fullDocument.{f}": 1 for f in VERSION_FIELDS})
+    return [
+        {"$match": {"ns.coll": {"$in": list(WATCHED)}, "operationType": {"$in": ["insert", "update", "replace", "delete"]}}},
+        {"$project": keep},
+    ]
+
+
+def open_mongo_stream(resume_after: dict | None):
+    from database import get_db
+
+    return get_db().watch(
+        change_pipeline(), full_document="updateLookup", resume_after=resume_after, max_await_time_ms=1000
+    )
+
+
+def versions_of(config: dict | None) -> dict:
+    config = config or {}
+    return {f: config.get(f, 0) for f in VERSION_FIELDS}
+
+
+def to_event(change: dict) -> tuple[ObjectId, dict] | None:
+    """(userId, event) for one change, or None if it names no tenant."""
+    doc = change.get("fullDocument") or change.get("fullDocumentBeforeChange") or {}
+    uid = doc.get("userId")
+    if uid is None:
+        return None
+    name = WATCHED[change["ns"]["coll"]]
+    if name == "versions":
+        data = versions_of(doc)
+    else:
+        data = {"op": change["operationType"], "id": str(change["documentKey"]["_id"])}
+    return uid, {"id": change["_id"]["_data"], "event": name, "data": data}
+
+
+def format_event(event: dict) -> str:
+    lines = []
+    if event.get("id"):
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['event']}")
+    lines.append(f"data: {json.dumps(event.get('data', {}), separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+RESET = {"event": "reset"}
+
+
+class Subscriber:
+    """One open /events connection: a bounded queue of its tenant's events."""
+
+    def __init__(self, uid: ObjectId, max_queue: int):
+        self.uid = uid
+        self.queue: queue.Queue = queue.Queue(max(1, max_queue))
+        self.lagged = False
+
+    def put(self, event: dict) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # A slow client: drop what is queued and tell it to re-read.
+            self.lagged = True
+
+    def get(self, timeout: float) -> dict | None:
+        if self.lagged:
+            self.lagged = False
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            return RESET
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class ChangeFeed:
+    """One change stream per process, fanned out to per-tenant subscribers.
+
+    open_stream(resume_after) must return a pymongo-style change stream
+    (context manager with try_next(), alive and resume_token). The watcher
+    thread starts with the first subscriber.
+    """
+
+    def __init__(
+        self,
+        open_stream: Callable | None,
+        buffer_size: int = 1000,
+        max_queue: int = 100,
+    ):
+        self.enabled = open_stream is not None
+        self._open_stream = open_stream
+        self.max_queue = max_queue
+        self.delivered = 0
+        self.resets = 0
+        self._recent: deque = deque(maxlen=max(1, buffer_size))  # (uid, event)
+        self._subscribers: dict[ObjectId, set[Subscriber]] = defaultdict(set)
+        self._token: dict | None = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._pid: int | None = None
+
+    def subscribe(self, uid: ObjectId, last_event_id: str | None = None) -> Subscriber:
+        """Register a connection; with last_event_id, queue what it missed."""
+        sub = Subscriber(uid, self.max_queue)
+        with self._lock:
+            self._ensure_watcher()
+            self._subscribers[uid].add(sub)
+            if last_event_id:
+                ids = [event["id"] for _, event in self._recent]
+                if last_event_id in ids:
+                    for owner, event in list(self._recent)[ids.index(last_event_id) + 1:]:
+                        if owner == uid:
+                            sub.put(event)
+                else:
+                    sub.put(RESET)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        with self._lock:
+            subs = self._subscribers.get(sub.uid)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.uid]
+
+    def publish(self, uid: ObjectId, event: dict) -> None:
+        with self._lock:
+            self._recent.append((uid, event))
+            for sub in self._subscribers.get(uid, ()):
+                sub.put(event)
+                self.delivered += 1
+
+    def reset_all(self) -> None:
+        """Tell every connection to re-read; events were lost."""
+        with self._lock:
+            self._recent.clear()
+            self.resets += 1
+            for subs in self._subscribers.values():
+                for sub in subs:
+                    sub.put(RESET)
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        thread = self._thread if self._pid == os.getpid() else None
+        if thread is not None:
+            thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            connections = sum(len(s) for s in self._subscribers.values())
+        return {"connections": connections, "delivered": self.delivered, "resets": self.resets, "buffered": len(self._recent)}
+
+    def _ensure_watcher(self) -> None:
+        # Same fork rule as the activity log writer: a thread inherited from
+        # the gunicorn master is not running here.
+        if not self.enabled or (self._thread is not None and self._thread.is_alive() and self._pid == os.getpid()):
+            return
+        self._stop.clear()
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name="live-updates-watcher", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        delay = 1
+        while not self._stop.is_set():
+            try:
+                with self._open_stream(self._token) as stream:
+                    delay = 1
+                    while not self._stop.is_set() and stream.alive:
+                        change = stream.try_next()
+                        if change is None:
+                            # Post-batch tokens move on while nothing matches,
+                            # so a restart does not rescan quiet history.
+                            self._token = stream.resume_token or self._token
+                            continue
+                        self._token = change["_id"]
+                        routed = to_event(change)
+                        if routed is not None:
+                            self.publish(*routed)
+            except OperationFailure as e:
+                if e.code in _HISTORY_LOST_CODES:
+                    logger.warning("Change stream history lost; restarting from now: %s", e)
+                    self._token = None
+                    self.reset_all()
+                else:
+                    logger.warning("Change stream failed: %s", e)
+            except PyMongoError as e:
+                logger.warning("Change stream interrupted: %s", e)
+            if not self._stop.is_set():
+                self._stop.wait(delay)
+                delay = min(delay * 2, RETRY_SECONDS)
+
+
+def event_stream(
+    feed: ChangeFeed,
+    store,
+    uid: ObjectId,
+    last_event_id: str | None = None,
+    max_seconds: float = LIVE_STREAM_SECONDS,
+    heartbeat: float = LIVE_HEARTBEAT_SECONDS,
+) -> Iterator[str]:
+    """The text/event-stream body for one connection."""
+    sub = feed.subscribe(uid, last_event_id)
+    try:
+        yield "retry: 3000\n\n"
+        # Subscribed before reading, so a change between the page render and
+        # this connection shows up either here or as a queued event.
+        yield format_event({"event": "versions", "data": versions_of(store.config.get(uid))})
+        deadline = time.monotonic() + max_seconds
+        while time.monotonic() < deadline:
+            event = sub.get(min(heartbeat, max(0.0, deadline - time.monotonic())))
+            yield format_event(event) if event is not None else ": keepalive\n\n"
+    finally:
+        feed.unsubscribe(sub)
+
+
+live_feed = ChangeFeed(
+    open_mongo_stream if LIVE_UPDATES and STORAGE_BACKEND == "mongo" else None,
+    buffer_size=LIVE_BUFFER_SIZE,
+    max_queue=LIVE_QUEUE_SIZE,
+)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Print a tenant's live update events as they happen.")
+    parser.add_argument("--user", required=True, help="tenant userId")
+    args = parser.parse_args(argv)
+    try:
+        uid = ObjectId(args.user)
+    except InvalidId:
+        print(f"Invalid userId: {args.user}")
+        return 1
+    if not live_feed.enabled:
+        print("Live updates are off; set LIVE_UPDATES=1 with STORAGE_BACKEND=mongo.")
+        return 1
+    from storage import get_storage
+
+    try:
+        for chunk in event_stream(live_feed, get_storage(), uid, max_seconds=float("inf")):
+            print(chunk, end="", flush=True)
+    except KeyboardInterrupt:
+        live_feed.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,270 @@
+"""Per-request Mongo command accounting and Prometheus metrics.
+
+command_listener is registered on the MongoClient and attributes every
+command to the request running on the same thread: command count, documents
+returned and time spent in Mongo. Commands issued outside a request (the
+activity log writer, CLIs) are recorded under route "background". Requests
+that issue more than REQUEST_COMMAND_WARN commands are logged as likely
+N+1 patterns.
+
+/metrics also reports the summary caches' hits, misses and evictions and the
+activity log writer's enqueued, flushed, dropped and failed entries.
+
+Figures live in process memory and /metrics renders them in the Prometheus
+text format when METRICS_TOKEN is set. Under gunicorn each worker keeps its
+own figures and labels them with its pid, so sum over pid when querying.
+"""
+import hmac
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from collections.abc import Mapping
+
+from pymongo import monitoring
+
+from activity_log import activity_writer
+from config import METRICS_TOKEN, REQUEST_COMMAND_WARN
+from summary_cache import floor_fragment_cache, occupancy_cache
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COMMAND_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+BACKGROUND = "background"
+
+
+class _RequestStats:
+    __slots__ = ("route", "started", "commands", "documents", "mongo_seconds", "by_command")
+
+    def __init__(self, route: str):
+        self.route = route
+        self.started = time.perf_counter()
+        self.commands = 0
+        self.documents = 0
+        self.mongo_seconds = 0.0
+        self.by_command: Counter = Counter()
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: Counter = Counter()  # (method, route, status)
+        self.durations: dict[tuple, _Histogram] = defaultdict(lambda: _Histogram(DURATION_BUCKETS))
+        self.commands_per_request: dict[tuple, _Histogram] = defaultdict(lambda: _Histogram(COMMAND_BUCKETS))
+        self.commands: Counter = Counter()  # (route, command name)
+        self.documents: Counter = Counter()  # route
+        self.mongo_seconds: Counter = Counter()  # route
+        self.warnings: Counter = Counter()  # route
+
+    def record_request(self, method: str, status: int, stats: _RequestStats) -> None:
+        elapsed = time.perf_counter() - stats.started
+        key = (method, stats.route)
+        with self._lock:
+            self.requests[(method, stats.route, str(status))] += 1
+            self.durations[key].observe(elapsed)
+            self.commands_per_request[key].observe(stats.commands)
+            for name, count in stats.by_command.items():
+                self.commands[(stats.route, name)] += count
+            self.documents[stats.route] += stats.documents
+            self.mongo_seconds[stats.route] += stats.mongo_seconds
+            over = REQUEST_COMMAND_WARN and stats.commands > REQUEST_COMMAND_WARN
+            if over:
+                self.warnings[stats.route] += 1
+        if over:
+            logger.warning(
+                "%s %s issued %d Mongo commands (%s); possible N+1 query pattern",
+                method, stats.route, stats.commands, dict(stats.by_command),
+            )
+
+    def record_background(self, name: str, documents: int, seconds: float) -> None:
+        with self._lock:
+            self.commands[(BACKGROUND, name)] += 1
+            self.documents[BACKGROUND] += documents
+            self.mongo_seconds[BACKGROUND] += seconds
+
+    def reset(self) -> None:
+        with self._lock:
+            for table in (self.requests, self.durations, self.commands_per_request, self.commands,
+                          self.documents, self.mongo_seconds, self.warnings):
+                table.clear()
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        pid = str(os.getpid())
+        lines = []
+        with self._lock:
+            _counter(lines, "pg_http_requests_total", "HTTP requests by route and status.",
+                     (({"method": m, "route": r, "status": s}, v) for (m, r, s), v in self.requests.items()), pid)
+            _histogram(lines, "pg_http_request_duration_seconds", "Request duration.", self.durations, pid)
+            _histogram(lines, "pg_mongo_commands_per_request", "Mongo commands issued per request.",
+                       self.commands_per_request, pid)
+            _counter(lines, "pg_mongo_commands_total", "Mongo commands by route and command name.",
+                     (({"route": r, "command": c}, v) for (r, c), v in self.commands.items()), pid)
+            _counter(lines, "pg_mongo_documents_returned_total", "Documents returned by find/aggregate/getMore.",
+                     (({"route": r}, v) for r, v in self.documents.items()), pid)
+            _counter(lines, "pg_mongo_command_seconds_total", "Time spent waiting on Mongo.",
+                     (({"route": r}, round(v, 6)) for r, v in self.mongo_seconds.items()), pid)
+            _counter(lines, "pg_request_command_warnings_total", "Requests over REQUEST_COMMAND_WARN commands.",
+                     (({"route": r}, v) for r, v in self.warnings.items()), pid)
+        _component_stats(lines, pid)
+        return "\n".join(lines) + "\n"
+
+
+def _component_stats(lines: list[str], pid: str) -> None:
+    """The caches' and the activity log writer's own counters."""
+    caches = {"occupancy": occupancy_cache.stats(), "floor_fragments": floor_fragment_cache.stats()}
+    for field, help_text in (("hits", "Summary cache hits."), ("misses", "Summary cache misses, including expired and stale entries."),
+                             ("evictions", "Summary cache entries evicted at capacity.")):
+        _counter(lines, f"pg_summary_cache_{field}_total", help_text,
+                 (({"cache": c}, stats[field]) for c, stats in caches.items()), pid)
+    _gauge(lines, "pg_summary_cache_entries", "Entries held in each summary cache.",
+           (({"cache": c}, stats["size"]) for c, stats in caches.items()), pid)
+    log = activity_writer.stats()
+    for field, help_text in (("enqueued", "Activity log entries queued for the writer."),
+                             ("flushed", "Activity log entries written."),
+                             ("dropped", "Activity log entries dropped because the buffer was full."),
+                             ("failed", "Activity log entries whose insert failed.")):
+        _counter(lines, f"pg_activity_log_{field}_total", help_text, [({}, log[field])], pid)
+    _gauge(lines, "pg_activity_log_pending", "Activity log entries waiting to be written.", [({}, log["pending"])], pid)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: dict, pid: str) -> str:
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in {**labels, "pid": pid}.items()) + "}"
+
+
+def _counter(lines: list[str], name: str, help_text: str, samples, pid: str) -> None:
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} counter")
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(labels, pid)} {value}")
+
+
+def _gauge(lines: list[str], name: str, help_text: str, samples, pid: str) -> None:
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} gauge")
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(labels, pid)} {value}")
+
+
+def _histogram(lines: list[str], name: str, help_text: str, table: dict, pid: str) -> None:
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for (method, route), hist in table.items():
+        labels = {"method": method, "route": route}
+        cumulative = 0
+        for bound, count in zip(hist.buckets, hist.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels({**labels, 'le': bound}, pid)} {cumulative}")
+        lines.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'}, pid)} {hist.count}")
+        lines.append(f"{name}_sum{_labels(labels, pid)} {round(hist.total, 6)}")
+        lines.append(f"{name}_count{_labels(labels, pid)} {hist.count}")
+
+
+def _returned_documents(reply) -> int:
+    cursor = reply.get("cursor") if isinstance(reply, Mapping) else None
+    if not cursor:
+        return 0
+    return len(cursor.get("firstBatch") or cursor.get("nextBatch") or ())
+
+
+class RequestCommandListener(monitoring.CommandListener):
+    """Attributes Mongo commands to the request active on the calling thread."""
+
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+        self._local = threading.local()
+
+    def begin_request(self, route: str) -> None:
+        self._local.stats = _RequestStats(route)
+
+    def end_request(self, method: str, status: int) -> None:
+        stats = getattr(self._local, "stats", None)
+        if stats is not None:
+            self._local.stats = None
+            self.registry.record_request(method, status, stats)
+
+    def current(self) -> _RequestStats | None:
+        return getattr(self._local, "stats", None)
+
+    def started(self, event):
+        stats = getattr(self._local, "stats", None)
+        if stats is not None:
+            stats.commands += 1
+            stats.by_command[event.command_name] += 1
+
+    def succeeded(self, event):
+        self._finished(event, _returned_documents(event.reply))
+
+    def failed(self, event):
+        self._finished(event, 0)
+
+    def _finished(self, event, documents: int) -> None:
+        seconds = event.duration_micros / 1e6
+        stats = getattr(self._local, "stats", None)
+        if stats is None:
+            self.registry.record_background(event.command_name, documents, seconds)
+            return
+        stats.documents += documents
+        stats.mongo_seconds += seconds
+
+
+registry = MetricsRegistry()
+command_listener = RequestCommandListener(registry)
+
+
+def init_app(app) -> None:
+    """Time every request, attribute its Mongo commands and serve /metrics.
+
+    /metrics exposes route latencies and Mongo internals, so it only exists
+    when METRICS_TOKEN is set, and then requires "Authorization: Bearer
+    <token>"; without a token it is a 404.
+    """
+    from flask import Response, abort, request
+
+    @app.before_request
+    def _begin_request_metrics():
+        rule = request.url_rule
+        command_listener.begin_request(rule.rule if rule is not None else "unmatched")
+
+    @app.after_request
+    def _end_request_metrics(response):
+        command_listener.end_request(request.method, response.status_code)
+        return response
+
+    @app.teardown_request
+    def _abort_request_metrics(exc):
+        # Only still pending when the view raised and after_request was skipped.
+        command_listener.end_request(request.method, 500)
+
+    if not METRICS_TOKEN:
+        return
+
+    @app.route("/metrics")
+    def metrics_endpoint():
+        if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {METRICS_TOKEN}"):
+            abort(401)
+        return Response(registry.render(), mimetype="text/plain; version=0.0.4")
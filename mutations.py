@@ -0,0 +1,101 @@
+"""Occupant and rent mutations built on conditional storage operations.
+
+Each write is evaluated atomically by the backend (a guarded update on
+Mongo), so concurrent requests cannot overfill a room, remove an occupant
+twice, or lose a paid/unpaid flip.
+"""
+from collections import defaultdict
+from datetime import date
+
+from bson import ObjectId
+
+
+def add_occupant(store, uid: ObjectId, rid: ObjectId, occupant: dict) -> tuple[dict | None, str | None]:
+    """Reserve a bed in room rid and insert occupant into it.
+
+    The bed is claimed first with a capacity-guarded push, then the occupant
+    document is inserted under the pre-allocated _id. Returns (occupant,
+    None) on success or (None, reason) when the room is missing or full.
+    """
+    oid = ObjectId()
+    if not store.rooms.reserve_bed(uid, rid, oid):
+        return None, ("Room is full" if store.rooms.exists(uid, rid) else "Room not found")
+    doc = {"_id": oid, "userId": uid, "roomId": rid, **occupant}
+    try:
+        store.occupants.insert(doc)
+    except Exception:
+        store.rooms.release_bed(uid, rid, oid)
+        raise
+    join_month = doc["dateOfJoin"].strftime("%Y-%m")
+    store.rent.ensure(uid, [doc], join_month)
+    # A backdated join also needs this month's record, which the rollover
+    # job may already have created for everyone else.
+    this_month = date.today().strftime("%Y-%m")
+    if this_month > join_month:
+        store.rent.ensure(uid, [doc], this_month)
+    return doc, None
+
+
+def add_occupants(store, uid: ObjectId, entries: list[tuple[ObjectId, dict]]) -> tuple[list[dict], list[int]]:
+    """Bulk add_occupant: entries are (room id, occupant fields) pairs.
+
+    Beds are claimed with one capacity-guarded batch (all of a room's new
+    occupants or none of them), then the occupants go in with one
+    insert_many and their rent records with one ensure per month. Returns
+    the inserted documents and the indexes of entries whose room was full.
+    """
+    docs = [{"_id": ObjectId(), "userId": uid, "roomId": rid, **occupant} for rid, occupant in entries]
+    beds = defaultdict(list)
+    for doc in docs:
+        beds[doc["roomId"]].append(doc["_id"])
+    full = set(store.rooms.reserve_beds(uid, dict(beds)))
+    placed = [doc for doc in docs if doc["roomId"] not in full]
+    rejected = [i for i, doc in enumerate(docs) if doc["roomId"] in full]
+    if not placed:
+        return [], rejected
+    try:
+        store.occupants.insert_many(placed)
+    except Exception:
+        for doc in placed:
+            store.rooms.release_bed(uid, doc["roomId"], doc["_id"])
+        raise
+    this_month = date.today().strftime("%Y-%m")
+    by_month = defaultdict(list)
+    for doc in placed:
+        join_month = doc["dateOfJoin"].strftime("%Y-%m")
+        by_month[join_month].append(doc)
+        if this_month > join_month:
+            by_month[this_month].append(doc)
+    for month_key, group in by_month.items():
+        store.rent.ensure(uid, group, month_key)
+    return placed, rejected
+
+
+def remove_occupant(store, uid: ObjectId, oid: ObjectId) -> dict | None:
+    """Delete an occupant, free their bed and drop their rent from summaries.
+
+    Returns None if the occupant was already gone.
+    """
+    occupant = store.occupants.delete(uid, oid)
+    if occupant is None:
+        return None
+    store.rooms.release_bed(uid, occupant["roomId"], oid)
+    store.rent.detach(uid, [oid])
+    return occupant
+
+
+def toggle_rent(store, uid: ObjectId, occupant: dict, month_key: str) -> bool:
+    """Flip a month's paid flag and return the new value."""
+    return store.rent.toggle(uid, occupant, month_key)
+
+
+def set_rent_paid(store, uid: ObjectId, occupant_ids: list[ObjectId], month_key: str, paid: bool) -> list[dict]:
+    """Mark a month paid or unpaid for many occupants with one bulk write.
+
+    Ids that are not the tenant's occupants are ignored. Returns the
+    occupants whose record actually changed.
+    """
+    wanted = set(occupant_ids)
+    occupants = [o for o in store.occupants.list(uid) if o["_id"] in wanted]
+    changed = set(store.rent.set_paid(uid, occupants, month_key, paid))
+    return [o for o in occupants if o["_id"] in changed]
@@ -0,0 +1,215 @@
+"""Bulk occupant onboarding from a CSV of residents.
+
+    python -m onboarding --user <userId> residents.csv [--auto-place]
+
+Columns (matched case-insensitively): name (required), phone, date of join
+(YYYY-MM-DD or DD/MM/YYYY; today when blank), and optionally floor (0 or
+"G" for the ground floor) and room number. Rows are read one at a time and
+placed against an in-memory map of free beds built from one rooms read:
+
+- floor and room given: that room, if it has a free bed
+- otherwise, with auto-placement: the first vacancy (on the given floor,
+  if any), filling rooms in (floor, roomNumber) order
+
+Placed rows are written ONBOARD_CHUNK_SIZE at a time through
+mutations.add_occupants (one bed reservation batch, one insert_many, one
+rent ensure per join month) plus one batch of activity log entries. A bad
+row (missing name, unknown room, full room, phone already on file) is
+reported with its line number and the rest of the file carries on.
+"""
+import argparse
+import csv
+import sys
+from collections.abc import Iterable
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+import mutations
+from activity_log import activity_entry, log_activities
+from config import ONBOARD_CHUNK_SIZE
+from rent_import import find_column, normalize_phone
+from search import name_tokens
+from storage import get_storage
+from summary_cache import touch_tenant
+
+NAME_COLUMNS = ("name", "full name", "resident", "resident name")
+PHONE_COLUMNS = ("phone", "phone number", "mobile", "mobile number", "contact")
+JOIN_COLUMNS = ("date of join", "dateofjoin", "date_of_join", "join date", "joined", "joining date")
+FLOOR_COLUMNS = ("floor",)
+ROOM_COLUMNS = ("room", "room number", "roomnumber", "room no")
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y")
+MAX_REPORTED_ERRORS = 200
+
+
+class RowError(ValueError):
+    pass
+
+
+class BedMap:
+    """Free beds per room, from one read of the tenant's rooms."""
+
+    def __init__(self, rooms: list[dict]):
+        self.rooms = {(r["floor"], r["roomNumber"]): r for r in rooms}
+        self.free = {r["_id"]: r["maxPeople"] - len(r.get("occupantIds") or ()) for r in rooms}
+        self.order = [r["_id"] for r in sorted(rooms, key=lambda r: (r["floor"], r["roomNumber"]))]
+        self.floor_of = {r["_id"]: r["floor"] for r in rooms}
+
+    def place(self, floor: int | None, room_number: int | None, auto: bool) -> ObjectId:
+        if floor is not None and room_number is not None:
+            room = self.rooms.get((floor, room_number))
+            if room is None:
+                raise RowError("Room not found")
+            if self.free[room["_id"]] <= 0:
+                raise RowError("Room is full")
+            rid = room["_id"]
+        elif auto:
+            rid = next((r for r in self.order if self.free[r] > 0 and (floor is None or self.floor_of[r] == floor)), None)
+            if rid is None:
+                raise RowError("No vacancy" + (f" on floor {floor}" if floor is not None else ""))
+        else:
+            raise RowError("No room given (turn on auto-placement to fill vacancies)")
+        self.free[rid] -= 1
+        return rid
+
+    def mark_full(self, rid: ObjectId) -> None:
+        self.free[rid] = 0
+
+
+def _parse_floor(value: str) -> int | None:
+    value = (value or "").strip()
+    if not value:
+        return None
+    if value.casefold() in ("g", "gf", "ground", "ground floor"):
+        return 0
+    try:
+        return int(value)
+    except ValueError:
+        raise RowError(f"Invalid floor {value!r}")
+
+
+def _parse_room(value: str) -> int | None:
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise RowError(f"Invalid room {value!r}")
+
+
+def _parse_join_date(value: str) -> datetime:
+    value = (value or "").strip()
+    if not value:
+        # Naive UTC like the parsed dates and what pymongo hands back.
+        return datetime.now(timezone.utc).replace(tzinfo=None)
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value[:10], fmt)
+        except ValueError:
+            continue
+    raise RowError(f"Invalid join date {value!r}")
+
+
+def import_occupants(
+    store, uid: ObjectId, lines: Iterable[str], auto_place: bool = False, chunk_size: int = ONBOARD_CHUNK_SIZE
+) -> dict:
+    """Add every valid CSV row as an occupant; see the module docstring.
+
+    Raises ValueError if the header has no name column. Returns totals:
+    rows, added, failed and errors (up to MAX_REPORTED_ERRORS (line,
+    message) pairs).
+    """
+    reader = csv.DictReader(lines)
+    fields = reader.fieldnames or []
+    name_col = find_column(fields, NAME_COLUMNS)
+    if name_col is None:
+        raise ValueError("CSV needs a name column")
+    phone_col, join_col = find_column(fields, PHONE_COLUMNS), find_column(fields, JOIN_COLUMNS)
+    floor_col, room_col = find_column(fields, FLOOR_COLUMNS), find_column(fields, ROOM_COLUMNS)
+
+    beds = BedMap(store.rooms.list(uid))
+    phones = {normalize_phone(o.get("phone")) for o in store.occupants.list(uid)} - {""}
+    totals = {"rows": 0, "added": 0, "failed": 0, "errors": []}
+    pending: list[tuple[int, ObjectId, dict]] = []
+
+    def fail(line: int, message: str) -> None:
+        totals["failed"] += 1
+        if len(totals["errors"]) < MAX_REPORTED_ERRORS:
+            totals["errors"].append((line, message))
+
+    def flush() -> None:
+        placed, rejected = mutations.add_occupants(store, uid, [(rid, occupant) for _, rid, occupant in pending])
+        for i in rejected:
+            beds.mark_full(pending[i][1])
+            fail(pending[i][0], "Room is full")
+        log_activities([
+            activity_entry(
+                str(uid),
+                "person_created",
+                doc["name"],
+                f"Person added: {doc['name']} ({doc['phone']})",
+                {"occupantId": str(doc["_id"]), "roomId": str(doc["roomId"]), "source": "import"},
+            )
+            for doc in placed
+        ])
+        totals["added"] += len(placed)
+        pending.clear()
+
+    for row in reader:
+        totals["rows"] += 1
+        line = reader.line_num
+        try:
+            name = (row.get(name_col) or "").strip()
+            if not name:
+                raise RowError("Name is required")
+            phone = (row.get(phone_col) or "").strip() if phone_col else ""
+            phone_key = normalize_phone(phone)
+            if phone_key and phone_key in phones:
+                raise RowError(f"Phone {phone} is already on file")
+            join_date = _parse_join_date(row.get(join_col) if join_col else "")
+            floor = _parse_floor(row.get(floor_col) if floor_col else "")
+            room_number = _parse_room(row.get(room_col) if room_col else "")
+            rid = beds.place(floor, room_number, auto_place)
+        except RowError as e:
+            fail(line, str(e))
+            continue
+        if phone_key:
+            phones.add(phone_key)
+        pending.append((line, rid, {"name": name, "nameTokens": name_tokens(name), "phone": phone, "dateOfJoin": join_date}))
+        if len(pending) >= max(1, chunk_size):
+            flush()
+    if pending:
+        flush()
+    if totals["added"]:
+        touch_tenant(store, uid)
+    return totals
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Add occupants from a CSV of residents.")
+    parser.add_argument("path", help="CSV file")
+    parser.add_argument("--user", required=True, help="tenant userId")
+    parser.add_argument("--auto-place", action="store_true", help="put rows without a room into the first vacancy")
+    parser.add_argument("--chunk-size", type=int, default=ONBOARD_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+    try:
+        uid = ObjectId(args.user)
+    except InvalidId:
+        print(f"Invalid userId: {args.user}")
+        return 1
+    with open(args.path, newline="", encoding="utf-8-sig") as f:
+        try:
+            totals = import_occupants(get_storage(), uid, f, args.auto_place, args.chunk_size)
+        except ValueError as e:
+            print(e)
+            return 1
+    print(f"{totals['rows']} rows: {totals['added']} added, {totals['failed']} failed")
+    for line, message in totals["errors"]:
+        print(f"  line {line}: {message}")
+    return 0 if not totals["failed"] else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import base64
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+# Pages are ordered newest first on (createdAt, _id). A cursor token records
+# the boundary document and the direction to move from it, so every page is
+# a bounded index range scan however far back it is.
+
+
+def encode_cursor(direction: str, doc: dict) -> str:
+    raw = f"{direction}|{doc['createdAt'].isoformat()}|{doc['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str | None) -> tuple[str, datetime, ObjectId] | None:
+    if not token:
+        return None
+    try:
+        pad = 4 - len(token) % 4
+        if pad != 4:
+            token += "=" * pad
+        direction, created_at, oid = base64.urlsafe_b64decode(token).decode().split("|")
+        if direction not in ("next", "prev"):
+            return None
+        return direction, datetime.fromisoformat(created_at), ObjectId(oid)
+    except (ValueError, InvalidId, UnicodeDecodeError):
+        return None
+
+
+def _older_than(created_at: datetime, oid: ObjectId) -> dict:
+    return {"$or": [{"createdAt": {"$lt": created_at}}, {"createdAt": created_at, "_id": {"$lt": oid}}]}
+
+
+def _newer_than(created_at: datetime, oid: ObjectId) -> dict:
+    return {"$or": [{"createdAt": {"$gt": created_at}}, {"createdAt": created_at, "_id": {"$gt": oid}}]}
+
+
+def keyset_page(
+    collection,
+    filter_q: dict,
+    cursor: str | None = None,
+    page_size: int = 50,
+    projection: dict | None = None,
+) -> tuple[list[dict], str | None, str | None]:
+    """Fetch one newest-first page of collection matching filter_q.
+
+    Returns (docs, next_cursor, prev_cursor): next_cursor leads to older
+    documents, prev_cursor to newer ones, None when there are none.
+    """
+    position = decode_cursor(cursor)
+    if position is None:
+        direction, query, order = "first", filter_q, -1
+    else:
+        direction, created_at, oid = position
+        boundary = _older_than(created_at, oid) if direction == "next" else _newer_than(created_at, oid)
+        query = {"$and": [filter_q, boundary]}
+        order = -1 if direction == "next" else 1
+    docs = list(
+        collection.find(query, projection)
+        .sort([("createdAt", order), ("_id", order)])
+        .limit(page_size + 1)
+    )
+    return finish_page(docs, page_size, direction)
+
+
+def finish_page(
+    docs: list[dict], page_size: int, direction: str
+) -> tuple[list[dict], str | None, str | None]:
+    """Turn up to page_size + 1 documents read in direction into a page.
+
+    direction is "first" or "next" (read newest first) or "prev" (read
+    oldest first); the extra document only signals that more exist.
+    """
+    has_more = len(docs) > page_size
+    docs = docs[:page_size]
+    if direction == "prev":
+        docs.reverse()
+    if not docs:
+        return docs, None, None
+    has_older = has_more if direction != "prev" else True
+    has_newer = has_more if direction == "prev" else direction == "next"
+    next_cursor = encode_cursor("next", docs[-1]) if has_older else None
+    prev_cursor = encode_cursor("prev", docs[0]) if has_newer else None
+    return docs, next_cursor, prev_cursor
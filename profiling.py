@@ -0,0 +1,268 @@
+"""Opt-in request profiling.
+
+A request is profiled when its route is listed in PROFILE_ROUTES, when it
+carries "X-Profile: <PROFILE_TOKEN>", or at random with probability
+PROFILE_SAMPLE_RATE. PROFILE_MODE picks the profiler:
+
+- "cprofile" wraps the request in cProfile and writes a pstats dump (.prof).
+  Only one request per process is profiled at a time.
+- "sample" records the request thread's stack every PROFILE_INTERVAL_MS
+  from a background thread and writes collapsed stacks (.collapsed) that
+  flamegraph.pl, speedscope or inferno can render directly.
+
+Dumps go to PROFILE_DIR as <route>.<epoch ms>.<pid>.<ext>, keeping at most
+PROFILE_MAX_FILES. With no trigger configured no hooks are installed, so
+unprofiled traffic pays nothing.
+
+    python -m profiling --route /rent --top 30
+    python -m profiling --collapse-to flamegraphs/
+
+aggregates the dumps per route.
+"""
+import argparse
+import cProfile
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from config import (
+    PROFILE_DIR,
+    PROFILE_INTERVAL_MS,
+    PROFILE_MAX_FILES,
+    PROFILE_MODE,
+    PROFILE_ROUTES,
+    PROFILE_SAMPLE_RATE,
+    PROFILE_TOKEN,
+)
+
+PROFILE_MODES = ("cprofile", "sample")
+PROFILE_HEADER = "X-Profile"
+
+
+def route_slug(route: str) -> str:
+    """The route as a dump file name prefix: "/export/<kind>.<fmt>" -> "export_kind_fmt"."""
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", route.replace("<", "").replace(">", "")).strip("_") or "root"
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse_stack(frame) -> str:
+    """One collapsed-stack line key: root frame first, frames joined by ';'."""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class StackSampler:
+    """Samples the stacks of registered threads every interval_ms.
+
+    The sampling thread sleeps while no thread is registered, so it costs
+    nothing between profiled requests.
+    """
+
+    def __init__(self, interval_ms: float = 5.0):
+        self.interval = max(0.5, interval_ms) / 1000
+        self._targets: dict[int, Counter] = {}
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._pid: int | None = None
+
+    def start(self, thread_id: int) -> None:
+        with self._cond:
+            self._targets[thread_id] = Counter()
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def stop(self, thread_id: int) -> Counter:
+        with self._cond:
+            return self._targets.pop(thread_id, Counter())
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._targets:
+                    self._cond.wait()
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._cond:
+                for thread_id, counts in self._targets.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        counts[collapse_stack(frame)] += 1
+
+
+class RequestProfiler:
+    def __init__(
+        self,
+        directory: str,
+        mode: str = "cprofile",
+        sample_rate: float = 0.0,
+        routes: list[str] | None = None,
+        token: str = "",
+        interval_ms: float = 5.0,
+        max_files: int = 500,
+    ):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {mode}")
+        self.directory = Path(directory)
+        self.mode = mode
+        self.sample_rate = sample_rate
+        self.routes = set(routes or ())
+        self.token = token
+        self.max_files = max(1, max_files)
+        self.sampler = StackSampler(interval_ms) if mode == "sample" else None
+        # cProfile cannot run in two threads of one process at once.
+        self._cprofile_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.sample_rate > 0 or self.routes or self.token)
+
+    def wanted(self, route: str, header: str | None) -> bool:
+        if route in self.routes:
+            return True
+        if self.token and header == self.token:
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def begin(self):
+        """Start profiling the current thread; returns a handle or None if busy."""
+        if self.sampler is not None:
+            thread_id = threading.get_ident()
+            self.sampler.start(thread_id)
+            return thread_id
+        if not self._cprofile_lock.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def end(self, handle, route: str) -> Path | None:
+        if handle is None:
+            return None
+        if self.sampler is not None:
+            counts = self.sampler.stop(handle)
+        else:
+            handle.disable()
+            self._cprofile_lock.release()
+        stem = f"{route_slug(route)}.{int(time.time() * 1000)}.{os.getpid()}"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if self.sampler is not None:
+            if not counts:
+                return None
+            path = self.directory / f"{stem}.collapsed"
+            path.write_text("".join(f"{stack} {n}\n" for stack, n in counts.items()))
+        else:
+            path = self.directory / f"{stem}.prof"
+            handle.dump_stats(str(path))
+        self._rotate()
+        return path
+
+    def _rotate(self) -> None:
+        dumps = sorted(
+            (p for p in self.directory.iterdir() if p.suffix in (".prof", ".collapsed")),
+            key=lambda p: p.stat().st_mtime,
+        )
+        for path in dumps[: max(0, len(dumps) - self.max_files)]:
+            path.unlink(missing_ok=True)
+
+
+profiler = RequestProfiler(
+    PROFILE_DIR,
+    mode=PROFILE_MODE,
+    sample_rate=PROFILE_SAMPLE_RATE,
+    routes=PROFILE_ROUTES,
+    token=PROFILE_TOKEN,
+    interval_ms=PROFILE_INTERVAL_MS,
+    max_files=PROFILE_MAX_FILES,
+)
+
+
+def init_app(app) -> None:
+    """Install the profiling hooks, but only when some trigger is configured."""
+    if not profiler.enabled:
+        return
+    from flask import g, request
+
+    @app.before_request
+    def _begin_profile():
+        rule = request.url_rule
+        route = rule.rule if rule is not None else "unmatched"
+        if profiler.wanted(route, request.headers.get(PROFILE_HEADER)):
+            g.profile = (profiler.begin(), route)
+
+    @app.teardown_request
+    def _end_profile(exc):
+        started = g.pop("profile", None)
+        if started is not None:
+            profiler.end(*started)
+
+
+def _dumps_by_route(directory: Path, suffix: str) -> dict[str, list[Path]]:
+    grouped = defaultdict(list)
+    for path in sorted(directory.glob(f"*{suffix}")):
+        # <slug>.<ms>.<pid><suffix>
+        grouped[path.name[: -len(suffix)].rsplit(".", 2)[0]].append(path)
+    return grouped
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Aggregate request profile dumps per route.")
+    parser.add_argument("--dir", default=PROFILE_DIR)
+    parser.add_argument("--route", help="only this route, e.g. /rent or rent_toggle")
+    parser.add_argument("--sort", default="cumulative", help="pstats sort key for .prof dumps")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--collapse-to", help="write one merged <route>.collapsed per route into this directory")
+    args = parser.parse_args(argv)
+
+    directory = Path(args.dir)
+    if not directory.is_dir():
+        print(f"No profile directory at {directory}")
+        return 1
+    wanted = route_slug(args.route) if args.route else None
+
+    for slug, paths in _dumps_by_route(directory, ".prof").items():
+        if wanted and slug != wanted:
+            continue
+        print(f"=== {slug}: {len(paths)} cProfile dump(s)")
+        stats = pstats.Stats(*map(str, paths))
+        stats.sort_stats(args.sort).print_stats(args.top)
+
+    out = Path(args.collapse_to) if args.collapse_to else None
+    for slug, paths in _dumps_by_route(directory, ".collapsed").items():
+        if wanted and slug != wanted:
+            continue
+        merged = Counter()
+        for path in paths:
+            for line in path.read_text().splitlines():
+                stack, _, count = line.rpartition(" ")
+                if stack:
+                    merged[stack] += int(count)
+        print(f"=== {slug}: {len(paths)} sampled dump(s), {sum(merged.values())} samples")
+        leaves = Counter()
+        for stack, count in merged.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        for leaf, count in leaves.most_common(args.top):
+            print(f"{count:>8}  {leaf}")
+        if out is not None:
+            out.mkdir(parents=True, exist_ok=True)
+            (out / f"{slug}.collapsed").write_text("".join(f"{s} {n}\n" for s, n in merged.most_common()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
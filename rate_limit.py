@@ -0,0 +1,47 @@
+"""Token-bucket rate limiting for the login and register actions.
+
+Buckets live in process memory and are bounded to max_keys entries
+(least recently used keys are forgotten), so each gunicorn worker enforces
+the limits on the traffic it sees.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from config import LOGIN_EMAIL_BURST, LOGIN_EMAIL_RATE, LOGIN_IP_BURST, LOGIN_IP_RATE
+
+
+class TokenBucketLimiter:
+    """Allows bursts of up to burst requests per key, refilled at rate_per_minute."""
+
+    def __init__(self, rate_per_minute: float, burst: int, max_keys: int = 100_000):
+        self.rate = rate_per_minute / 60
+        self.burst = max(1, burst)
+        self.max_keys = max(1, max_keys)
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, key: str) -> bool:
+        """Take one token for key; False when its bucket is empty."""
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return allowed
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+# Shared by /login and /register; emails are only limited on /login.
+auth_ip_limiter = TokenBucketLimiter(LOGIN_IP_RATE, LOGIN_IP_BURST)
+login_email_limiter = TokenBucketLimiter(LOGIN_EMAIL_RATE, LOGIN_EMAIL_BURST)
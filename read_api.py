@@ -0,0 +1,117 @@
+"""Compact JSON views of rooms, occupants, rent and bookings for /api/*.
+
+Each view takes the fields to include (?fields=name,phone; default all of
+its *_FIELDS) and returns plain lists ready for jsonify: ids as strings,
+dates as YYYY-MM-DD and no keys that were not asked for. The endpoints
+answer conditional GETs like the pages (see conditional.py), so a client
+polling with If-None-Match costs one config read until something changes.
+
+Rooms come from the cached occupancy summary; occupants are only read when
+the occupants field is requested, and occupant reads fetch only the
+document fields behind the requested ones. The *_json helpers also shape the deltas
+that mutation routes return to fetch() callers.
+"""
+from datetime import datetime
+
+from bson import ObjectId
+
+from rent_ledger import build_rent_ledger
+from summary_cache import get_occupancy
+
+ROOM_FIELDS = ("id", "floor", "roomNumber", "maxPeople", "fillCount", "occupants")
+OCCUPANT_FIELDS = ("id", "roomId", "name", "phone", "dateOfJoin")
+RENT_FIELDS = ("occupantId", "roomId", "roomLabel", "name", "phone", "dateOfJoin", "paid", "dueAmount")
+BOOKING_FIELDS = ("id", "name", "phone", "expectedJoinDate", "notes")
+
+
+def parse_fields(value: str | None, allowed: tuple[str, ...]) -> tuple[str, ...]:
+    """The requested fields in allowed order; ValueError names any unknown one."""
+    if not value:
+        return allowed
+    wanted = {f.strip() for f in value.split(",") if f.strip()}
+    unknown = wanted - set(allowed)
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(sorted(unknown))}")
+    return tuple(f for f in allowed if f in wanted)
+
+
+def _day(value) -> str:
+    return value.strftime("%Y-%m-%d") if isinstance(value, datetime) else str(value or "")[:10]
+
+
+def _project(row: dict, fields: tuple[str, ...]) -> dict:
+    return {f: row[f] for f in fields}
+
+
+# API field -> occupant document field, for reading only what was asked for.
+_OCCUPANT_SOURCES = {"id": "_id", "roomId": "roomId", "name": "name", "phone": "phone", "dateOfJoin": "dateOfJoin"}
+
+
+def occupant_projection(fields: tuple[str, ...]) -> tuple[str, ...]:
+    return tuple(_OCCUPANT_SOURCES[f] for f in fields)
+
+
+def occupant_json(o: dict) -> dict:
+    """The API form of an occupant document; a projected one fills only its fields."""
+    out = {"id": str(o["_id"])}
+    if "roomId" in o:
+        out["roomId"] = str(o["roomId"])
+    for f in ("name", "phone"):
+        if f in o:
+            out[f] = o[f]
+    if "dateOfJoin" in o:
+        out["dateOfJoin"] = _day(o["dateOfJoin"])
+    return out
+
+
+def room_json(room: dict) -> dict:
+    """A room document's counts, as the pages show them."""
+    fill = len(room.get("occupantIds") or ())
+    return {
+        "id": str(room["_id"]),
+        "floor": room["floor"],
+        "roomNumber": room["roomNumber"],
+        "maxPeople": room["maxPeople"],
+        "fillCount": fill,
+        "emptyCount": room["maxPeople"] - fill,
+    }
+
+
+def booking_json(b: dict) -> dict:
+    return {
+        "id": str(b["_id"]),
+        "name": b["name"],
+        "phone": b["phone"],
+        "expectedJoinDate": _day(b.get("expectedJoinDate")),
+        "notes": b.get("notes"),
+    }
+
+
+def rooms_view(store, uid: ObjectId, config: dict, fields: tuple[str, ...]) -> list[dict]:
+    summary = get_occupancy(store, uid, config)
+    by_room = {}
+    if "occupants" in fields:
+        for o in store.occupants.list(uid, projection=("roomId", "name", "phone", "dateOfJoin")):
+            by_room.setdefault(str(o["roomId"]), []).append(_project(occupant_json(o), ("id", "name", "phone", "dateOfJoin")))
+    rows = []
+    for floor_num in summary["floor_numbers"]:
+        for r in summary["by_floor"][floor_num]:
+            room = {"id": r["_id"], **{k: r[k] for k in ("floor", "roomNumber", "maxPeople", "fillCount")}}
+            if "occupants" in fields:
+                room["occupants"] = by_room.get(r["_id"], [])
+            rows.append(_project(room, fields))
+    return rows
+
+
+def occupants_view(store, uid: ObjectId, fields: tuple[str, ...]) -> list[dict]:
+    return [_project(occupant_json(o), fields) for o in store.occupants.list(uid, projection=occupant_projection(fields))]
+
+
+def rent_view(store, uid: ObjectId, month_key: str, fields: tuple[str, ...]) -> list[dict]:
+    # A read: occupants without a record yet come back unpaid; the rollover
+    # job or a toggle creates the record.
+    return [_project(row, fields) for row in build_rent_ledger(store, uid, month_key, create_missing=False)]
+
+
+def bookings_view(store, uid: ObjectId, fields: tuple[str, ...]) -> list[dict]:
+    return [_project(booking_json(b), fields) for b in store.bookings.list(uid)]
@@ -0,0 +1,253 @@
+"""Read routing: which replica set member serves each route's reads.
+
+Everything reads from the primary except the routes in SECONDARY_ROUTES
+(history, exports and the rent trend), which read with secondaryPreferred
+and maxStalenessSeconds=READ_MAX_STALENESS_SECONDS. Those are the heavy
+sorts and scans that would otherwise compete with rent toggles and
+occupant changes on the primary; the read-after-write pages (/rooms, /rent,
+/advance-booking, /api/*) stay on the primary.
+
+Reads-your-writes across requests uses causal consistency sessions. Every
+writing request (any non-GET, plus the GET endpoints in WRITE_ROUTES such
+as the rent toggle link) runs its Mongo operations in a causally
+consistent session, and its response sets a signed CAUSAL_COOKIE holding
+the session's operationTime and clusterTime. A routed request starts its
+session from that cookie, so the secondary it reads from waits until it
+has applied the writes before answering (readConcern afterClusterTime).
+The cookie travels with the browser, so this holds whichever worker serves
+the next request.
+Activity log entries written by the async writer (ACTIVITY_LOG_MODE=async)
+are not part of the request's session and still show up when flushed.
+
+Against a standalone mongod everything goes to the one server and no cookie
+is set. To try it on a local replica set:
+
+    mongod --replSet rs0 --port 27017 --dbpath ./data/rs0-0
+    mongod --replSet rs0 --port 27018 --dbpath ./data/rs0-1
+    mongod --replSet rs0 --port 27019 --dbpath ./data/rs0-2
+    mongosh --eval 'rs.initiate({_id: "rs0", members: [
+        {_id: 0, host: "localhost:27017"}, {_id: 1, host: "localhost:27018"}, {_id: 2, host: "localhost:27019"}]})'
+    MONGODB_URI='mongodb://localhost:27017/?replicaSet=rs0' python -m read_routing --check
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import sys
+import threading
+
+import bson
+from bson import ObjectId
+from pymongo.read_preferences import SecondaryPreferred
+
+from config import CAUSAL_COOKIE, READ_MAX_STALENESS_SECONDS, READ_ROUTING, SESSION_SECRET, STORAGE_BACKEND
+
+# Endpoints whose reads may be served by a secondary.
+SECONDARY_ROUTES = frozenset({
+    "views.history_page",
+    "views.export_data",
+    "views.rent_trend_page",
+})
+SECONDARY_READS = SecondaryPreferred(max_staleness=READ_MAX_STALENESS_SECONDS)
+# GET endpoints that write; every non-GET request is treated as a write.
+WRITE_ROUTES = frozenset({
+    "views.rent_toggle",
+})
+
+# Collection methods the repositories call; all accept session=.
+_SESSION_METHODS = frozenset({
+    "aggregate",
+    "bulk_write",
+    "count_documents",
+    "delete_many",
+    "distinct",
+    "delete_one",
+    "find",
+    "find_one",
+    "find_one_and_delete",
+    "find_one_and_update",
+    "insert_many",
+    "insert_one",
+    "update_many",
+    "update_one",
+})
+
+
+def _sign(payload: str) -> str:
+    return hmac.new(SESSION_SECRET.encode(), f"causal:{payload}".encode(), hashlib.sha256).hexdigest()
+
+
+def encode_token(session) -> str | None:
+    """Signed operationTime/clusterTime of a session, or None before any op."""
+    if session.operation_time is None:
+        return None
+    doc = {"operationTime": session.operation_time, "clusterTime": session.cluster_time}
+    payload = base64.urlsafe_b64encode(bson.encode(doc)).decode().rstrip("=")
+    return f"{payload}.{_sign(payload)}"
+
+
+def decode_token(token: str | None) -> dict | None:
+    if not token or "." not in token:
+        return None
+    payload, _, signature = token.partition(".")
+    if not hmac.compare_digest(_sign(payload), signature):
+        return None
+    try:
+        return bson.decode(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except Exception:
+        return None
+
+
+def start_causal_session(client, token: dict | None = None):
+    session = client.start_session(causal_consistency=True)
+    if token:
+        if token.get("clusterTime"):
+            session.advance_cluster_time(token["clusterTime"])
+        session.advance_operation_time(token["operationTime"])
+    return session
+
+
+class _SessionCollection:
+    """Collection proxy that runs every operation in the request's session."""
+
+    def __init__(self, collection, session):
+        self._collection = collection
+        self._session = session
+
+    def __getattr__(self, attr):
+        value = getattr(self._collection, attr)
+        if attr not in _SESSION_METHODS:
+            return value
+        session = self._session
+
+        def in_session(*args, **kwargs):
+            kwargs.setdefault("session", session)
+            return value(*args, **kwargs)
+
+        return in_session
+
+
+class _RequestReads:
+    def __init__(self, secondary: bool, writes: bool, token: dict | None):
+        self.secondary = secondary
+        self.writes = writes
+        self.token = token
+        self.session = None
+
+    def session_for(self, client):
+        if self.session is None:
+            self.session = start_causal_session(client, self.token)
+        return self.session
+
+
+_local = threading.local()
+
+
+def writes(endpoint: str | None, method: str) -> bool:
+    return method not in ("GET", "HEAD") or endpoint in WRITE_ROUTES
+
+
+def begin_request(endpoint: str | None, method: str, cookie: str | None) -> None:
+    secondary = endpoint in SECONDARY_ROUTES
+    writing = writes(endpoint, method)
+    _local.reads = None
+    if secondary or writing:
+        _local.reads = _RequestReads(secondary, writing, decode_token(cookie) if secondary else None)
+
+
+def end_request(writes_only: bool = False) -> str | None:
+    """Finish the request's session; returns the cookie value after a write.
+
+    With writes_only, a read-only routed request keeps its session (a
+    streamed export is still reading).
+    """
+    reads = getattr(_local, "reads", None)
+    if reads is None or (writes_only and not reads.writes):
+        return None
+    _local.reads = None
+    if reads.session is None:
+        return None
+    token = encode_token(reads.session) if reads.writes else None
+    reads.session.end_session()
+    return token
+
+
+def bind(collection):
+    """The collection as the current request should read and write it.
+
+    Outside a routed or writing request (background threads, CLIs, GET
+    pages) this is the collection unchanged.
+    """
+    reads = getattr(_local, "reads", None)
+    if reads is None:
+        return collection
+    if reads.secondary:
+        collection = collection.with_options(read_preference=SECONDARY_READS)
+    return _SessionCollection(collection, reads.session_for(collection.database.client))
+
+
+def init_app(app) -> None:
+    """Install the per-request routing hooks (Mongo backend, READ_ROUTING on)."""
+    if not READ_ROUTING or STORAGE_BACKEND != "mongo":
+        return
+    from flask import request
+
+    @app.before_request
+    def _begin_reads():
+        begin_request(request.endpoint, request.method, request.cookies.get(CAUSAL_COOKIE))
+
+    @app.after_request
+    def _causal_cookie(response):
+        # Writes are finished by now; a streamed export still needs its
+        # session, so routed reads end in teardown instead.
+        token = end_request(writes_only=True)
+        if token:
+            # Past the staleness bound every eligible secondary has the write.
+            response.set_cookie(CAUSAL_COOKIE, token, max_age=READ_MAX_STALENESS_SECONDS, httponly=True, samesite="lax", path="/")
+        return response
+
+    @app.teardown_request
+    def _end_reads(exc):
+        end_request()
+
+
+def check(get_db) -> int:
+    """Write through one session, read it back on a secondary through another."""
+    db = get_db()
+    client = db.client
+    print(f"primary: {client.primary}  secondaries: {sorted(client.secondaries) or 'none'}")
+    coll = db["readRoutingCheck"]
+    marker = ObjectId()
+    with start_causal_session(client) as writer:
+        coll.insert_one({"_id": marker}, session=writer)
+        token = decode_token(encode_token(writer))
+    if token is None:
+        print("No operationTime after the write: not a replica set, so reads all go to the primary.")
+        coll.delete_one({"_id": marker})
+        return 1
+    try:
+        with start_causal_session(client, token) as reader:
+            cursor = coll.with_options(read_preference=SECONDARY_READS).find({"_id": marker}, session=reader).limit(1)
+            found = list(cursor)
+            print(f"read after write from {cursor.address}: {'found' if found else 'MISSING'} (operationTime {token['operationTime']})")
+    finally:
+        coll.delete_one({"_id": marker})
+    return 0 if found else 1
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Show the read routing table; --check reads a write back from a secondary.")
+    parser.add_argument("--check", action="store_true", help="write a marker and read it back with the routed read preference")
+    args = parser.parse_args(argv)
+    print(f"read routing {'on' if READ_ROUTING else 'off'}; secondary reads: {SECONDARY_READS.document}")
+    for endpoint in sorted(SECONDARY_ROUTES):
+        print(f"  {endpoint}")
+    if not args.check:
+        return 0
+    from database import get_db
+
+    return check(get_db)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
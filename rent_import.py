@@ -0,0 +1,180 @@
+"""Streaming import of bank payment exports.
+
+    python -m rent_import --user <userId> --month 2026-10 payments.csv
+
+Reads a CSV one row at a time and matches each payment to an occupant by
+phone number (last 10 digits) or, failing that, by name. Matched occupants
+are marked paid for the month RENT_IMPORT_CHUNK_SIZE at a time, each chunk
+with one bulk write and one batch of activity log entries, so memory use
+depends on the chunk size and the tenant's occupants, not the file.
+
+Column names are matched case-insensitively: a phone column (phone, mobile,
+contact) or a name column (name, payer, remitter, beneficiary) is required;
+amount and reference columns, when present, are kept in the activity log.
+"""
+import argparse
+import codecs
+import csv
+import re
+import sys
+from collections.abc import Iterable
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from activity_log import activity_entry, log_activities
+from conditional import touch_rent
+from config import RENT_IMPORT_CHUNK_SIZE
+from storage import get_storage
+
+PHONE_COLUMNS = ("phone", "phone number", "mobile", "mobile number", "contact")
+NAME_COLUMNS = ("name", "payer", "payer name", "remitter", "beneficiary")
+AMOUNT_COLUMNS = ("amount", "credit", "credit amount", "paid amount")
+REFERENCE_COLUMNS = ("reference", "ref", "utr", "transaction id", "txn id")
+UNMATCHED_SAMPLES = 20
+
+
+def normalize_phone(value: str | None) -> str:
+    return re.sub(r"\D", "", value or "")[-10:]
+
+
+def normalize_name(value: str | None) -> str:
+    return " ".join((value or "").casefold().split())
+
+
+class OccupantMatcher:
+    """Looks up a tenant's occupants by phone, then by name.
+
+    A phone or name shared by two occupants is ambiguous and never matches.
+    """
+
+    def __init__(self, occupants: list[dict]):
+        self.by_phone: dict[str, dict | None] = {}
+        self.by_name: dict[str, dict | None] = {}
+        for o in occupants:
+            for table, key in ((self.by_phone, normalize_phone(o.get("phone"))), (self.by_name, normalize_name(o.get("name")))):
+                if key:
+                    table[key] = None if key in table else o
+
+    def match(self, phone: str | None, name: str | None) -> dict | None:
+        phone_key = normalize_phone(phone)
+        if phone_key and self.by_phone.get(phone_key):
+            return self.by_phone[phone_key]
+        return self.by_name.get(normalize_name(name))
+
+
+def find_column(fieldnames: list[str], candidates: tuple[str, ...]) -> str | None:
+    by_key = {normalize_name(f): f for f in fieldnames or ()}
+    return next((by_key[c] for c in candidates if c in by_key), None)
+
+
+def import_payments(
+    store, uid: ObjectId, lines: Iterable[str], month_key: str, chunk_size: int = RENT_IMPORT_CHUNK_SIZE
+) -> dict:
+    """Mark month_key paid for every occupant matched by a CSV row.
+
+    lines is any iterable of text lines (an open file, a decoded upload
+    stream). Raises ValueError if the header has no phone or name column.
+    Returns totals: rows, matched, marked, alreadyPaid, duplicates,
+    unmatched and up to UNMATCHED_SAMPLES unmatchedRows (line numbers).
+    """
+    reader = csv.DictReader(lines)
+    fields = reader.fieldnames or []
+    phone_col, name_col = find_column(fields, PHONE_COLUMNS), find_column(fields, NAME_COLUMNS)
+    if phone_col is None and name_col is None:
+        raise ValueError("CSV needs a phone or name column")
+    amount_col, ref_col = find_column(fields, AMOUNT_COLUMNS), find_column(fields, REFERENCE_COLUMNS)
+
+    matcher = OccupantMatcher(store.occupants.list(uid))
+    totals = {"rows": 0, "matched": 0, "marked": 0, "alreadyPaid": 0, "duplicates": 0, "unmatched": 0, "unmatchedRows": []}
+    seen: set[ObjectId] = set()
+    pending: list[tuple[dict, dict]] = []
+
+    def flush():
+        changed = set(store.rent.set_paid(uid, [o for o, _ in pending], month_key, True))
+        entries = [
+            activity_entry(
+                str(uid),
+                "rent_paid",
+                o.get("name", "Unknown"),
+                f"Rent marked paid for {o.get('name', 'Unknown')} ({month_key}) from payment import",
+                {"occupantId": str(o["_id"]), "month": month_key, "source": "import", **payment},
+            )
+            for o, payment in pending
+            if o["_id"] in changed
+        ]
+        log_activities(entries)
+        totals["marked"] += len(entries)
+        totals["alreadyPaid"] += len(pending) - len(entries)
+        pending.clear()
+
+    for row in reader:
+        totals["rows"] += 1
+        occupant = matcher.match(row.get(phone_col) if phone_col else None, row.get(name_col) if name_col else None)
+        if occupant is None:
+            totals["unmatched"] += 1
+            if len(totals["unmatchedRows"]) < UNMATCHED_SAMPLES:
+                totals["unmatchedRows"].append(reader.line_num)
+            continue
+        if occupant["_id"] in seen:
+            totals["duplicates"] += 1
+            continue
+        seen.add(occupant["_id"])
+        totals["matched"] += 1
+        payment = {}
+        if amount_col and row.get(amount_col):
+            payment["amount"] = row[amount_col].strip()
+        if ref_col and row.get(ref_col):
+            payment["reference"] = row[ref_col].strip()
+        pending.append((occupant, payment))
+        if len(pending) >= max(1, chunk_size):
+            flush()
+    if pending:
+        flush()
+    if totals["marked"]:
+        touch_rent(store, uid)
+    return totals
+
+
+def decoded_lines(binary_stream) -> Iterable[str]:
+    """Text lines from a binary upload, tolerating a UTF-8 byte order mark."""
+    return codecs.iterdecode(binary_stream, "utf-8-sig")
+
+
+def _month_key(value: str) -> str:
+    try:
+        return datetime.strptime(value, "%Y-%m").strftime("%Y-%m")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM, got {value!r}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Mark rent paid from a bank payment CSV.")
+    parser.add_argument("path", help="CSV file")
+    parser.add_argument("--user", required=True, help="tenant userId")
+    parser.add_argument("--month", required=True, type=_month_key, help="YYYY-MM")
+    parser.add_argument("--chunk-size", type=int, default=RENT_IMPORT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+    try:
+        uid = ObjectId(args.user)
+    except InvalidId:
+        print(f"Invalid userId: {args.user}")
+        return 1
+    with open(args.path, newline="", encoding="utf-8-sig") as f:
+        try:
+            totals = import_payments(get_storage(), uid, f, args.month, args.chunk_size)
+        except ValueError as e:
+            print(e)
+            return 1
+    print(
+        f"{args.month}: {totals['rows']} rows, {totals['marked']} marked paid, {totals['alreadyPaid']} already paid, "
+        f"{totals['duplicates']} duplicate, {totals['unmatched']} unmatched"
+    )
+    if totals["unmatchedRows"]:
+        print("unmatched lines: " + ", ".join(map(str, totals["unmatchedRows"])))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
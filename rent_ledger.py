@@ -0,0 +1,105 @@
+from calendar import monthrange
+from collections import Counter, defaultdict
+from datetime import date, datetime
+
+from bson import ObjectId
+
+
+def floor_label(floor_num: int) -> str:
+    return "Ground Floor" if floor_num == 0 else f"Floor {floor_num}"
+
+
+def room_label(room: dict | None) -> str:
+    if not room:
+        return "—"
+    return floor_label(room["floor"]) + " - Room " + str(room["roomNumber"])
+
+
+def month_last_day(month_key: str) -> date:
+    parts = month_key.split("-")
+    year, month_num = int(parts[0]), int(parts[1])
+    _, last_day_num = monthrange(year, month_num)
+    return date(year, month_num, last_day_num)
+
+
+def recent_month_keys(count: int, today: date | None = None) -> list[str]:
+    """The last count months as YYYY-MM, oldest first, ending with today's."""
+    today = today or date.today()
+    year, month = today.year, today.month
+    keys = []
+    for _ in range(count):
+        keys.append(f"{year:04d}-{month:02d}")
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return keys[::-1]
+
+
+def join_date_of(occupant: dict) -> date:
+    raw = occupant["dateOfJoin"]
+    join_dt = raw if isinstance(raw, datetime) else datetime.fromisoformat(str(raw)[:10])
+    return join_dt.date() if hasattr(join_dt, "date") else join_dt
+
+
+def new_rent_record(uid: ObjectId, occupant: dict, month_key: str) -> dict:
+    return {
+        "userId": uid,
+        "occupantId": occupant["_id"],
+        "roomId": occupant["roomId"],
+        "month": month_key,
+        "paid": False,
+        "dueAmount": 0,
+    }
+
+
+def summary_deltas(uid: ObjectId, records: list[dict], sign: int) -> dict[tuple, Counter]:
+    """Per-month summary changes from adding (sign=1) or removing (-1) records."""
+    deltas = defaultdict(Counter)
+    for r in records:
+        delta = deltas[(uid, r["month"])]
+        amount = r.get("dueAmount") or 0
+        if r.get("paid"):
+            delta["paidCount"] += sign
+            delta["paidAmount"] += sign * amount
+        else:
+            delta["unpaidCount"] += sign
+            delta["dueAmount"] += sign * amount
+    return deltas
+
+
+def build_rent_ledger(store, uid: ObjectId, month_key: str, create_missing: bool = True) -> list[dict]:
+    """Return the /rent rows for one month.
+
+    Issues three reads (occupants, rooms, the month's rent records) no matter
+    how many occupants the tenant has, joins them in memory, and creates any
+    missing records with a single batched upsert.
+    """
+    last_day = month_last_day(month_key)
+    occupants = store.occupants.list(uid)
+    room_map = {r["_id"]: r for r in store.rooms.list(uid)}
+    record_map = {r["occupantId"]: r for r in store.rent.for_month(uid, month_key)}
+
+    rows = []
+    missing = []
+    for o in occupants:
+        join_date = join_date_of(o)
+        if join_date > last_day:
+            continue
+        record = record_map.get(o["_id"])
+        if record is None:
+            missing.append(o)
+            record = {"paid": False, "dueAmount": 0}
+        rows.append(
+            {
+                "occupantId": str(o["_id"]),
+                "roomId": str(o["roomId"]),
+                "roomLabel": room_label(room_map.get(o["roomId"])),
+                "name": o["name"],
+                "phone": o["phone"],
+                "dateOfJoin": join_date.isoformat()[:10],
+                "paid": record.get("paid", False),
+                "dueAmount": record.get("dueAmount", 0),
+            }
+        )
+    if missing and create_missing:
+        store.rent.ensure(uid, missing, month_key)
+    rows.sort(key=lambda x: (x["roomLabel"], x["name"]))
+    return rows
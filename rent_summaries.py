@@ -0,0 +1,106 @@
+"""Monthly rent summaries: paid / unpaid counts and amounts per tenant.
+
+The rentSummaries collection holds one document per (userId, month). The
+rent repository keeps it current with $inc whenever records are created
+(ensure / ensure_bulk), toggled, or detached because their occupant was
+removed, so the /rent header and /rent/trend read one small document per
+month instead of every occupant and record.
+
+A month that has not been rolled over can have occupants with no record
+yet; /rent shows them as unpaid, so the summaries count them as unpaid too
+(occupants who had joined by the month's last day, less the month's
+records).
+
+If summaries drift (a crash between the record write and the $inc, or data
+edited by hand), recompute them from rentRecords:
+
+    python -m rent_summaries --rebuild [--user <userId>]
+"""
+import argparse
+import sys
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from conditional import touch_rent
+from rent_ledger import join_date_of, month_last_day, recent_month_keys
+from storage import get_storage
+
+TREND_DEFAULT_MONTHS = 12
+TREND_MAX_MONTHS = 36
+
+
+def month_summary(doc: dict | None, month_key: str, occupants: int = 0) -> dict:
+    """A summary row for month_key, zeros when the month has no records.
+
+    occupants is how many occupants had joined by the month's last day;
+    any beyond the month's records have no record yet and count as unpaid.
+    """
+    doc = doc or {}
+    paid = doc.get("paidCount", 0)
+    unpaid = doc.get("unpaidCount", 0)
+    unpaid += max(0, occupants - paid - unpaid)
+    total = paid + unpaid
+    return {
+        "month": month_key,
+        "paidCount": paid,
+        "unpaidCount": unpaid,
+        "total": total,
+        "paidAmount": doc.get("paidAmount", 0),
+        "dueAmount": doc.get("dueAmount", 0),
+        "paidPercent": round(100 * paid / total) if total else 0,
+    }
+
+
+def occupant_counts(store, uid: ObjectId, month_keys: list[str]) -> dict[str, int]:
+    """How many of uid's occupants had joined by the last day of each month."""
+    join_dates = [join_date_of(o) for o in store.occupants.list(uid, projection=("dateOfJoin",))]
+    counts = {}
+    for key in month_keys:
+        last_day = month_last_day(key)
+        counts[key] = sum(1 for d in join_dates if d <= last_day)
+    return counts
+
+
+def summary_for_month(store, uid: ObjectId, month_key: str, occupants: int | None = None) -> dict:
+    """month_key's summary; pass occupants when the caller already counted them."""
+    if occupants is None:
+        occupants = occupant_counts(store, uid, [month_key])[month_key]
+    docs = store.rent.summaries(uid, [month_key])
+    return month_summary(docs[0] if docs else None, month_key, occupants)
+
+
+def trend(store, uid: ObjectId, months: int = TREND_DEFAULT_MONTHS) -> list[dict]:
+    """The last months summaries, newest first; two reads regardless of occupant count."""
+    keys = recent_month_keys(max(1, min(months, TREND_MAX_MONTHS)))
+    by_month = {d["month"]: d for d in store.rent.summaries(uid, keys)}
+    counts = occupant_counts(store, uid, keys)
+    return [month_summary(by_month.get(k), k, counts[k]) for k in reversed(keys)]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Recompute rent summaries from rent records.")
+    parser.add_argument("--rebuild", action="store_true", help="recompute rentSummaries by aggregation")
+    parser.add_argument("--user", help="only this tenant's userId")
+    args = parser.parse_args(argv)
+    if not args.rebuild:
+        parser.print_help()
+        return 1
+    uid = None
+    if args.user:
+        try:
+            uid = ObjectId(args.user)
+        except InvalidId:
+            print(f"Invalid userId: {args.user}")
+            return 1
+    store = get_storage()
+    tenants = store.rent.rebuild_summaries(uid)
+    # Cached /rent and /rent/trend pages are keyed on rentVersion.
+    for tenant in tenants or ([uid] if uid is not None else []):
+        touch_rent(store, tenant)
+    print(f"Rebuilt monthly summaries for {len(tenants)} tenant(s)" + (f" ({args.user})" if uid else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
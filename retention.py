@@ -0,0 +1,220 @@
+"""Activity log retention: a hot window in activityLogs, older entries archived.
+
+    python -m retention [--days 180] [--batch-size 1000]
+
+With ACTIVITY_LOG_RETENTION_DAYS (or --days) set, the sweep moves entries
+older than the window out of activityLogs, batch_size at a time and oldest
+first, into activityArchive. Each batch becomes one bucket document per
+(tenant, month), holding the batch's entries as zlib-compressed BSON
+(nameTokens and userId are dropped per entry and rebuilt on read). Buckets
+are written with upserts keyed by their first entry's _id before the
+entries are deleted, so an interrupted sweep can simply be run again.
+Run it daily from cron, e.g. ``30 3 * * * python -m retention``.
+
+The cutoff of the latest sweep is recorded as "archivedBefore" under the
+"retention" job. log_page() and log_stream() read activityLogs first and
+fall through to the archive only once they run past the hot entries and
+the requested date range reaches back before that cutoff, so /history
+and the history export see one continuous log while activityLogs (and
+its indexes) stay bounded by the window.
+"""
+import argparse
+import sys
+import time
+import zlib
+from collections import defaultdict
+from collections.abc import Iterator
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+
+import bson
+from bson import ObjectId
+
+from config import ACTIVITY_LOG_RETENTION_DAYS
+from pagination import decode_cursor, encode_cursor, finish_page
+from search import name_tokens
+from storage import get_storage
+
+JOB_NAME = "retention"
+DEFAULT_BATCH_SIZE = 1000
+_ENTRY_FIELDS = ("_id", "type", "name", "description", "metadata", "createdAt")
+
+
+def _naive_utc(value: datetime | None) -> datetime | None:
+    # Mongo returns naive UTC; the memory backend keeps what was written.
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _key(doc: dict) -> tuple[datetime, ObjectId]:
+    return _naive_utc(doc["createdAt"]), doc["_id"]
+
+
+def pack_bucket(uid: ObjectId, month_key: str, entries: list[dict]) -> dict:
+    compact = [{f: e[f] for f in _ENTRY_FIELDS if f in e} for e in entries]
+    return {
+        "_id": entries[0]["_id"],
+        "userId": uid,
+        "month": month_key,
+        "count": len(entries),
+        "types": sorted({e.get("type") for e in entries if e.get("type")}),
+        "data": bson.Binary(zlib.compress(bson.encode({"entries": compact}))),
+    }
+
+
+def unpack_bucket(bucket: dict) -> list[dict]:
+    entries = bson.decode(zlib.decompress(bucket["data"]))["entries"]
+    for e in entries:
+        e["userId"] = bucket["userId"]
+    return entries
+
+
+def archive_horizon(store) -> datetime | None:
+    """Entries created before this may live in the archive; None if never swept."""
+    state = store.jobs.get(JOB_NAME)
+    return _naive_utc(state.get("archivedBefore")) if state else None
+
+
+def _reaches_archive(horizon: datetime | None, filters: dict) -> bool:
+    if horizon is None:
+        return False
+    return not (filters.get("from") and _naive_utc(filters["from"]) >= horizon)
+
+
+def archived_entries(
+    store, uid: ObjectId, filters: dict, boundary: tuple[datetime, ObjectId] | None = None, newer: bool = False
+) -> Iterator[dict]:
+    """Archived entries matching filters past boundary, newest first (oldest first if newer).
+
+    Buckets are read a month at a time, so memory is bounded by one
+    month of one tenant's activity.
+    """
+    lo, hi = _naive_utc(filters.get("from")), _naive_utc(filters.get("to"))
+    if boundary is not None:
+        if newer:
+            lo = max(lo, boundary[0]) if lo else boundary[0]
+        else:
+            hi = min(hi, boundary[0]) if hi else boundary[0]
+    wanted_type = filters.get("type")
+    tokens = set(filters.get("nameTokens") or ())
+
+    def matches(entry: dict) -> bool:
+        key = _key(entry)
+        if boundary is not None and (key <= boundary if newer else key >= boundary):
+            return False
+        if (lo and key[0] < lo) or (hi and key[0] > hi):
+            return False
+        if wanted_type and entry.get("type") != wanted_type:
+            return False
+        return not tokens or tokens <= set(name_tokens(entry.get("name")))
+
+    def drain(batch: list[dict]) -> list[dict]:
+        batch.sort(key=_key, reverse=not newer)
+        return [e for e in batch if matches(e)]
+
+    month, batch = None, []
+    from_month, to_month = (lo.strftime("%Y-%m") if lo else None), (hi.strftime("%Y-%m") if hi else None)
+    for bucket in store.archive.buckets(uid, from_month, to_month, newest_first=not newer):
+        if bucket["month"] != month:
+            yield from drain(batch)
+            month, batch = bucket["month"], []
+        if wanted_type and wanted_type not in bucket.get("types", ()):
+            continue
+        batch.extend(unpack_bucket(bucket))
+    yield from drain(batch)
+
+
+def log_page(store, uid: ObjectId, filters: dict, cursor: str | None, page_size: int):
+    """LogsRepository.page over activityLogs followed by the archive."""
+    horizon = archive_horizon(store)
+    position = decode_cursor(cursor)
+    direction = position[0] if position else "first"
+    if not _reaches_archive(horizon, filters):
+        return store.logs.page(uid, filters, cursor, page_size)
+    boundary = (_naive_utc(position[1]), position[2]) if position else None
+
+    if direction == "prev" and boundary is not None and boundary[0] < horizon:
+        # Walking back towards the present from an archived entry: the rest
+        # of the archive comes first, then the oldest hot entries.
+        docs = list(islice(archived_entries(store, uid, filters, boundary, newer=True), page_size + 1))
+        if len(docs) <= page_size:
+            start = docs[-1] if docs else {"createdAt": position[1], "_id": position[2]}
+            # Asking for exactly the missing count (+1) lets finish_page see
+            # whether anything newer is left.
+            hot, _, _ = store.logs.page(uid, filters, encode_cursor("prev", start), page_size + 1 - len(docs))
+            docs += hot[::-1]
+        return finish_page(docs, page_size, "prev")
+
+    docs, next_cursor, prev_cursor = store.logs.page(uid, filters, cursor, page_size)
+    if direction == "prev" or next_cursor is not None:
+        return docs, next_cursor, prev_cursor
+    # activityLogs is exhausted in this direction; continue into the archive.
+    if docs:
+        boundary = _key(docs[-1])
+    seen = {d["_id"] for d in docs}
+    older = (e for e in archived_entries(store, uid, filters, boundary) if e["_id"] not in seen)
+    docs += islice(older, page_size + 1 - len(docs))
+    return finish_page(docs, page_size, direction)
+
+
+def log_stream(store, uid: ObjectId, filters: dict) -> Iterator[dict]:
+    """LogsRepository.stream over activityLogs followed by the archive."""
+    last = None
+    for doc in store.logs.stream(uid, filters):
+        last = doc
+        yield doc
+    if _reaches_archive(archive_horizon(store), filters):
+        yield from archived_entries(store, uid, filters, _key(last) if last else None)
+
+
+def sweep(store, retention_days: int, batch_size: int = DEFAULT_BATCH_SIZE, progress=None) -> dict:
+    """Move entries older than retention_days into archive buckets."""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    totals = {"archived": 0, "buckets": 0, "seconds": 0.0}
+    # Publish the cutoff first: readers must look in the archive before
+    # anything is moved there.
+    horizon = _naive_utc(cutoff)
+    previous = archive_horizon(store)
+    if previous is not None and previous > horizon:
+        horizon = previous
+    store.jobs.save(JOB_NAME, {"archivedBefore": horizon, "startedAt": datetime.now(timezone.utc)})
+    start = time.perf_counter()
+    while True:
+        batch = store.logs.oldest(cutoff, batch_size)
+        if not batch:
+            break
+        groups = defaultdict(list)
+        for doc in batch:
+            groups[(doc["userId"], _naive_utc(doc["createdAt"]).strftime("%Y-%m"))].append(doc)
+        store.archive.save_buckets([pack_bucket(uid, month_key, entries) for (uid, month_key), entries in groups.items()])
+        store.logs.delete_ids([doc["_id"] for doc in batch])
+        totals["archived"] += len(batch)
+        totals["buckets"] += len(groups)
+        totals["seconds"] = time.perf_counter() - start
+        if progress is not None:
+            progress(totals)
+    totals["seconds"] = time.perf_counter() - start
+    store.jobs.save(JOB_NAME, {"finishedAt": datetime.now(timezone.utc), "archived": totals["archived"]})
+    return totals
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Archive activity log entries older than the retention window.")
+    parser.add_argument("--days", type=int, default=ACTIVITY_LOG_RETENTION_DAYS, help="hot window in days")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+    if args.days <= 0:
+        print("Retention is off; set ACTIVITY_LOG_RETENTION_DAYS or pass --days.")
+        return 1
+
+    def report(totals):
+        print(f"{totals['archived']} entries archived into {totals['buckets']} buckets")
+
+    totals = sweep(get_storage(), args.days, max(1, args.batch_size), report)
+    print(f"done in {totals['seconds']:.1f}s; {totals['archived']} entries older than {args.days} days archived")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
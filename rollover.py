@@ -0,0 +1,117 @@
+"""Month rollover: pre-create every occupant's rent record for a month.
+
+    python -m rollover 2026-11 [--batch-size 1000] [--restart]
+
+Pages through all occupants in _id order, batch_size at a time, and
+upserts the month's record for each one that has joined by the month's
+last day with $setOnInsert, so existing records (and payments) are never
+touched and re-running is harmless. Progress is checkpointed under
+"rollover:<month>" in the jobs collection after every batch; an
+interrupted run picks up after the last checkpoint. Once a month has been
+rolled over, GET /rent finds every record and does no writes. Each
+tenant with an occupant in the month gets its rentVersion bumped once per
+run, so cached /rent pages show the new records.
+
+Run it from cron on the first of each month (or a few days before with
+--next), e.g. ``0 0 1 * * python -m rollover``.
+"""
+import argparse
+import sys
+import time
+from datetime import date, datetime, timezone
+
+from conditional import touch_rent
+from rent_ledger import join_date_of, month_last_day
+from storage import get_storage
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def job_name(month_key: str) -> str:
+    return f"rollover:{month_key}"
+
+
+def next_month_key(today: date | None = None) -> str:
+    today = today or date.today()
+    year, month = (today.year, today.month + 1) if today.month < 12 else (today.year + 1, 1)
+    return f"{year:04d}-{month:02d}"
+
+
+def rollover_month(store, month_key: str, batch_size: int = DEFAULT_BATCH_SIZE, restart: bool = False, progress=None) -> dict:
+    """Create month_key's missing rent records for every tenant.
+
+    progress, if given, is called after each batch with the running totals
+    dict. Returns the final totals.
+    """
+    name = job_name(month_key)
+    state = store.jobs.get(name)
+    resume = state is not None and not restart and not state.get("finishedAt") and state.get("lastOccupantId")
+    after = state["lastOccupantId"] if resume else None
+    totals = {
+        "month": month_key,
+        "scanned": state.get("scanned", 0) if resume else 0,
+        "created": state.get("created", 0) if resume else 0,
+        "resumed": bool(resume),
+        "seconds": 0.0,
+        "rate": 0.0,
+    }
+    already_scanned = totals["scanned"]
+    store.jobs.save(name, {"month": month_key, "startedAt": datetime.now(timezone.utc), "finishedAt": None})
+    last_day = month_last_day(month_key)
+    touched = set()
+    start = time.perf_counter()
+    while True:
+        batch = store.occupants.scan(after, batch_size)
+        if not batch:
+            break
+        active = [o for o in batch if join_date_of(o) <= last_day]
+        totals["created"] += store.rent.ensure_bulk(active, month_key)
+        # Before the checkpoint, so a batch re-run after a crash bumps again.
+        for uid in {o["userId"] for o in active} - touched:
+            touch_rent(store, uid)
+            touched.add(uid)
+        totals["scanned"] += len(batch)
+        after = batch[-1]["_id"]
+        totals["seconds"] = time.perf_counter() - start
+        totals["rate"] = (totals["scanned"] - already_scanned) / max(totals["seconds"], 1e-9)
+        store.jobs.save(
+            name,
+            {"lastOccupantId": after, "scanned": totals["scanned"], "created": totals["created"], "updatedAt": datetime.now(timezone.utc)},
+        )
+        if progress is not None:
+            progress(totals)
+    totals["seconds"] = time.perf_counter() - start
+    store.jobs.save(name, {"finishedAt": datetime.now(timezone.utc), "scanned": totals["scanned"], "created": totals["created"]})
+    return totals
+
+
+def _month_key(value: str) -> str:
+    try:
+        return datetime.strptime(value, "%Y-%m").strftime("%Y-%m")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM, got {value!r}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Pre-create a month's rent records for every occupant.")
+    parser.add_argument("month", nargs="?", type=_month_key, help="YYYY-MM (default: this month)")
+    parser.add_argument("--next", action="store_true", help="roll over next month instead")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--restart", action="store_true", help="ignore a checkpoint and start from the first occupant")
+    args = parser.parse_args(argv)
+    month_key = args.month or (next_month_key() if args.next else date.today().strftime("%Y-%m"))
+
+    def report(totals):
+        print(
+            f"{month_key}: {totals['scanned']} occupants scanned, {totals['created']} records created, "
+            f"{totals['rate']:,.0f} occupants/s"
+        )
+
+    totals = rollover_month(get_storage(), month_key, max(1, args.batch_size), args.restart, report)
+    resumed = " (resumed from checkpoint)" if totals["resumed"] else ""
+    print(f"{month_key}: done in {totals['seconds']:.1f}s{resumed}; {totals['scanned']} scanned, {totals['created']} created")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
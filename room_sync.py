@@ -0,0 +1,61 @@
+from bson import ObjectId
+
+
+def room_key(room: dict) -> tuple[int, int]:
+    return (room["floor"], room["roomNumber"])
+
+
+def desired_rooms(floor_configs: list[dict], has_ground_floor: bool) -> list[dict]:
+    """Flatten submitted floor_configs into {floor, roomNumber, maxPeople} rows."""
+    rooms = []
+    for idx, fc in enumerate(floor_configs):
+        floor_num = idx if has_ground_floor else idx + 1
+        for ridx, r in enumerate(fc["rooms"]):
+            rooms.append({"floor": floor_num, "roomNumber": ridx + 1, "maxPeople": r.get("maxPeople", 2)})
+    return rooms
+
+
+def diff_rooms(existing: list[dict], desired: list[dict]) -> dict:
+    """Compare stored rooms against the desired layout.
+
+    Returns {"added", "resized", "removed"}: rooms to insert, stored rooms whose
+    maxPeople changes (with the new value under "newMaxPeople"), and stored
+    rooms that are no longer part of the layout. Unchanged rooms appear nowhere.
+    """
+    by_key = {}
+    for room in existing:
+        by_key.setdefault(room_key(room), room)
+    desired_keys = set()
+    added, resized = [], []
+    for room in desired:
+        key = room_key(room)
+        desired_keys.add(key)
+        current = by_key.get(key)
+        if current is None:
+            added.append(room)
+        elif current.get("maxPeople") != room["maxPeople"]:
+            resized.append({**current, "newMaxPeople": room["maxPeople"]})
+    removed = [room for key, room in by_key.items() if key not in desired_keys]
+    return {"added": added, "resized": resized, "removed": removed}
+
+
+def sync_rooms(store, uid: ObjectId, floor_configs: list[dict], has_ground_floor: bool) -> dict:
+    """Reconcile a tenant's rooms with floor_configs and return a diff summary.
+
+    One read of the current rooms, one batched write of the diff, and a
+    delete (plus rent detach) for occupants of removed rooms; unchanged
+    rooms cost nothing.
+    """
+    desired = desired_rooms(floor_configs, has_ground_floor)
+    diff = diff_rooms(store.rooms.list(uid), desired)
+    store.rooms.apply_diff(uid, diff)
+    removed_occupants = store.occupants.delete_in_rooms(uid, [r["_id"] for r in diff["removed"]])
+    store.rent.detach(uid, removed_occupants)
+    return {
+        "roomCount": len(desired),
+        "roomsAdded": len(diff["added"]),
+        "roomsResized": len(diff["resized"]),
+        "roomsRemoved": len(diff["removed"]),
+        "removedRooms": [f"{r['floor']}-{r['roomNumber']}" for r in diff["removed"]],
+        "occupantsRemoved": len(removed_occupants),
+    }
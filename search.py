@@ -0,0 +1,92 @@
+"""Index-backed name search.
+
+Names are normalized (accents stripped, case-folded, split into words) when a
+document is written, and every prefix of every word is stored in
+``nameTokens``. A search is then an equality match on a multikey index, so
+it stays a bounded index scan however large a tenant's data grows, and raw
+user input never reaches $regex.
+
+    python -m search --backfill
+
+adds ``nameTokens`` to documents written before this field existed.
+"""
+import argparse
+import re
+import sys
+import unicodedata
+
+from pymongo import UpdateOne
+
+MAX_PREFIX_LENGTH = 20
+MAX_QUERY_WORDS = 5
+SEARCH_COLLECTIONS = ("activityLogs", "occupants", "advanceBookings")
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def normalize_words(text: str | None) -> list[str]:
+    if not text:
+        return []
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _WORD_RE.findall(stripped.casefold())
+
+
+def name_tokens(name: str | None) -> list[str]:
+    """Every prefix (up to MAX_PREFIX_LENGTH) of every word in name."""
+    tokens = set()
+    for word in normalize_words(name):
+        for end in range(1, min(len(word), MAX_PREFIX_LENGTH) + 1):
+            tokens.add(word[:end])
+    return sorted(tokens)
+
+
+def query_tokens(query: str | None) -> list[str]:
+    """Tokens a name must all contain to match query, longest first."""
+    words = [w[:MAX_PREFIX_LENGTH] for w in normalize_words(query)][:MAX_QUERY_WORDS]
+    # Longest word first: $all uses its first element for the index bounds.
+    return sorted(words, key=len, reverse=True)
+
+
+def name_filter(query: str | None) -> dict | None:
+    """Filter matching names where each query word prefixes some name word."""
+    tokens = query_tokens(query)
+    if not tokens:
+        return None
+    return {"nameTokens": {"$all": tokens}}
+
+
+def backfill_name_tokens(db, batch_size: int = 1000) -> dict[str, int]:
+    """Set nameTokens on documents that predate it, in bulk_write batches."""
+    updated = {}
+    for collection in SEARCH_COLLECTIONS:
+        count = 0
+        ops = []
+        cursor = db[collection].find({"nameTokens": {"$exists": False}}, {"name": 1}).batch_size(batch_size)
+        for doc in cursor:
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"nameTokens": name_tokens(doc.get("name"))}}))
+            if len(ops) >= batch_size:
+                count += db[collection].bulk_write(ops, ordered=False).modified_count
+                ops = []
+        if ops:
+            count += db[collection].bulk_write(ops, ordered=False).modified_count
+        updated[collection] = count
+    return updated
+
+
+def main(argv: list[str] | None = None) -> int:
+    from database import get_db
+
+    parser = argparse.ArgumentParser(description="Maintain name search tokens.")
+    parser.add_argument("--backfill", action="store_true", help="add nameTokens to older documents")
+    args = parser.parse_args(argv)
+    if not args.backfill:
+        parser.print_help()
+        return 0
+    for collection, count in backfill_name_tokens(get_db()).items():
+        print(f"{collection}: {count} updated")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,36 @@
+"""Storage backends behind the routes.
+
+STORAGE_BACKEND selects "mongo" (default) or "memory". get_storage()
+returns the process-wide Storage, whose repositories (users, config, rooms,
+occupants, rent, bookings, logs) are what route code talks to.
+"""
+from config import STORAGE_BACKEND
+from storage.base import Storage
+
+_storage: Storage | None = None
+
+
+def create_storage(backend: str) -> Storage:
+    if backend == "mongo":
+        from database import get_db
+        from storage.mongo import MongoStorage
+
+        return MongoStorage(get_db)
+    if backend == "memory":
+        from storage.memory import MemoryStorage
+
+        return MemoryStorage()
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+def get_storage() -> Storage:
+    global _storage
+    if _storage is None:
+        _storage = create_storage(STORAGE_BACKEND)
+    return _storage
+
+
+def set_storage(storage: Storage | None) -> None:
+    """Replace the process-wide storage (benchmarks, tests)."""
+    global _storage
+    _storage = storage
@@ -0,0 +1,297 @@
+"""Repository interfaces shared by the Mongo and in-memory backends.
+
+Documents cross this boundary in their Mongo shape (ObjectId ids, datetime
+fields), so route code does not care which backend is active. Each method
+is one logical operation; on Mongo that is one round trip unless noted.
+"""
+from __future__ import annotations
+
+from collections import Counter
+from collections.abc import Iterator
+from datetime import datetime
+
+from bson import ObjectId
+
+
+class UsersRepository:
+    def find_by_email(self, email: str) -> dict | None:
+        raise NotImplementedError
+
+    def insert(self, doc: dict) -> ObjectId:
+        raise NotImplementedError
+
+    def update_password_hash(self, uid: ObjectId, password_hash: str) -> None:
+        raise NotImplementedError
+
+
+class ConfigRepository:
+    def get(self, uid: ObjectId) -> dict | None:
+        raise NotImplementedError
+
+    def save(self, uid: ObjectId, fields: dict) -> None:
+        """Upsert the tenant's config document with fields."""
+        raise NotImplementedError
+
+    def bump_version(self, uid: ObjectId, field: str = "dataVersion") -> int:
+        """Increment a version counter (dataVersion after rooms or occupants
+        changed; see conditional.py for the others), creating the config
+        document if the tenant has none yet. Returns the new value."""
+        raise NotImplementedError
+
+
+class RoomsRepository:
+    def list(self, uid: ObjectId) -> list[dict]:
+        """All of a tenant's rooms ordered by (floor, roomNumber)."""
+        raise NotImplementedError
+
+    def get_many(self, uid: ObjectId, room_ids: list[ObjectId]) -> list[dict]:
+        raise NotImplementedError
+
+    def get(self, uid: ObjectId, rid: ObjectId) -> dict | None:
+        """One room with its capacity and occupantIds."""
+        raise NotImplementedError
+
+    def exists(self, uid: ObjectId, rid: ObjectId) -> bool:
+        raise NotImplementedError
+
+    def reserve_bed(self, uid: ObjectId, rid: ObjectId, oid: ObjectId) -> bool:
+        """Append oid to occupantIds only if the room has a free bed."""
+        raise NotImplementedError
+
+    def reserve_beds(self, uid: ObjectId, beds: dict[ObjectId, list[ObjectId]]) -> list[ObjectId]:
+        """reserve_bed for many rooms in one batch; each room gets all or none.
+
+        beds maps room id to the occupant ids to append. Returns the rooms
+        that did not have enough free beds (and were left unchanged).
+        """
+        raise NotImplementedError
+
+    def release_bed(self, uid: ObjectId, rid: ObjectId, oid: ObjectId) -> None:
+        raise NotImplementedError
+
+    def apply_diff(self, uid: ObjectId, diff: dict) -> None:
+        """Apply a room_sync.diff_rooms() result in one batch."""
+        raise NotImplementedError
+
+
+class OccupantsRepository:
+    def list(self, uid: ObjectId, projection: tuple[str, ...] | None = None) -> list[dict]:
+        """All of a tenant's occupants, most recent dateOfJoin first.
+
+        With projection, each document has only those fields and _id.
+        """
+        raise NotImplementedError
+
+    def get(self, uid: ObjectId, oid: ObjectId) -> dict | None:
+        raise NotImplementedError
+
+    def insert(self, doc: dict) -> None:
+        raise NotImplementedError
+
+    def insert_many(self, docs: list[dict]) -> None:
+        raise NotImplementedError
+
+    def delete(self, uid: ObjectId, oid: ObjectId) -> dict | None:
+        """Delete and return the occupant, or None if it was already gone."""
+        raise NotImplementedError
+
+    def delete_in_rooms(self, uid: ObjectId, room_ids: list[ObjectId]) -> list[ObjectId]:
+        """Delete the occupants of room_ids and return their ids."""
+        raise NotImplementedError
+
+    def search(self, uid: ObjectId, tokens: list[str], limit: int) -> list[dict]:
+        """Occupants whose nameTokens contain every token."""
+        raise NotImplementedError
+
+    def scan(self, after: ObjectId | None, limit: int) -> list[dict]:
+        """Up to limit occupants of any tenant with _id > after, in _id order.
+
+        Documents carry _id, userId, roomId and dateOfJoin; batch jobs page
+        through the whole collection with this.
+        """
+        raise NotImplementedError
+
+    def stream(self, uid: ObjectId, filters: dict) -> Iterator[dict]:
+        """Every matching occupant, earliest dateOfJoin first, read in batches.
+
+        filters may hold "from"/"to" (datetime bounds on dateOfJoin) and
+        "nameTokens".
+        """
+        raise NotImplementedError
+
+
+class RentRepository:
+    def for_month(self, uid: ObjectId, month_key: str) -> list[dict]:
+        raise NotImplementedError
+
+    def ensure(self, uid: ObjectId, occupants: list[dict], month_key: str) -> int:
+        """Create missing records for occupants, leaving existing ones untouched."""
+        raise NotImplementedError
+
+    def ensure_bulk(self, occupants: list[dict], month_key: str) -> int:
+        """Like ensure, for occupants of any tenant (each carries its userId)."""
+        raise NotImplementedError
+
+    def toggle(self, uid: ObjectId, occupant: dict, month_key: str) -> bool:
+        """Atomically flip the paid flag (upserting as paid) and return it."""
+        raise NotImplementedError
+
+    def set_paid(self, uid: ObjectId, occupants: list[dict], month_key: str, paid: bool) -> list[ObjectId]:
+        """Set the paid flag for many occupants at once; returns the ids that changed.
+
+        Missing records are created first. Records already in the target
+        state, and records of removed occupants, are left alone.
+        """
+        raise NotImplementedError
+
+    def stream(self, uid: ObjectId, filters: dict) -> Iterator[dict]:
+        """Every matching record in month order, read in batches.
+
+        filters may hold "fromMonth"/"toMonth" (inclusive YYYY-MM bounds),
+        "occupantIds" and "paid".
+        """
+        raise NotImplementedError
+
+    def detach(self, uid: ObjectId, occupant_ids: list[ObjectId]) -> int:
+        """Mark removed occupants' records removed; they stop counting in summaries."""
+        raise NotImplementedError
+
+    # ensure, ensure_bulk, toggle, set_paid and detach keep rentSummaries current with
+    # $inc as they write, so the rent header and trend never scan records.
+
+    def summaries(self, uid: ObjectId, months: list[str]) -> list[dict]:
+        """Stored (userId, month) summaries for months; missing months are absent.
+
+        Each has paidCount, unpaidCount, paidAmount and dueAmount.
+        """
+        raise NotImplementedError
+
+    def rebuild_summaries(self, uid: ObjectId | None = None) -> list[ObjectId]:
+        """Recompute summaries from rentRecords (one tenant or all).
+
+        Returns the tenants whose summaries were rewritten or dropped.
+        """
+        raise NotImplementedError
+
+
+class BookingsRepository:
+    def list(self, uid: ObjectId) -> list[dict]:
+        """All of a tenant's advance bookings by expectedJoinDate."""
+        raise NotImplementedError
+
+    def insert(self, doc: dict) -> ObjectId:
+        raise NotImplementedError
+
+    def delete(self, uid: ObjectId, bid: ObjectId) -> dict | None:
+        raise NotImplementedError
+
+    def search(self, uid: ObjectId, tokens: list[str], limit: int) -> list[dict]:
+        raise NotImplementedError
+
+
+class LogsRepository:
+    def insert_many(self, docs: list[dict]) -> None:
+        raise NotImplementedError
+
+    def page(
+        self, uid: ObjectId, filters: dict, cursor: str | None, page_size: int
+    ) -> tuple[list[dict], str | None, str | None]:
+        """One newest-first keyset page; see pagination.keyset_page.
+
+        filters may hold "from"/"to" (datetime bounds on createdAt), "type"
+        and "nameTokens" (list of search tokens, all required).
+        """
+        raise NotImplementedError
+
+    def stream(self, uid: ObjectId, filters: dict) -> Iterator[dict]:
+        """Every entry matching filters (as for page), newest first, read in batches."""
+        raise NotImplementedError
+
+    def oldest(self, before: datetime, limit: int) -> list[dict]:
+        """Up to limit entries of any tenant created before before, oldest first."""
+        raise NotImplementedError
+
+    def delete_ids(self, ids: list[ObjectId]) -> int:
+        raise NotImplementedError
+
+
+class ArchiveRepository:
+    """Compacted activity log buckets: one tenant, one month, many entries.
+
+    A bucket is {"_id", "userId", "month", "count", "types", "data"}, where
+    data is the zlib-compressed BSON of its entries (see retention.py).
+    """
+
+    def save_buckets(self, buckets: list[dict]) -> None:
+        """Insert or replace buckets by _id, so a re-run sweep is harmless."""
+        raise NotImplementedError
+
+    def buckets(
+        self, uid: ObjectId, from_month: str | None, to_month: str | None, newest_first: bool = True
+    ) -> Iterator[dict]:
+        """A tenant's buckets with from_month <= month <= to_month, in month order."""
+        raise NotImplementedError
+
+
+class JobsRepository:
+    """Progress documents for resumable batch jobs, keyed by job name."""
+
+    def get(self, name: str) -> dict | None:
+        raise NotImplementedError
+
+    def save(self, name: str, fields: dict) -> None:
+        raise NotImplementedError
+
+
+class _CountingRepository:
+    """Proxy that tallies calls per "repo.method" into a shared Counter."""
+
+    def __init__(self, name: str, repo, counts: Counter):
+        self._name = name
+        self._repo = repo
+        self._counts = counts
+
+    def __getattr__(self, attr):
+        value = getattr(self._repo, attr)
+        if not callable(value) or attr.startswith("_"):
+            return value
+        key = f"{self._name}.{attr}"
+        counts = self._counts
+
+        def counted(*args, **kwargs):
+            counts[key] += 1
+            return value(*args, **kwargs)
+
+        return counted
+
+
+class Storage:
+    """Bundle of repositories for one backend, with per-operation counters."""
+
+    backend = "base"
+
+    def __init__(
+        self,
+        users: UsersRepository,
+        config: ConfigRepository,
+        rooms: RoomsRepository,
+        occupants: OccupantsRepository,
+        rent: RentRepository,
+        bookings: BookingsRepository,
+        logs: LogsRepository,
+        jobs: JobsRepository,
+        archive: ArchiveRepository,
+    ):
+        self.op_counts: Counter = Counter()
+        self.users = _CountingRepository("users", users, self.op_counts)
+        self.config = _CountingRepository("config", config, self.op_counts)
+        self.rooms = _CountingRepository("rooms", rooms, self.op_counts)
+        self.occupants = _CountingRepository("occupants", occupants, self.op_counts)
+        self.rent = _CountingRepository("rent", rent, self.op_counts)
+        self.bookings = _CountingRepository("bookings", bookings, self.op_counts)
+        self.logs = _CountingRepository("logs", logs, self.op_counts)
+        self.jobs = _CountingRepository("jobs", jobs, self.op_counts)
+        self.archive = _CountingRepository("archive", archive, self.op_counts)
+
+    def reset_op_counts(self) -> None:
+        self.op_counts.clear()
@@ -0,0 +1,541 @@
+"""In-memory storage backend.
+
+Keeps every collection in process-local dicts with the secondary indexes the
+routes need (per-tenant maps, room membership, name tokens, a sorted
+activity log), guarded by one lock so the conditional operations are as
+atomic as their Mongo counterparts. Nothing is persisted; it exists so
+routes can be benchmarked and load-tested with zero database latency.
+"""
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from pagination import decode_cursor, finish_page
+from rent_ledger import new_rent_record, summary_deltas
+from storage.base import (
+    ArchiveRepository,
+    BookingsRepository,
+    ConfigRepository,
+    JobsRepository,
+    LogsRepository,
+    OccupantsRepository,
+    RentRepository,
+    RoomsRepository,
+    Storage,
+    UsersRepository,
+)
+
+_MIN_ID = ObjectId("000000000000000000000000")
+_MAX_ID = ObjectId("ffffffffffffffffffffffff")
+
+
+def _copy(doc: dict | None) -> dict | None:
+    if doc is None:
+        return None
+    return {k: (list(v) if isinstance(v, list) else dict(v) if isinstance(v, dict) else v) for k, v in doc.items()}
+
+
+def _utc_key(value: datetime) -> datetime:
+    # Mongo stores naive datetimes as UTC; compare everything that way.
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class _MemoryRepository:
+    def __init__(self, lock: threading.RLock):
+        self._lock = lock
+
+
+class MemoryUsers(_MemoryRepository, UsersRepository):
+    def __init__(self, lock):
+        super().__init__(lock)
+        self._by_email: dict[str, dict] = {}
+
+    def find_by_email(self, email):
+        with self._lock:
+            return _copy(self._by_email.get(email))
+
+    def insert(self, doc):
+        with self._lock:
+            if doc["email"] in self._by_email:
+                raise DuplicateKeyError("email_unique")
+            doc.setdefault("_id", ObjectId())
+            self._by_email[doc["email"]] = _copy(doc)
+            return doc["_id"]
+
+    def update_password_hash(self, uid, password_hash):
+        with self._lock:
+            for doc in self._by_email.values():
+                if doc["_id"] == uid:
+                    doc["passwordHash"] = password_hash
+                    return
+
+
+class MemoryConfig(_MemoryRepository, ConfigRepository):
+    def __init__(self, lock):
+        super().__init__(lock)
+        self._by_user: dict[ObjectId, dict] = {}
+
+    def get(self, uid):
+        with self._lock:
+            return _copy(self._by_user.get(uid))
+
+    def save(self, uid, fields):
+        with self._lock:
+            doc = self._by_user.setdefault(uid, {"_id": ObjectId(), "userId": uid})
+            doc.update(_copy(fields))
+
+    def bump_version(self, uid, field="dataVersion"):
+        with self._lock:
+            doc = self._by_user.setdefault(uid, {"_id": ObjectId(), "userId": uid})
+            doc[field] = doc.get(field, 0) + 1
+            return doc[field]
+
+
+class MemoryRooms(_MemoryRepository, RoomsRepository):
+    def __init__(self, lock):
+        super().__init__(lock)
+        self._docs: dict[ObjectId, dict] = {}
+        self._by_user: dict[ObjectId, dict[tuple[int, int], ObjectId]] = defaultdict(dict)
+
+    def _owned(self, uid, rid):
+        doc = self._docs.get(rid)
+        return doc if doc is not None and doc["userId"] == uid else None
+
+    def list(self, uid):
+        with self._lock:
+            keyed = self._by_user.get(uid, {})
+            return [_copy(self._docs[keyed[key]]) for key in sorted(keyed)]
+
+    def get_many(self, uid, room_ids):
+        with self._lock:
+            return [_copy(doc) for rid in room_ids if (doc := self._owned(uid, rid)) is not None]
+
+    def get(self, uid, rid):
+        with self._lock:
+            return _copy(self._owned(uid, rid))
+
+    def exists(self, uid, rid):
+        with self._lock:
+            return self._owned(uid, rid) is not None
+
+    def reserve_bed(self, uid, rid, oid):
+        with self._lock:
+            doc = self._owned(uid, rid)
+            if doc is None or len(doc["occupantIds"]) >= doc["maxPeople"]:
+                return False
+            doc["occupantIds"].append(oid)
+            return True
+
+    def reserve_beds(self, uid, beds):
+        with self._lock:
+            full = []
+            for rid, oids in beds.items():
+                doc = self._owned(uid, rid)
+                if doc is None or len(doc["occupantIds"]) + len(oids) > doc["maxPeople"]:
+                    full.append(rid)
+                else:
+                    doc["occupantIds"].extend(oids)
+            return full
+
+    def release_bed(self, uid, rid, oid):
+        with self._lock:
+            doc = self._owned(uid, rid)
+            if doc is not None:
+                doc["occupantIds"] = [x for x in doc["occupantIds"] if x != oid]
+
+    def apply_diff(self, uid, diff):
+        with self._lock:
+            keyed = self._by_user[uid]
+            for r in diff["added"]:
+                key = (r["floor"], r["roomNumber"])
+                if key in keyed:
+                    continue
+                rid = ObjectId()
+                self._docs[rid] = {
+                    "_id": rid, "userId": uid, "floor": r["floor"], "roomNumber": r["roomNumber"],
+                    "maxPeople": r["maxPeople"], "occupantIds": [],
+                }
+                keyed[key] = rid
+            for r in diff["resized"]:
+                doc = self._owned(uid, r["_id"])
+                if doc is not None:
+                    doc["maxPeople"] = r["newMaxPeople"]
+            for r in diff["removed"]:
+                doc = self._owned(uid, r["_id"])
+                if doc is not None:
+                    del self._docs[r["_id"]]
+                    keyed.pop((doc["floor"], doc["roomNumber"]), None)
+
+
+class _TokenIndexed(_MemoryRepository):
+    """Per-tenant documents with a (tenant, name token) -> ids index."""
+
+    def __init__(self, lock):
+        super().__init__(lock)
+        self._docs: dict[ObjectId, dict] = {}
+        self._by_user: dict[ObjectId, set[ObjectId]] = defaultdict(set)
+        self._by_token: dict[tuple[ObjectId, str], set[ObjectId]] = defaultdict(set)
+
+    def _add(self, doc: dict) -> None:
+        doc = _copy(doc)
+        self._docs[doc["_id"]] = doc
+        self._by_user[doc["userId"]].add(doc["_id"])
+        for token in doc.get("nameTokens") or []:
+            self._by_token[(doc["userId"], token)].add(doc["_id"])
+
+    def _remove(self, uid, doc_id) -> dict | None:
+        doc = self._docs.get(doc_id)
+        if doc is None or doc["userId"] != uid:
+            return None
+        del self._docs[doc_id]
+        self._by_user[uid].discard(doc_id)
+        for token in doc.get("nameTokens") or []:
+            self._by_token[(uid, token)].discard(doc_id)
+        return doc
+
+    def _matching(self, uid, tokens) -> list[dict]:
+        sets = sorted((self._by_token.get((uid, t), set()) for t in tokens), key=len)
+        if not sets:
+            return []
+        ids = set(sets[0]).intersection(*sets[1:])
+        return [self._docs[i] for i in ids]
+
+
+class MemoryOccupants(_TokenIndexed, OccupantsRepository):
+    def __init__(self, lock):
+        super().__init__(lock)
+        self._by_room: dict[ObjectId, set[ObjectId]] = defaultdict(set)
+
+    def list(self, uid, projection=None):
+        with self._lock:
+            docs = [self._docs[i] for i in self._by_user.get(uid, ())]
+            docs.sort(key=lambda o: _utc_key(o["dateOfJoin"]), reverse=True)
+            if projection:
+                keep = {"_id", *projection}
+                return [{k: v for k, v in _copy(o).items() if k in keep} for o in docs]
+            return [_copy(o) for o in docs]
+
+    def get(self, uid, oid):
+        with self._lock:
+            doc = self._docs.get(oid)
+            return _copy(doc) if doc is not None and doc["userId"] == uid else None
+
+    def insert(self, doc):
+        with self._lock:
+            if doc["_id"] in self._docs:
+                raise DuplicateKeyError("_id_")
+            self._add(doc)
+            self._by_room[doc["roomId"]].add(doc["_id"])
+
+    def insert_many(self, docs):
+        with self._lock:
+            for doc in docs:
+                if doc["_id"] in self._docs:
+                    raise DuplicateKeyError("_id_")
+            for doc in docs:
+                self._add(doc)
+                self._by_room[doc["roomId"]].add(doc["_id"])
+
+    def delete(self, uid, oid):
+        with self._lock:
+            doc = self._remove(uid, oid)
+            if doc is not None:
+                self._by_room[doc["roomId"]].discard(oid)
+            return doc
+
+    def delete_in_rooms(self, uid, room_ids):
+        with self._lock:
+            deleted = []
+            for rid in room_ids:
+                for oid in list(self._by_room.pop(rid, ())):
+                    if self._remove(uid, oid) is not None:
+                        deleted.append(oid)
+            return deleted
+
+    def search(self, uid, tokens, limit):
+        with self._lock:
+            return [_copy(o) for o in self._matching(uid, tokens)[:limit]]
+
+    def stream(self, uid, filters):
+        with self._lock:
+            docs = self._matching(uid, filters["nameTokens"]) if filters.get("nameTokens") else [
+                self._docs[i] for i in self._by_user.get(uid, ())
+            ]
+            lo = _utc_key(filters["from"]) if filters.get("from") else None
+            hi = _utc_key(filters["to"]) if filters.get("to") else None
+            docs = [
+                _copy(o)
+                for o in docs
+                if (lo is None or _utc_key(o["dateOfJoin"]) >= lo) and (hi is None or _utc_key(o["dateOfJoin"]) <= hi)
+            ]
+        docs.sort(key=lambda o: _utc_key(o["dateOfJoin"]))
+        return iter(docs)
+
+    def scan(self, after, limit):
+        with self._lock:
+            ids = sorted(i for i in self._docs if after is None or i > after)[:limit]
+            return [_copy(self._docs[i]) for i in ids]
+
+
+_SUMMARY_FIELDS = ("paidCount", "unpaidCount", "paidAmount", "dueAmount")
+
+
+class MemoryRent(_MemoryRepository, RentRepository):
+    def __init__(self, lock):
+        super().__init__(lock)
+        self._by_month: dict[tuple[ObjectId, str], dict[ObjectId, dict]] = defaultdict(dict)
+        self._summaries: dict[tuple[ObjectId, str], dict] = {}
+
+    def _bump_summaries(self, deltas) -> None:
+        for key, delta in deltas.items():
+            summary = self._summaries.setdefault(key, {field: 0 for field in _SUMMARY_FIELDS})
+            for field, value in delta.items():
+                summary[field] += value
+
+    def for_month(self, uid, month_key):
+        with self._lock:
+            return [_copy(r) for r in self._by_month.get((uid, month_key), {}).values()]
+
+    def ensure(self, uid, occupants, month_key):
+        return self.ensure_bulk([{**o, "userId": uid} for o in occupants], month_key)
+
+    def ensure_bulk(self, occupants, month_key):
+        with self._lock:
+            created = []
+            for o in occupants:
+                records = self._by_month[(o["userId"], month_key)]
+                if o["_id"] not in records:
+                    records[o["_id"]] = record = {"_id": ObjectId(), **new_rent_record(o["userId"], o, month_key)}
+                    created.append(record)
+            for record in created:
+                self._bump_summaries(summary_deltas(record["userId"], [record], 1))
+            return len(created)
+
+    def toggle(self, uid, occupant, month_key):
+        with self._lock:
+            records = self._by_month[(uid, month_key)]
+            record = records.get(occupant["_id"])
+            if record is None:
+                record = {"_id": ObjectId(), **new_rent_record(uid, occupant, month_key), "paid": True}
+                records[occupant["_id"]] = record
+                self._bump_summaries(summary_deltas(uid, [record], 1))
+                return True
+            self._bump_summaries(summary_deltas(uid, [record], -1))
+            record["paid"] = not record.get("paid", False)
+            self._bump_summaries(summary_deltas(uid, [record], 1))
+            return record["paid"]
+
+    def set_paid(self, uid, occupants, month_key, paid):
+        self.ensure(uid, occupants, month_key)
+        with self._lock:
+            records = self._by_month[(uid, month_key)]
+            changed = []
+            for o in occupants:
+                record = records[o["_id"]]
+                if record.get("removed") or bool(record.get("paid")) == paid:
+                    continue
+                self._bump_summaries(summary_deltas(uid, [record], -1))
+                record["paid"] = paid
+                self._bump_summaries(summary_deltas(uid, [record], 1))
+                changed.append(o["_id"])
+            return changed
+
+    def stream(self, uid, filters):
+        lo, hi = filters.get("fromMonth"), filters.get("toMonth")
+        wanted = set(filters["occupantIds"]) if filters.get("occupantIds") is not None else None
+        with self._lock:
+            months = sorted(m for (owner, m) in self._by_month if owner == uid and (not lo or m >= lo) and (not hi or m <= hi))
+        for month_key in months:
+            with self._lock:
+                records = [
+                    _copy(r)
+                    for oid, r in self._by_month[(uid, month_key)].items()
+                    if (wanted is None or oid in wanted) and (filters.get("paid") is None or r.get("paid") == filters["paid"])
+                ]
+            yield from records
+
+    def detach(self, uid, occupant_ids):
+        with self._lock:
+            wanted = set(occupant_ids)
+            detached = []
+            for (owner, _), records in self._by_month.items():
+                if owner != uid:
+                    continue
+                for oid, record in records.items():
+                    if oid in wanted and not record.get("removed"):
+                        record["removed"] = True
+                        detached.append(record)
+            self._bump_summaries(summary_deltas(uid, detached, -1))
+            return len(detached)
+
+    def summaries(self, uid, months):
+        with self._lock:
+            return [{"month": m, **self._summaries[(uid, m)]} for m in sorted(set(months)) if (uid, m) in self._summaries]
+
+    def rebuild_summaries(self, uid=None):
+        with self._lock:
+            tenants = {k[0] for k in self._summaries if uid is None or k[0] == uid}
+            for key in [k for k in self._summaries if uid is None or k[0] == uid]:
+                del self._summaries[key]
+            for (owner, _), records in self._by_month.items():
+                if uid is None or owner == uid:
+                    live = [r for r in records.values() if not r.get("removed")]
+                    self._bump_summaries(summary_deltas(owner, live, 1))
+            tenants.update(k[0] for k in self._summaries if uid is None or k[0] == uid)
+            return sorted(tenants)
+
+
+class MemoryBookings(_TokenIndexed, BookingsRepository):
+    def list(self, uid):
+        with self._lock:
+            docs = [self._docs[i] for i in self._by_user.get(uid, ())]
+            docs.sort(key=lambda b: _utc_key(b["expectedJoinDate"]))
+            return [_copy(b) for b in docs]
+
+    def insert(self, doc):
+        with self._lock:
+            doc.setdefault("_id", ObjectId())
+            self._add(doc)
+            return doc["_id"]
+
+    def delete(self, uid, bid):
+        with self._lock:
+            return self._remove(uid, bid)
+
+    def search(self, uid, tokens, limit):
+        with self._lock:
+            docs = sorted(self._matching(uid, tokens), key=lambda b: _utc_key(b["expectedJoinDate"]))
+            return [_copy(b) for b in docs[:limit]]
+
+
+class MemoryLogs(_MemoryRepository, LogsRepository):
+    """Per-tenant logs kept sorted by (createdAt, _id) for keyset paging."""
+
+    def __init__(self, lock):
+        super().__init__(lock)
+        self._keys: dict[ObjectId, list[tuple[datetime, ObjectId]]] = defaultdict(list)
+        self._docs: dict[ObjectId, dict] = {}
+
+    def insert_many(self, docs):
+        with self._lock:
+            for doc in docs:
+                doc.setdefault("_id", ObjectId())
+                self._docs[doc["_id"]] = _copy(doc)
+                insort(self._keys[doc["userId"]], (_utc_key(doc["createdAt"]), doc["_id"]))
+
+    def _matches(self, doc: dict, filters: dict) -> bool:
+        if filters.get("type") and doc.get("type") != filters["type"]:
+            return False
+        tokens = filters.get("nameTokens")
+        if tokens and not set(tokens).issubset(doc.get("nameTokens") or ()):
+            return False
+        return True
+
+    def page(self, uid, filters, cursor, page_size):
+        with self._lock:
+            keys = self._keys.get(uid, [])
+            lo = bisect_left(keys, (_utc_key(filters["from"]), _MIN_ID)) if filters.get("from") else 0
+            hi = bisect_right(keys, (_utc_key(filters["to"]), _MAX_ID)) if filters.get("to") else len(keys)
+            position = decode_cursor(cursor)
+            direction = "first" if position is None else position[0]
+            if position is not None:
+                boundary = (_utc_key(position[1]), position[2])
+                if direction == "next":
+                    hi = min(hi, bisect_left(keys, boundary))
+                else:
+                    lo = max(lo, bisect_right(keys, boundary))
+            indexes = range(lo, hi) if direction == "prev" else range(hi - 1, lo - 1, -1)
+            docs = []
+            for i in indexes:
+                doc = self._docs[keys[i][1]]
+                if self._matches(doc, filters):
+                    docs.append(_copy(doc))
+                    if len(docs) > page_size:
+                        break
+        return finish_page(docs, page_size, direction)
+
+    def stream(self, uid, filters):
+        # Keyset pages keep the lock (and the copies) to one batch at a time.
+        cursor = None
+        while True:
+            docs, cursor, _ = self.page(uid, filters, cursor, 1000)
+            yield from docs
+            if cursor is None:
+                return
+
+    def oldest(self, before, limit):
+        cutoff = _utc_key(before)
+        with self._lock:
+            keys = sorted(key for keys in self._keys.values() for key in keys if key[0] < cutoff)[:limit]
+            return [_copy(self._docs[oid]) for _, oid in keys]
+
+    def delete_ids(self, ids):
+        with self._lock:
+            deleted = 0
+            for oid in ids:
+                doc = self._docs.pop(oid, None)
+                if doc is not None:
+                    self._keys[doc["userId"]].remove((_utc_key(doc["createdAt"]), oid))
+                    deleted += 1
+            return deleted
+
+
+class MemoryArchive(_MemoryRepository, ArchiveRepository):
+    def __init__(self, lock):
+        super().__init__(lock)
+        self._by_user: dict[ObjectId, dict[ObjectId, dict]] = defaultdict(dict)
+
+    def save_buckets(self, buckets):
+        with self._lock:
+            for bucket in buckets:
+                self._by_user[bucket["userId"]][bucket["_id"]] = _copy(bucket)
+
+    def buckets(self, uid, from_month, to_month, newest_first=True):
+        with self._lock:
+            found = [
+                _copy(b)
+                for b in self._by_user.get(uid, {}).values()
+                if (not from_month or b["month"] >= from_month) and (not to_month or b["month"] <= to_month)
+            ]
+        found.sort(key=lambda b: (b["month"], b["_id"]), reverse=newest_first)
+        return iter(found)
+
+
+class MemoryJobs(_MemoryRepository, JobsRepository):
+    def __init__(self, lock):
+        super().__init__(lock)
+        self._by_name: dict[str, dict] = {}
+
+    def get(self, name):
+        with self._lock:
+            return _copy(self._by_name.get(name))
+
+    def save(self, name, fields):
+        with self._lock:
+            self._by_name.setdefault(name, {"_id": name}).update(_copy(fields))
+
+
+class MemoryStorage(Storage):
+    backend = "memory"
+
+    def __init__(self):
+        lock = threading.RLock()
+        super().__init__(
+            users=MemoryUsers(lock),
+            config=MemoryConfig(lock),
+            rooms=MemoryRooms(lock),
+            occupants=MemoryOccupants(lock),
+            rent=MemoryRent(lock),
+            bookings=MemoryBookings(lock),
+            logs=MemoryLogs(lock),
+            jobs=MemoryJobs(lock),
+            archive=MemoryArchive(lock),
+        )
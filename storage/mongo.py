@@ -0,0 +1,544 @@
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from pymongo import DeleteMany, InsertOne, ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from pagination import keyset_page
+from read_routing import bind
+from rent_ledger import new_rent_record, summary_deltas
+from storage.base import (
+    ArchiveRepository,
+    BookingsRepository,
+    ConfigRepository,
+    JobsRepository,
+    LogsRepository,
+    OccupantsRepository,
+    RentRepository,
+    RoomsRepository,
+    Storage,
+    UsersRepository,
+)
+
+# Large enough that a building's occupants, rooms and records for one month
+# come back in the initial reply instead of a trail of getMore round trips.
+BATCH_SIZE = 5000
+# Exports hold one batch at a time, so keep it small enough to start fast.
+EXPORT_BATCH_SIZE = 1000
+
+# Matches a room that still has a free bed.
+_HAS_VACANCY = {"$expr": {"$lt": [{"$size": {"$ifNull": ["$occupantIds", []]}}, "$maxPeople"]}}
+
+
+class _MongoRepository:
+    collection_name = ""
+
+    def __init__(self, get_db):
+        self._get_db = get_db
+
+    @property
+    def collection(self):
+        # Read preference and causal session for the current request.
+        return bind(self._get_db()[self.collection_name])
+
+
+class MongoUsers(_MongoRepository, UsersRepository):
+    collection_name = "users"
+
+    def find_by_email(self, email):
+        return self.collection.find_one({"email": email})
+
+    def insert(self, doc):
+        return self.collection.insert_one(doc).inserted_id
+
+    def update_password_hash(self, uid, password_hash):
+        self.collection.update_one({"_id": uid}, {"$set": {"passwordHash": password_hash}})
+
+
+class MongoConfig(_MongoRepository, ConfigRepository):
+    collection_name = "config"
+
+    def get(self, uid):
+        return self.collection.find_one({"userId": uid})
+
+    def save(self, uid, fields):
+        self.collection.update_one({"userId": uid}, {"$set": {"userId": uid, **fields}}, upsert=True)
+
+    def bump_version(self, uid, field="dataVersion"):
+        doc = self.collection.find_one_and_update(
+            {"userId": uid}, {"$inc": {field: 1}}, projection={field: 1}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        return doc[field]
+
+
+class MongoRooms(_MongoRepository, RoomsRepository):
+    collection_name = "rooms"
+
+    def list(self, uid):
+        return list(
+            self.collection.find(
+                {"userId": uid}, {"floor": 1, "roomNumber": 1, "maxPeople": 1, "occupantIds": 1}
+            )
+            .sort([("floor", 1), ("roomNumber", 1)])
+            .batch_size(BATCH_SIZE)
+        )
+
+    def get_many(self, uid, room_ids):
+        return list(self.collection.find({"_id": {"$in": room_ids}, "userId": uid}, {"floor": 1, "roomNumber": 1}))
+
+    def get(self, uid, rid):
+        return self.collection.find_one(
+            {"_id": rid, "userId": uid}, {"floor": 1, "roomNumber": 1, "maxPeople": 1, "occupantIds": 1}
+        )
+
+    def exists(self, uid, rid):
+        return bool(self.collection.count_documents({"_id": rid, "userId": uid}, limit=1))
+
+    def reserve_bed(self, uid, rid, oid):
+        result = self.collection.update_one(
+            {"_id": rid, "userId": uid, **_HAS_VACANCY},
+            {"$push": {"occupantIds": oid}},
+        )
+        return result.matched_count == 1
+
+    def reserve_beds(self, uid, beds):
+        if not beds:
+            return []
+        ops = [
+            UpdateOne(
+                {
+                    "_id": rid,
+                    "userId": uid,
+                    "$expr": {"$lte": [{"$add": [{"$size": {"$ifNull": ["$occupantIds", []]}}, len(oids)]}, "$maxPeople"]},
+                },
+                {"$push": {"occupantIds": {"$each": oids}}},
+            )
+            for rid, oids in beds.items()
+        ]
+        result = self.collection.bulk_write(ops, ordered=False)
+        if result.matched_count == len(ops):
+            return []
+        # Some room filled up meanwhile; see which pushes landed.
+        placed = {
+            r["_id"]
+            for r in self.collection.find(
+                {"userId": uid, "occupantIds": {"$in": [oids[0] for oids in beds.values()]}}, {"_id": 1}
+            )
+        }
+        return [rid for rid in beds if rid not in placed]
+
+    def release_bed(self, uid, rid, oid):
+        self.collection.update_one({"_id": rid, "userId": uid}, {"$pull": {"occupantIds": oid}})
+
+    def apply_diff(self, uid, diff):
+        ops = [
+            InsertOne(
+                {"userId": uid, "floor": r["floor"], "roomNumber": r["roomNumber"], "maxPeople": r["maxPeople"], "occupantIds": []}
+            )
+            for r in diff["added"]
+        ]
+        ops.extend(
+            UpdateOne({"_id": r["_id"], "userId": uid}, {"$set": {"maxPeople": r["newMaxPeople"]}})
+            for r in diff["resized"]
+        )
+        removed_ids = [r["_id"] for r in diff["removed"]]
+        if removed_ids:
+            ops.append(DeleteMany({"_id": {"$in": removed_ids}, "userId": uid}))
+        if ops:
+            self.collection.bulk_write(ops, ordered=False)
+
+
+class MongoOccupants(_MongoRepository, OccupantsRepository):
+    collection_name = "occupants"
+
+    def list(self, uid, projection=None):
+        fields = projection or ("roomId", "name", "phone", "dateOfJoin")
+        return list(
+            self.collection.find({"userId": uid}, {f: 1 for f in fields})
+            .sort("dateOfJoin", -1)
+            .batch_size(BATCH_SIZE)
+        )
+
+    def get(self, uid, oid):
+        return self.collection.find_one({"_id": oid, "userId": uid}, {"roomId": 1, "name": 1, "phone": 1})
+
+    def insert(self, doc):
+        self.collection.insert_one(doc)
+
+    def insert_many(self, docs):
+        if docs:
+            self.collection.insert_many(docs, ordered=False)
+
+    def delete(self, uid, oid):
+        return self.collection.find_one_and_delete(
+            {"_id": oid, "userId": uid},
+            projection={"roomId": 1, "name": 1, "phone": 1},
+        )
+
+    def delete_in_rooms(self, uid, room_ids):
+        if not room_ids:
+            return []
+        ids = [d["_id"] for d in self.collection.find({"userId": uid, "roomId": {"$in": room_ids}}, {"_id": 1})]
+        if ids:
+            self.collection.delete_many({"_id": {"$in": ids}, "userId": uid})
+        return ids
+
+    def search(self, uid, tokens, limit):
+        return list(
+            self.collection.find(
+                {"userId": uid, "nameTokens": {"$all": tokens}},
+                {"roomId": 1, "name": 1, "phone": 1, "dateOfJoin": 1},
+            ).limit(limit)
+        )
+
+    def stream(self, uid, filters):
+        query = {"userId": uid}
+        if filters.get("from") or filters.get("to"):
+            query["dateOfJoin"] = {}
+            if filters.get("from"):
+                query["dateOfJoin"]["$gte"] = filters["from"]
+            if filters.get("to"):
+                query["dateOfJoin"]["$lte"] = filters["to"]
+        if filters.get("nameTokens"):
+            query["nameTokens"] = {"$all": filters["nameTokens"]}
+        return self.collection.find(
+            query, {"roomId": 1, "name": 1, "phone": 1, "dateOfJoin": 1}
+        ).sort("dateOfJoin", 1).batch_size(EXPORT_BATCH_SIZE)
+
+    def scan(self, after, limit):
+        query = {"_id": {"$gt": after}} if after is not None else {}
+        return list(
+            self.collection.find(query, {"userId": 1, "roomId": 1, "dateOfJoin": 1})
+            .sort("_id", 1)
+            .limit(limit)
+            .batch_size(limit)
+        )
+
+
+class MongoRent(_MongoRepository, RentRepository):
+    collection_name = "rentRecords"
+    summaries_name = "rentSummaries"
+
+    @property
+    def summaries_collection(self):
+        return bind(self._get_db()[self.summaries_name])
+
+    def _bump_summaries(self, deltas: dict[tuple, Counter]) -> None:
+        now = datetime.now(timezone.utc)
+        ops = []
+        for (uid, month_key), delta in deltas.items():
+            inc = {field: value for field, value in delta.items() if value}
+            if inc:
+                ops.append(UpdateOne({"userId": uid, "month": month_key}, {"$inc": inc, "$set": {"updatedAt": now}}, upsert=True))
+        if ops:
+            self.summaries_collection.bulk_write(ops, ordered=False)
+
+    def for_month(self, uid, month_key):
+        return list(
+            self.collection.find(
+                {"userId": uid, "month": month_key},
+                {"occupantId": 1, "paid": 1, "dueAmount": 1},
+            ).batch_size(BATCH_SIZE)
+        )
+
+    def ensure(self, uid, occupants, month_key):
+        return self.ensure_bulk([{**o, "userId": uid} for o in occupants], month_key)
+
+    def ensure_bulk(self, occupants, month_key):
+        # $setOnInsert leaves existing records alone, so concurrent callers
+        # racing on the same month cannot clobber a payment.
+        if not occupants:
+            return 0
+        ops = [
+            UpdateOne(
+                {"userId": o["userId"], "occupantId": o["_id"], "month": month_key},
+                {"$setOnInsert": new_rent_record(o["userId"], o, month_key)},
+                upsert=True,
+            )
+            for o in occupants
+        ]
+        result = self.collection.bulk_write(ops, ordered=False)
+        deltas = defaultdict(Counter)
+        for index in result.upserted_ids:
+            deltas[(occupants[index]["userId"], month_key)]["unpaidCount"] += 1
+        self._bump_summaries(deltas)
+        return result.upserted_count
+
+    def toggle(self, uid, occupant, month_key):
+        pipeline = [
+            {
+                "$set": {
+                    "paid": {"$not": [{"$ifNull": ["$paid", False]}]},
+                    "roomId": {"$ifNull": ["$roomId", occupant["roomId"]]},
+                    "dueAmount": {"$ifNull": ["$dueAmount", 0]},
+                }
+            }
+        ]
+        query = {"userId": uid, "occupantId": occupant["_id"], "month": month_key}
+        projection = {"paid": 1, "dueAmount": 1}
+        # The document before the flip tells the summary what changed.
+        try:
+            before = self.collection.find_one_and_update(
+                query, pipeline, projection=projection, upsert=True, return_document=ReturnDocument.BEFORE
+            )
+        except DuplicateKeyError:
+            # Lost an upsert race on the unique (userId, occupantId, month)
+            # index; the record exists now, so the retry is a plain update.
+            before = self.collection.find_one_and_update(
+                query, pipeline, projection=projection, return_document=ReturnDocument.BEFORE
+            )
+        delta = Counter()
+        if before is None:
+            paid = True
+            delta["paidCount"] = 1
+        else:
+            paid = not before.get("paid", False)
+            sign = 1 if paid else -1
+            amount = before.get("dueAmount") or 0
+            delta.update({"paidCount": sign, "unpaidCount": -sign, "paidAmount": sign * amount, "dueAmount": -sign * amount})
+        self._bump_summaries({(uid, month_key): delta})
+        return paid
+
+    def set_paid(self, uid, occupants, month_key, paid):
+        if not occupants:
+            return []
+        by_id = {o["_id"]: o for o in occupants}
+        current = {
+            r["occupantId"]: r
+            for r in self.collection.find(
+                {"userId": uid, "month": month_key, "occupantId": {"$in": list(by_id)}},
+                {"occupantId": 1, "paid": 1, "dueAmount": 1, "removed": 1},
+            )
+        }
+        missing = [o for oid, o in by_id.items() if oid not in current]
+        if missing:
+            self.ensure(uid, missing, month_key)
+            for o in missing:
+                current[o["_id"]] = new_rent_record(uid, o, month_key)
+        before = [
+            {**r, "month": month_key}
+            for r in current.values()
+            if not r.get("removed") and bool(r.get("paid")) != paid
+        ]
+        if not before:
+            return []
+        # The paid guard makes each update a no-op if a concurrent toggle
+        # already moved that record to the target state.
+        result = self.collection.bulk_write(
+            [
+                UpdateOne(
+                    {"userId": uid, "occupantId": r["occupantId"], "month": month_key, "paid": {"$ne": paid}, "removed": {"$ne": True}},
+                    {"$set": {"paid": paid}},
+                )
+                for r in before
+            ],
+            ordered=False,
+        )
+        if result.modified_count != len(before):
+            # Lost a race with another writer; recount rather than guess
+            # which records it touched.
+            self.rebuild_summaries(uid)
+        else:
+            deltas = summary_deltas(uid, before, -1)
+            for key, delta in summary_deltas(uid, [{**r, "paid": paid} for r in before], 1).items():
+                deltas[key].update(delta)
+            self._bump_summaries(deltas)
+        return [r["occupantId"] for r in before]
+
+    def stream(self, uid, filters):
+        query = {"userId": uid}
+        if filters.get("fromMonth") or filters.get("toMonth"):
+            query["month"] = {}
+            if filters.get("fromMonth"):
+                query["month"]["$gte"] = filters["fromMonth"]
+            if filters.get("toMonth"):
+                query["month"]["$lte"] = filters["toMonth"]
+        if filters.get("occupantIds") is not None:
+            query["occupantId"] = {"$in": filters["occupantIds"]}
+        if filters.get("paid") is not None:
+            query["paid"] = filters["paid"]
+        return self.collection.find(
+            query, {"occupantId": 1, "roomId": 1, "month": 1, "paid": 1, "dueAmount": 1, "removed": 1}
+        ).sort("month", 1).batch_size(EXPORT_BATCH_SIZE)
+
+    def detach(self, uid, occupant_ids):
+        if not occupant_ids:
+            return 0
+        records = list(
+            self.collection.find(
+                {"userId": uid, "occupantId": {"$in": occupant_ids}, "removed": {"$ne": True}},
+                {"month": 1, "paid": 1, "dueAmount": 1},
+            )
+        )
+        if not records:
+            return 0
+        self.collection.update_many({"_id": {"$in": [r["_id"] for r in records]}}, {"$set": {"removed": True}})
+        self._bump_summaries(summary_deltas(uid, records, -1))
+        return len(records)
+
+    def summaries(self, uid, months):
+        return list(
+            self.summaries_collection.find(
+                {"userId": uid, "month": {"$in": months}},
+                {"_id": 0, "month": 1, "paidCount": 1, "unpaidCount": 1, "paidAmount": 1, "dueAmount": 1},
+            ).sort("month", 1)
+        )
+
+    def rebuild_summaries(self, uid=None):
+        started = datetime.now(timezone.utc)
+        scope = {"userId": uid} if uid is not None else {}
+        tenants = set(self.summaries_collection.distinct("userId", scope))
+        paid_amount = {"$ifNull": ["$dueAmount", 0]}
+        self.collection.aggregate(
+            [
+                {"$match": {**scope, "removed": {"$ne": True}}},
+                {
+                    "$group": {
+                        "_id": {"userId": "$userId", "month": "$month"},
+                        "paidCount": {"$sum": {"$cond": ["$paid", 1, 0]}},
+                        "unpaidCount": {"$sum": {"$cond": ["$paid", 0, 1]}},
+                        "paidAmount": {"$sum": {"$cond": ["$paid", paid_amount, 0]}},
+                        "dueAmount": {"$sum": {"$cond": ["$paid", 0, paid_amount]}},
+                    }
+                },
+                {
+                    "$project": {
+                        "_id": 0,
+                        "userId": "$_id.userId",
+                        "month": "$_id.month",
+                        "paidCount": 1,
+                        "unpaidCount": 1,
+                        "paidAmount": 1,
+                        "dueAmount": 1,
+                        "updatedAt": {"$literal": started},
+                    }
+                },
+                {"$merge": {"into": self.summaries_name, "on": ["userId", "month"], "whenMatched": "replace", "whenNotMatched": "insert"}},
+            ],
+            allowDiskUse=True,
+        )
+        # Months that no longer have any records were not rewritten above.
+        self.summaries_collection.delete_many({**scope, "updatedAt": {"$lt": started}})
+        tenants.update(self.summaries_collection.distinct("userId", scope))
+        return sorted(tenants)
+
+
+class MongoBookings(_MongoRepository, BookingsRepository):
+    collection_name = "advanceBookings"
+
+    def list(self, uid):
+        return list(self.collection.find({"userId": uid}).sort("expectedJoinDate", 1))
+
+    def insert(self, doc):
+        return self.collection.insert_one(doc).inserted_id
+
+    def delete(self, uid, bid):
+        return self.collection.find_one_and_delete({"_id": bid, "userId": uid}, projection={"name": 1, "phone": 1})
+
+    def search(self, uid, tokens, limit):
+        return list(
+            self.collection.find(
+                {"userId": uid, "nameTokens": {"$all": tokens}}, {"name": 1, "phone": 1, "expectedJoinDate": 1}
+            )
+            .sort("expectedJoinDate", 1)
+            .limit(limit)
+        )
+
+
+class MongoLogs(_MongoRepository, LogsRepository):
+    collection_name = "activityLogs"
+
+    def insert_many(self, docs):
+        self.collection.insert_many(docs, ordered=False)
+
+    def page(self, uid, filters, cursor, page_size):
+        return keyset_page(
+            self.collection,
+            history_query(uid, filters),
+            cursor=cursor,
+            page_size=page_size,
+            projection={"type": 1, "name": 1, "description": 1, "createdAt": 1},
+        )
+
+    def stream(self, uid, filters):
+        return self.collection.find(
+            history_query(uid, filters), {"type": 1, "name": 1, "description": 1, "metadata": 1, "createdAt": 1}
+        ).sort([("createdAt", -1), ("_id", -1)]).batch_size(EXPORT_BATCH_SIZE)
+
+    def oldest(self, before, limit):
+        return list(
+            self.collection.find({"createdAt": {"$lt": before}})
+            .sort([("createdAt", 1), ("_id", 1)])
+            .limit(limit)
+            .batch_size(limit)
+        )
+
+    def delete_ids(self, ids):
+        if not ids:
+            return 0
+        return self.collection.delete_many({"_id": {"$in": ids}}).deleted_count
+
+
+class MongoArchive(_MongoRepository, ArchiveRepository):
+    collection_name = "activityArchive"
+
+    def save_buckets(self, buckets):
+        if buckets:
+            self.collection.bulk_write([ReplaceOne({"_id": b["_id"]}, b, upsert=True) for b in buckets], ordered=False)
+
+    def buckets(self, uid, from_month, to_month, newest_first=True):
+        query = {"userId": uid}
+        if from_month or to_month:
+            query["month"] = {}
+            if from_month:
+                query["month"]["$gte"] = from_month
+            if to_month:
+                query["month"]["$lte"] = to_month
+        order = -1 if newest_first else 1
+        return self.collection.find(query).sort([("month", order), ("_id", order)]).batch_size(50)
+
+
+class MongoJobs(_MongoRepository, JobsRepository):
+    collection_name = "jobs"
+
+    def get(self, name):
+        return self.collection.find_one({"_id": name})
+
+    def save(self, name, fields):
+        self.collection.update_one({"_id": name}, {"$set": fields}, upsert=True)
+
+
+def history_query(uid: ObjectId, filters: dict) -> dict:
+    """Translate LogsRepository.page filters into a Mongo filter."""
+    filter_q = {"userId": uid}
+    if filters.get("from") or filters.get("to"):
+        filter_q["createdAt"] = {}
+        if filters.get("from"):
+            filter_q["createdAt"]["$gte"] = filters["from"]
+        if filters.get("to"):
+            filter_q["createdAt"]["$lte"] = filters["to"]
+    if filters.get("nameTokens"):
+        filter_q["nameTokens"] = {"$all": filters["nameTokens"]}
+    if filters.get("type"):
+        filter_q["type"] = filters["type"]
+    return filter_q
+
+
+class MongoStorage(Storage):
+    backend = "mongo"
+
+    def __init__(self, get_db):
+        """get_db returns the pymongo Database; it is resolved on every call."""
+        self.get_db = get_db
+        super().__init__(
+            users=MongoUsers(get_db),
+            config=MongoConfig(get_db),
+            rooms=MongoRooms(get_db),
+            occupants=MongoOccupants(get_db),
+            rent=MongoRent(get_db),
+            bookings=MongoBookings(get_db),
+            logs=MongoLogs(get_db),
+            jobs=MongoJobs(get_db),
+            archive=MongoArchive(get_db),
+        )
@@ -0,0 +1,128 @@
+"""Per-tenant occupancy summaries and /rooms fragments.
+
+Summaries are cached per process and tagged with the tenant's
+``config.dataVersion``. Every mutation that changes rooms or occupants calls
+touch_tenant(), which bumps that version in storage and drops the local entry,
+so other workers notice the change on their next config read (which the
+pages do anyway) instead of waiting for the TTL.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from bson import ObjectId
+
+from config import FRAGMENT_CACHE_SIZE, SUMMARY_CACHE_SIZE, SUMMARY_CACHE_TTL
+
+
+class LRUCache:
+    """Thread-safe LRU mapping with a per-entry TTL and hit/miss counters.
+
+    Entries carry a version; a lookup with a different version is a miss.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version=None, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic() or entry[1] != version:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def set(self, key, value, version=None) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, version, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._data),
+            }
+
+
+occupancy_cache = LRUCache(SUMMARY_CACHE_SIZE, SUMMARY_CACHE_TTL)
+# Rendered /rooms floor sections keyed by (tenant, floor), same versioning.
+floor_fragment_cache = LRUCache(FRAGMENT_CACHE_SIZE, SUMMARY_CACHE_TTL)
+
+
+def build_occupancy(store, uid: ObjectId) -> dict:
+    rooms = store.rooms.list(uid)
+    by_floor = {}
+    floors = {}
+    for r in rooms:
+        fid = r["floor"]
+        fill = len(r.get("occupantIds") or [])
+        by_floor.setdefault(fid, []).append(
+            {
+                "_id": str(r["_id"]),
+                "floor": r["floor"],
+                "roomNumber": r["roomNumber"],
+                "maxPeople": r["maxPeople"],
+                "fillCount": fill,
+                "emptyCount": r["maxPeople"] - fill,
+            }
+        )
+        totals = floors.setdefault(fid, {"rooms": 0, "capacity": 0, "fillCount": 0, "emptyCount": 0})
+        totals["rooms"] += 1
+        totals["capacity"] += r["maxPeople"]
+        totals["fillCount"] += fill
+        totals["emptyCount"] += r["maxPeople"] - fill
+    overall = {"rooms": 0, "capacity": 0, "fillCount": 0, "emptyCount": 0}
+    for totals in floors.values():
+        for k in overall:
+            overall[k] += totals[k]
+    return {
+        "by_floor": by_floor,
+        "floor_numbers": sorted(by_floor.keys()),
+        "floors": floors,
+        "totals": overall,
+    }
+
+
+def get_occupancy(store, uid: ObjectId, config: dict) -> dict:
+    """Occupancy summary for the tenant whose config document was just read.
+
+    The returned structure is shared between requests; callers must not
+    mutate it.
+    """
+    version = config.get("dataVersion", 0)
+    summary = occupancy_cache.get(uid, version)
+    if summary is None:
+        summary = build_occupancy(store, uid)
+        occupancy_cache.set(uid, summary, version)
+    return summary
+
+
+def touch_tenant(store, uid: ObjectId) -> int:
+    """Record that a tenant's rooms or occupants changed; returns the new dataVersion."""
+    version = store.config.bump_version(uid)
+    occupancy_cache.invalidate(uid)
+    return version
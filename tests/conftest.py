@@ -0,0 +1,11 @@
+import os
+import sys
+from pathlib import Path
+
+# Tests run against the in-memory backend with synchronous activity logging;
+# set before any project module reads config.
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("ENSURE_INDEXES", "0")
+os.environ.setdefault("ACTIVITY_LOG_MODE", "sync")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,144 @@
+"""ChangeFeed and the /events stream, driven by a fake change stream."""
+import queue
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+from live_updates import RESET, ChangeFeed, event_stream, format_event
+from storage.memory import MemoryStorage
+
+
+class FakeStream:
+    """Just enough of a pymongo change stream for the watcher thread."""
+
+    def __init__(self, changes: queue.Queue):
+        self.changes = changes
+        self.alive = True
+        self.resume_token = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def try_next(self):
+        try:
+            change = self.changes.get(timeout=0.05)
+        except queue.Empty:
+            return None
+        if isinstance(change, Exception):
+            raise change
+        return change
+
+
+def change(token: str, uid: ObjectId, coll: str = "rooms") -> dict:
+    return {
+        "_id": {"_data": token},
+        "ns": {"coll": coll},
+        "operationType": "update",
+        "documentKey": {"_id": ObjectId()},
+        "fullDocument": {"userId": uid, "dataVersion": 2},
+    }
+
+
+def event(token: str, name: str = "rooms") -> dict:
+    return {"id": token, "event": name, "data": {}}
+
+
+@pytest.fixture
+def watched():
+    changes = queue.Queue()
+    opened = []
+
+    def open_stream(resume_after):
+        opened.append(resume_after)
+        return FakeStream(changes)
+
+    feed = ChangeFeed(open_stream, buffer_size=10, max_queue=10)
+    yield feed, changes, opened
+    feed.shutdown()
+
+
+def test_changes_reach_only_their_tenant(watched):
+    feed, changes, _ = watched
+    a, b = ObjectId(), ObjectId()
+    sub_a = feed.subscribe(a)
+    sub_b = feed.subscribe(b)
+
+    changes.put(change("t1", a))
+    changes.put(change("t2", b, coll="config"))
+
+    got_a = sub_a.get(2)
+    got_b = sub_b.get(2)
+    assert (got_a["id"], got_a["event"]) == ("t1", "rooms")
+    assert (got_b["id"], got_b["event"]) == ("t2", "versions")
+    assert got_b["data"]["dataVersion"] == 2
+    assert sub_a.get(0.1) is None
+
+
+def test_history_lost_resets_subscribers_and_restarts_from_now(watched):
+    feed, changes, opened = watched
+    uid = ObjectId()
+    sub = feed.subscribe(uid)
+    changes.put(change("t1", uid))
+    assert sub.get(2)["id"] == "t1"
+
+    changes.put(OperationFailure("history lost", code=286))
+
+    assert sub.get(3) is RESET
+    changes.put(change("t2", uid))
+    assert sub.get(3)["id"] == "t2"
+    assert opened[0] is None and opened[-1] is None
+
+
+def test_reconnect_replays_only_later_events_for_the_tenant():
+    feed = ChangeFeed(None, buffer_size=10)
+    uid, other = ObjectId(), ObjectId()
+    for token, owner in (("t1", uid), ("t2", other), ("t3", uid), ("t4", uid)):
+        feed.publish(owner, event(token))
+
+    sub = feed.subscribe(uid, last_event_id="t1")
+
+    assert [sub.get(0)["id"], sub.get(0)["id"]] == ["t3", "t4"]
+    assert sub.get(0) is None
+
+
+def test_reconnect_past_the_buffer_gets_a_reset():
+    # Also what a reconnect to another worker sees: buffers are per worker.
+    feed = ChangeFeed(None, buffer_size=2)
+    uid = ObjectId()
+    for token in ("t1", "t2", "t3"):
+        feed.publish(uid, event(token))
+
+    assert feed.subscribe(uid, last_event_id="t1").get(0) is RESET
+    assert feed.subscribe(uid, last_event_id="elsewhere").get(0) is RESET
+
+
+def test_slow_connection_is_told_to_reset():
+    feed = ChangeFeed(None, max_queue=2)
+    uid = ObjectId()
+    sub = feed.subscribe(uid)
+    for token in ("t1", "t2", "t3"):
+        feed.publish(uid, event(token))
+
+    assert sub.get(0) is RESET
+    assert sub.get(0) is None
+
+
+def test_event_stream_sends_versions_then_events_then_keepalives():
+    feed = ChangeFeed(None)
+    store = MemoryStorage()
+    uid = ObjectId()
+    store.config.bump_version(uid, "rentVersion")
+    stream = event_stream(feed, store, uid, max_seconds=5, heartbeat=0.05)
+
+    assert next(stream) == "retry: 3000\n\n"
+    feed.publish(uid, event("t1", "rent"))
+    assert next(stream) == format_event({"event": "versions", "data": {"dataVersion": 0, "rentVersion": 1, "bookingsVersion": 0}})
+    assert next(stream) == format_event(event("t1", "rent"))
+    assert next(stream) == ": keepalive\n\n"
+
+    stream.close()
+    assert feed.stats()["connections"] == 0
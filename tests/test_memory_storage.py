@@ -0,0 +1,50 @@
+"""In-memory backend behaviour the routes rely on."""
+from datetime import datetime, timezone
+
+import pytest
+from bson import ObjectId
+
+from storage.memory import MemoryStorage
+
+
+@pytest.fixture
+def tenant():
+    store = MemoryStorage()
+    uid = ObjectId()
+    rid = ObjectId()
+    # Form and CSV dates are naive UTC; older blank-date rows were aware.
+    for joined in (datetime(2025, 1, 1), datetime(2025, 3, 1, tzinfo=timezone.utc), datetime(2025, 2, 1)):
+        store.occupants.insert({"_id": ObjectId(), "userId": uid, "roomId": rid, "name": "x", "phone": "1", "dateOfJoin": joined})
+    return store, uid
+
+
+def test_list_sorts_mixed_naive_and_aware_join_dates(tenant):
+    store, uid = tenant
+    months = [o["dateOfJoin"].month for o in store.occupants.list(uid)]
+    assert months == [3, 2, 1]
+
+
+def test_stream_sorts_mixed_naive_and_aware_join_dates(tenant):
+    store, uid = tenant
+    months = [o["dateOfJoin"].month for o in store.occupants.stream(uid, {})]
+    assert months == [1, 2, 3]
+
+
+@pytest.fixture
+def bookings():
+    store = MemoryStorage()
+    uid = ObjectId()
+    # A blank expected date is stored as an aware "now"; form dates are naive.
+    for expected in (datetime(2025, 1, 1), datetime(2025, 3, 1, tzinfo=timezone.utc), datetime(2025, 2, 1)):
+        store.bookings.insert({"_id": ObjectId(), "userId": uid, "name": "x", "nameTokens": ["x"], "expectedJoinDate": expected})
+    return store, uid
+
+
+def test_bookings_list_sorts_mixed_naive_and_aware_dates(bookings):
+    store, uid = bookings
+    assert [b["expectedJoinDate"].month for b in store.bookings.list(uid)] == [1, 2, 3]
+
+
+def test_bookings_search_sorts_mixed_naive_and_aware_dates(bookings):
+    store, uid = bookings
+    assert [b["expectedJoinDate"].month for b in store.bookings.search(uid, ["x"], 10)] == [1, 2, 3]
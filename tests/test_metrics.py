@@ -0,0 +1,40 @@
+"""/metrics is only served with a token."""
+
+import pytest
+from flask import Flask
+
+import metrics
+
+
+def build(monkeypatch, token):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", token)
+    app = Flask(__name__)
+    metrics.init_app(app)
+    return app.test_client()
+
+
+def test_metrics_is_404_without_a_token(monkeypatch):
+    assert build(monkeypatch, "").get("/metrics").status_code == 404
+
+
+@pytest.mark.parametrize("header, status", [(None, 401), ("Bearer wrong", 401), ("Bearer s3cret", 200)])
+def test_metrics_requires_the_bearer_token(monkeypatch, header, status):
+    client = build(monkeypatch, "s3cret")
+    headers = {"Authorization": header} if header else {}
+    assert client.get("/metrics", headers=headers).status_code == status
+
+
+def test_render_includes_cache_and_activity_log_stats():
+    from summary_cache import occupancy_cache
+
+    occupancy_cache.set("k", 1, version=1)
+    occupancy_cache.get("k", version=1)
+    occupancy_cache.get("k", version=2)
+    text = metrics.registry.render()
+    pid = metrics.os.getpid()
+    stats = occupancy_cache.stats()
+    assert f'pg_summary_cache_hits_total{{cache="occupancy",pid="{pid}"}} {stats["hits"]}' in text
+    assert f'pg_summary_cache_misses_total{{cache="occupancy",pid="{pid}"}} {stats["misses"]}' in text
+    for name in ("enqueued", "flushed", "dropped", "failed"):
+        assert f"pg_activity_log_{name}_total{{pid=" in text
+    assert "# TYPE pg_activity_log_pending gauge" in text
@@ -0,0 +1,114 @@
+"""Thread races against the atomic occupant and rent mutations.
+
+Each test runs on the in-memory backend and against the MongoDB at
+MONGODB_URI, where the room's $expr/$size capacity guard and the rent
+toggle's pipeline upsert do the work; the Mongo runs are skipped when no
+server answers.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+import mutations
+from config import MONGODB_URI
+from indexes import ensure_indexes
+from room_sync import diff_rooms
+from storage.memory import MemoryStorage
+from storage.mongo import MongoStorage
+
+THREADS = 32
+TEST_DB = "pg_management_test"
+
+
+@pytest.fixture(scope="session")
+def mongo_db():
+    client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=1000, maxPoolSize=THREADS)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        client.close()
+        pytest.skip("no MongoDB reachable at MONGODB_URI")
+    db = client[TEST_DB]
+    yield db
+    client.drop_database(TEST_DB)
+    client.close()
+
+
+@pytest.fixture(params=["memory", "mongo"])
+def store(request):
+    if request.param == "memory":
+        return MemoryStorage()
+    db = request.getfixturevalue("mongo_db")
+    db.client.drop_database(TEST_DB)
+    ensure_indexes(db)
+    return MongoStorage(lambda: db)
+
+
+def make_room(store, capacity: int):
+    uid = ObjectId()
+    store.rooms.apply_diff(uid, diff_rooms([], [{"floor": 1, "roomNumber": 1, "maxPeople": capacity}]))
+    return uid, store.rooms.list(uid)[0]["_id"]
+
+
+@pytest.mark.parametrize("capacity", [1, 3])
+def test_concurrent_adds_never_overfill(store, capacity):
+    uid, rid = make_room(store, capacity)
+
+    def attempt(i):
+        occupant = {"name": f"Racer {i}", "phone": str(i), "dateOfJoin": datetime(2025, 1, 1)}
+        return mutations.add_occupant(store, uid, rid, occupant)[0] is not None
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        added = sum(pool.map(attempt, range(THREADS * 4)))
+
+    room = store.rooms.get(uid, rid)
+    occupants = [o for o in store.occupants.list(uid) if o["roomId"] == rid]
+    assert added == capacity
+    assert len(room["occupantIds"]) == capacity
+    assert sorted(room["occupantIds"]) == sorted(o["_id"] for o in occupants)
+
+
+@pytest.mark.parametrize("capacity", [1, 3])
+def test_concurrent_bulk_adds_never_overfill(store, capacity):
+    uid, rid = make_room(store, capacity)
+
+    def attempt(i):
+        entries = [(rid, {"name": f"Batch {i}-{j}", "phone": str(i), "dateOfJoin": datetime(2025, 1, 1)}) for j in range(2)]
+        return len(mutations.add_occupants(store, uid, entries)[0])
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        added = sum(pool.map(attempt, range(THREADS * 2)))
+
+    room = store.rooms.get(uid, rid)
+    # A batch of two takes both beds or neither.
+    assert added == capacity - capacity % 2
+    assert sorted(room["occupantIds"]) == sorted(o["_id"] for o in store.occupants.list(uid) if o["roomId"] == rid)
+
+
+def test_concurrent_removes_succeed_once(store):
+    uid, rid = make_room(store, 2)
+    doc, _ = mutations.add_occupant(store, uid, rid, {"name": "Once", "phone": "1", "dateOfJoin": datetime(2025, 1, 1)})
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        results = list(pool.map(lambda _: mutations.remove_occupant(store, uid, doc["_id"]), range(THREADS)))
+
+    assert sum(r is not None for r in results) == 1
+    assert doc["_id"] not in store.rooms.get(uid, rid)["occupantIds"]
+    assert store.occupants.list(uid) == []
+
+
+@pytest.mark.parametrize("toggles", [100, 101])
+def test_concurrent_toggles_are_not_lost(store, toggles):
+    uid = ObjectId()
+    occupant = {"_id": ObjectId(), "roomId": ObjectId()}
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        list(pool.map(lambda _: mutations.toggle_rent(store, uid, occupant, "2025-01"), range(toggles)))
+
+    records = [r for r in store.rent.for_month(uid, "2025-01") if r["occupantId"] == occupant["_id"]]
+    assert len(records) == 1
+    assert records[0]["paid"] is (toggles % 2 == 1)
@@ -0,0 +1,20 @@
+"""Residents CSV import on the in-memory backend."""
+from bson import ObjectId
+
+from onboarding import import_occupants
+from room_sync import diff_rooms
+from storage.memory import MemoryStorage
+
+
+def test_blank_and_given_join_dates_are_both_naive():
+    store = MemoryStorage()
+    uid = ObjectId()
+    store.rooms.apply_diff(uid, diff_rooms([], [{"floor": 1, "roomNumber": 1, "maxPeople": 3}]))
+    lines = ["name,phone,date of join,floor,room", "Asha,9000000001,2025-01-15,1,1", "Ravi,9000000002,,1,1"]
+
+    totals = import_occupants(store, uid, lines)
+
+    assert totals["added"] == 2
+    occupants = store.occupants.list(uid)
+    assert all(o["dateOfJoin"].tzinfo is None for o in occupants)
+    assert [o["name"] for o in occupants] == ["Ravi", "Asha"]
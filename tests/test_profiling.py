@@ -0,0 +1,14 @@
+"""Profile dump names group by route."""
+from profiling import _dumps_by_route, route_slug
+
+
+def test_route_slug_has_no_file_name_separators():
+    assert route_slug("/export/<kind>.<fmt>") == "export_kind_fmt"
+    assert route_slug("/rent/toggle") == route_slug("rent_toggle") == "rent_toggle"
+    assert route_slug("/") == "root"
+
+
+def test_dumps_group_under_their_route(tmp_path):
+    for name in (f"{route_slug('/export/<kind>.<fmt>')}.1700000000000.42.prof", "rent.1700000000001.42.prof"):
+        (tmp_path / name).touch()
+    assert sorted(_dumps_by_route(tmp_path, ".prof")) == ["export_kind_fmt", "rent"]
@@ -0,0 +1,22 @@
+"""Client IP behind TRUSTED_PROXIES."""
+from flask import request
+
+import app as app_module
+
+
+def _remote_addr(monkeypatch, trusted):
+    monkeypatch.setattr(app_module, "TRUSTED_PROXIES", trusted)
+    flask_app = app_module.create_app()
+    flask_app.add_url_rule("/_remote_addr", "remote_addr", lambda: request.remote_addr)
+    client = flask_app.test_client()
+    headers = {"X-Forwarded-For": "203.0.113.7, 198.51.100.2"}
+    return client.get("/_remote_addr", headers=headers, environ_base={"REMOTE_ADDR": "10.0.0.1"}).text
+
+
+def test_forwarded_for_is_ignored_without_trusted_proxies(monkeypatch):
+    assert _remote_addr(monkeypatch, 0) == "10.0.0.1"
+
+
+def test_client_ip_is_taken_from_the_trusted_hop(monkeypatch):
+    assert _remote_addr(monkeypatch, 1) == "198.51.100.2"
+    assert _remote_addr(monkeypatch, 2) == "203.0.113.7"
@@ -0,0 +1,33 @@
+"""?fields= reaches the occupant reads, not just the JSON output."""
+from datetime import datetime
+
+from bson import ObjectId
+
+from read_api import OCCUPANT_FIELDS, occupants_view, parse_fields
+from storage.memory import MemoryStorage
+
+
+class RecordingOccupants:
+    def __init__(self, repo):
+        self.repo = repo
+        self.projections = []
+
+    def list(self, uid, projection=None):
+        self.projections.append(projection)
+        return self.repo.list(uid, projection=projection)
+
+
+def test_occupants_view_reads_only_requested_fields():
+    store = MemoryStorage()
+    uid = ObjectId()
+    store.occupants.insert({"_id": ObjectId(), "userId": uid, "roomId": ObjectId(), "name": "Asha", "phone": "9", "dateOfJoin": datetime(2025, 1, 1), "nameTokens": ["asha"]})
+    recorder = RecordingOccupants(store.occupants)
+
+    class Store:
+        occupants = recorder
+
+    rows = occupants_view(Store, uid, parse_fields("name,phone", OCCUPANT_FIELDS))
+
+    assert rows == [{"name": "Asha", "phone": "9"}]
+    assert recorder.projections == [("name", "phone")]
+    assert set(store.occupants.list(uid, projection=("name",))[0]) == {"_id", "name"}
@@ -0,0 +1,153 @@
+"""Routing decisions, causal sessions and the pg_causal cookie, with a stub client."""
+import importlib
+
+import pytest
+from bson import Timestamp
+from flask import Blueprint, Flask
+
+import config
+import read_routing
+from read_routing import SECONDARY_READS, begin_request, bind, decode_token, end_request
+
+
+class StubSession:
+    def __init__(self):
+        self.operation_time = None
+        self.cluster_time = None
+        self.advanced_to = None
+        self.ended = False
+
+    def advance_cluster_time(self, cluster_time):
+        self.cluster_time = cluster_time
+
+    def advance_operation_time(self, operation_time):
+        self.advanced_to = self.operation_time = operation_time
+
+    def end_session(self):
+        self.ended = True
+
+
+class StubClient:
+    def __init__(self):
+        self.sessions = []
+
+    def start_session(self, causal_consistency):
+        assert causal_consistency
+        self.sessions.append(StubSession())
+        return self.sessions[-1]
+
+
+class StubCollection:
+    """Records the read preference and session of each call; writes advance time."""
+
+    def __init__(self, client, read_preference=None):
+        self.database = type("Database", (), {"client": client})
+        self.read_preference = read_preference
+        self.calls = []
+
+    def with_options(self, read_preference):
+        return StubCollection(self.database.client, read_preference)
+
+    def find_one(self, *args, session=None):
+        self.calls.append(("find_one", session))
+
+    def update_one(self, *args, session=None):
+        self.calls.append(("update_one", session))
+        session.operation_time = Timestamp(500, 1)
+        session.cluster_time = {"clusterTime": Timestamp(500, 1)}
+
+
+@pytest.fixture
+def client():
+    yield StubClient()
+    end_request()
+
+
+def write_token(when=Timestamp(400, 2)) -> str:
+    session = StubSession()
+    session.operation_time = when
+    session.cluster_time = {"clusterTime": when}
+    return read_routing.encode_token(session)
+
+
+def test_primary_get_is_left_alone(client):
+    begin_request("views.rooms_page", "GET", None)
+    coll = StubCollection(client)
+    assert bind(coll) is coll
+    assert end_request() is None and client.sessions == []
+
+
+def test_routed_read_uses_secondary_and_waits_for_the_cookie(client):
+    begin_request("views.history_page", "GET", write_token())
+    routed = bind(StubCollection(client))
+    routed.find_one({})
+
+    assert routed._collection.read_preference is SECONDARY_READS
+    session = client.sessions[0]
+    assert routed._collection.calls == [("find_one", session)]
+    assert session.advanced_to == Timestamp(400, 2)
+    assert end_request(writes_only=True) is None and not session.ended
+    assert end_request() is None and session.ended
+
+
+def test_tampered_cookie_is_ignored(client):
+    token = write_token()
+    begin_request("views.history_page", "GET", token[:-1] + ("0" if token[-1] != "0" else "1"))
+    bind(StubCollection(client)).find_one({})
+    assert client.sessions[0].advanced_to is None
+
+
+@pytest.mark.parametrize("endpoint, method", [("views.add_occupant", "POST"), ("views.rent_toggle", "GET")])
+def test_writes_issue_a_token_for_their_operation_time(client, endpoint, method):
+    begin_request(endpoint, method, None)
+    coll = bind(StubCollection(client))
+    coll.update_one({}, {})
+
+    assert coll._collection.read_preference is None
+    token = end_request(writes_only=True)
+    assert decode_token(token)["operationTime"] == Timestamp(500, 1)
+    assert client.sessions[0].ended
+
+
+def test_write_without_mongo_ops_sets_no_token(client):
+    begin_request("views.rent_toggle", "GET", None)
+    assert end_request(writes_only=True) is None
+
+
+def test_staleness_bound_is_at_least_mongodbs_minimum(monkeypatch):
+    assert SECONDARY_READS.max_staleness == config.READ_MAX_STALENESS_SECONDS >= 90
+    monkeypatch.setenv("READ_MAX_STALENESS_SECONDS", "30")
+    try:
+        assert importlib.reload(config).READ_MAX_STALENESS_SECONDS == 90
+    finally:
+        monkeypatch.undo()
+        importlib.reload(config)
+
+
+def test_rent_toggle_then_trend_reads_its_own_write(monkeypatch, client):
+    monkeypatch.setattr(read_routing, "READ_ROUTING", True)
+    monkeypatch.setattr(read_routing, "STORAGE_BACKEND", "mongo")
+    views = Blueprint("views", __name__)
+
+    @views.route("/rent/toggle")
+    def rent_toggle():
+        bind(StubCollection(client)).update_one({}, {})
+        return "toggled"
+
+    @views.route("/rent/trend")
+    def rent_trend_page():
+        bind(StubCollection(client)).find_one({})
+        return "trend"
+
+    app = Flask(__name__)
+    read_routing.init_app(app)
+    app.register_blueprint(views)
+    browser = app.test_client()
+
+    browser.get("/rent/toggle")
+    assert browser.get_cookie(config.CAUSAL_COOKIE) is not None
+    browser.get("/rent/trend")
+
+    toggle, trend = client.sessions
+    assert toggle.ended and trend.ended
+    assert trend.advanced_to == Timestamp(500, 1)
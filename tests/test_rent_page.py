@@ -0,0 +1,59 @@
+"""GET /rent: no side effects, and a header that matches the rows."""
+from datetime import datetime
+
+from bson import ObjectId
+
+from app import app
+from auth import create_session_token
+from config import SESSION_COOKIE
+from rent_ledger import build_rent_ledger
+from rent_summaries import summary_for_month
+from storage import set_storage
+from storage.memory import MemoryStorage
+
+
+def test_rent_get_does_not_create_records():
+    store = MemoryStorage()
+    set_storage(store)
+    uid = ObjectId()
+    store.occupants.insert({"_id": ObjectId(), "userId": uid, "roomId": ObjectId(), "name": "Asha", "phone": "1", "dateOfJoin": datetime(2025, 1, 1)})
+    client = app.test_client()
+    client.set_cookie(SESSION_COOKIE, create_session_token(str(uid)))
+    try:
+        response = client.get("/rent?month=2025-03")
+        assert response.status_code == 200
+        assert b"Asha" in response.data
+        assert store.rent.for_month(uid, "2025-03") == []
+    finally:
+        set_storage(None)
+
+
+def test_rent_header_counts_occupants_without_a_record_as_unpaid():
+    store = MemoryStorage()
+    set_storage(store)
+    uid = ObjectId()
+    room = ObjectId()
+    asha = {"_id": ObjectId(), "userId": uid, "roomId": room, "name": "Asha", "phone": "1", "dateOfJoin": datetime(2025, 1, 1)}
+    ravi = {"_id": ObjectId(), "userId": uid, "roomId": room, "name": "Ravi", "phone": "2", "dateOfJoin": datetime(2025, 2, 1)}
+    later = {"_id": ObjectId(), "userId": uid, "roomId": room, "name": "Meera", "phone": "3", "dateOfJoin": datetime(2025, 6, 1)}
+    for o in (asha, ravi, later):
+        store.occupants.insert(o)
+    client = app.test_client()
+    client.set_cookie(SESSION_COOKIE, create_session_token(str(uid)))
+    try:
+        # Asha gets a paid record; Ravi has none, as if the month was never rolled over.
+        toggled = client.get(f"/rent/toggle?occupant_id={asha['_id']}&month=2025-03", headers={"Accept": "application/json"})
+        assert toggled.get_json()["summary"]["paidCount"] == 1
+        assert toggled.get_json()["summary"]["unpaidCount"] == 1
+        rows = build_rent_ledger(store, uid, "2025-03", create_missing=False)
+        unpaid_rows = sum(1 for r in rows if not r["paid"])
+        header = summary_for_month(store, uid, "2025-03", occupants=len(rows))
+        assert (header["paidCount"], header["unpaidCount"], header["total"]) == (1, unpaid_rows, len(rows)) == (1, 1, 2)
+        assert summary_for_month(store, uid, "2025-03") == header
+        page = client.get("/rent?month=2025-03").data
+        assert f'data-field="paidCount">{header["paidCount"]}<'.encode() in page
+        assert f'data-field="unpaidCount">{header["unpaidCount"]}<'.encode() in page
+        assert b"Meera" not in page
+        assert store.rent.for_month(uid, "2025-03")[0]["occupantId"] == asha["_id"]
+    finally:
+        set_storage(None)
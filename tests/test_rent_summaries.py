@@ -0,0 +1,22 @@
+"""rent_summaries --rebuild on the in-memory backend."""
+from bson import ObjectId
+
+import mutations
+import rent_summaries
+from storage import set_storage
+from storage.memory import MemoryStorage
+
+
+def test_full_rebuild_bumps_every_tenants_rent_version():
+    store = MemoryStorage()
+    tenants = [ObjectId(), ObjectId()]
+    for uid in tenants:
+        mutations.toggle_rent(store, uid, {"_id": ObjectId(), "roomId": ObjectId()}, "2025-01")
+    set_storage(store)
+    try:
+        assert rent_summaries.main(["--rebuild"]) == 0
+    finally:
+        set_storage(None)
+    for uid in tenants:
+        assert (store.config.get(uid) or {}).get("rentVersion") == 1
+        assert rent_summaries.summary_for_month(store, uid, "2025-01")["paidCount"] == 1
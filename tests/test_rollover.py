@@ -0,0 +1,25 @@
+"""rollover_month on the in-memory backend."""
+from datetime import datetime
+
+from bson import ObjectId
+
+from rollover import rollover_month
+from storage.memory import MemoryStorage
+
+
+def test_rollover_bumps_rent_version_of_each_tenant_it_touches():
+    store = MemoryStorage()
+    tenants = [ObjectId(), ObjectId()]
+    for uid in tenants:
+        for _ in range(3):
+            store.occupants.insert({"_id": ObjectId(), "userId": uid, "roomId": ObjectId(), "name": "x", "phone": "1", "dateOfJoin": datetime(2025, 1, 1)})
+    later = ObjectId()
+    store.occupants.insert({"_id": ObjectId(), "userId": later, "roomId": ObjectId(), "name": "y", "phone": "2", "dateOfJoin": datetime(2025, 6, 1)})
+
+    totals = rollover_month(store, "2025-03", batch_size=2)
+
+    assert totals["created"] == 6
+    for uid in tenants:
+        assert store.config.get(uid)["rentVersion"] == 1
+        assert len(store.rent.for_month(uid, "2025-03")) == 3
+    assert (store.config.get(later) or {}).get("rentVersion") is None
@@ -0,0 +1,153 @@
+"""Worker warm-up and the /ready readiness check.
+
+A fresh worker has no MongoDB connections and no compiled templates, so its
+first requests pay for connection handshakes and Jinja compilation. warm_up
+does that work up front, in the process that will serve requests:
+
+- builds this process's MongoClient with the MONGO_* pool settings
+- runs max(1, MONGO_MIN_POOL_SIZE) pings at once, so the pool holds that
+  many open connections
+- creates the indexes from indexes.py (ENSURE_INDEXES)
+- compiles every template in templates/
+
+gunicorn calls it from post_worker_init (gunicorn.conf.py), after fork and
+before the worker accepts a request; anywhere else the first request does.
+Mongo steps share a WARMUP_TIMEOUT_SECONDS deadline and a failed step is
+logged, not raised, so a worker still starts while Mongo is unreachable.
+
+GET /ready answers 200 once the worker is warm and Mongo answers a ping,
+503 with the reason otherwise. Point load balancer health checks or
+readiness probes at it.
+
+    python -m warmup      # warm up once and print what each step took
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pymongo
+from pymongo.errors import PyMongoError
+
+from config import ENSURE_INDEXES, MONGO_MIN_POOL_SIZE, STORAGE_BACKEND, WARMUP_TIMEOUT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+READY_PING_TIMEOUT = 2  # seconds
+
+
+def _ping() -> None:
+    from database import get_client
+
+    # pymongo.timeout is per thread, so each pool thread sets its own.
+    with pymongo.timeout(WARMUP_TIMEOUT_SECONDS):
+        get_client().admin.command("ping")
+
+
+def open_connections(count: int) -> int:
+    """Check out count connections at once; returns how many answered."""
+    with ThreadPoolExecutor(count) as pool:
+        futures = [pool.submit(_ping) for _ in range(count)]
+    return sum(1 for f in futures if f.exception() is None)
+
+
+def compile_templates(app) -> int:
+    names = app.jinja_env.list_templates(extensions=("html",))
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+class WorkerWarmUp:
+    """Runs the warm-up once per process; later calls return its report."""
+
+    def __init__(self):
+        self.report: dict = {}
+        self._lock = threading.Lock()
+        self._pid: int | None = None
+
+    @property
+    def done(self) -> bool:
+        return self._pid == os.getpid()
+
+    def ensure(self, app) -> None:
+        if not self.done:
+            self.run(app)
+
+    def run(self, app) -> dict:
+        with self._lock:
+            if self.done:
+                return self.report
+            report = {"steps": {}, "errors": {}}
+            started = time.perf_counter()
+            if STORAGE_BACKEND == "mongo":
+                self._step(report, "connections", lambda: open_connections(max(1, MONGO_MIN_POOL_SIZE)))
+                if ENSURE_INDEXES:
+                    self._step(report, "indexes", self._ensure_indexes)
+            self._step(report, "templates", lambda: compile_templates(app))
+            report["seconds"] = round(time.perf_counter() - started, 3)
+            self.report = report
+            self._pid = os.getpid()
+            return report
+
+    @staticmethod
+    def _ensure_indexes() -> int:
+        from database import get_db
+        from indexes import ensure_indexes
+
+        with pymongo.timeout(WARMUP_TIMEOUT_SECONDS):
+            created, failed = ensure_indexes(get_db())
+        if failed:
+            raise RuntimeError("; ".join(f"{collection}: {error}" for collection, error in failed.items()))
+        return sum(len(names) for names in created.values())
+
+    @staticmethod
+    def _step(report: dict, name: str, fn) -> None:
+        started = time.perf_counter()
+        try:
+            report["steps"][name] = {"result": fn()}
+        except Exception as e:
+            logger.warning("Warm-up step %s failed: %s", name, e)
+            report["errors"][name] = str(e)
+            report["steps"][name] = {"result": None}
+        report["steps"][name]["ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+
+worker_warmup = WorkerWarmUp()
+
+
+def warm_up(app) -> dict:
+    return worker_warmup.run(app)
+
+
+def readiness() -> tuple[dict, int]:
+    """(body, status) for GET /ready."""
+    if not worker_warmup.done:
+        return {"ready": False, "reason": "warming up"}, 503
+    if STORAGE_BACKEND == "mongo":
+        from database import get_client
+
+        try:
+            with pymongo.timeout(READY_PING_TIMEOUT):
+                get_client().admin.command("ping")
+        except PyMongoError as e:
+            return {"ready": False, "reason": f"mongo: {e}"}, 503
+    return {"ready": True, "pid": os.getpid(), "warmup": worker_warmup.report}, 200
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Warm up once (pool, indexes, templates) and print the timings.")
+    parser.parse_args(argv)
+    from app import app
+
+    report = warm_up(app)
+    print(json.dumps(report, indent=2))
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())